@@ -1,12 +1,22 @@
 import os
 import json
-import requests
-from typing import Dict, Any
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Any, List
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langgraph.graph import StateGraph, END
+from backend.utils import metrics
+from backend.utils.openai_client import invoke_llm, LazyPrompt
+from backend.utils.case_ranker import rank_locally
+from backend.utils.icd10 import get_icd10_table
+from backend.utils.http_client import http_get
+from backend.utils.query_canon import bioportal_query, normalize
+from backend.utils.shared_cache import cached_json, make_key, EXTERNAL_CACHE_TTL_S
+from backend.utils.deadline import (
+    MIN_HTTP_BUDGET, MIN_LLM_BUDGET, has_budget, call_timeout, llm_timeout, mark_partial,
+)
 
 # -------------------------------
 # Load environment variables
@@ -16,51 +26,181 @@ BIOPORTAL_API_KEY = os.getenv("BIOPORTAL_API_KEY")  # ✅ Must be set in .env
 
 BIOPORTAL_API_URL = "https://data.bioontology.org/search"
 
+# "llm" (default) or "local" – overridable per request via state["options"]["case_ranker"]
+CASE_MATCHER_RANKER = os.getenv("CASE_MATCHER_RANKER", "llm").lower()
+
+# "combined" (default): one BioPortal search over all ontologies.
+# "multi": one search per ontology plus every LOCAL_SOURCES index, run
+# concurrently and merged with reciprocal rank fusion. Overridable per request
+# via state["options"]["case_search"].
+CASE_MATCHER_SEARCH = os.getenv("CASE_MATCHER_SEARCH", "combined").lower()
+CASE_MATCHER_ONTOLOGIES = [o.strip() for o in os.getenv("CASE_MATCHER_ONTOLOGIES", "ICD10CM,SNOMEDCT,MSH").split(",") if o.strip()]
+# Search the local ICD-10-CM table (backend/utils/icd10.py) alongside BioPortal in "multi" mode
+CASE_MATCHER_LOCAL_ICD10 = os.getenv("CASE_MATCHER_LOCAL_ICD10", "1").lower() not in ("0", "false", "no")
+RRF_K = 60
+# Pipelines that may run "multi" searches at once in this process (default:
+# 8 admitted requests + 4 job workers + the cache warmer). The search pool gets
+# one thread per ontology for each, so no search queues behind another
+# request's – a queued search would spend its timeout waiting for a thread
+CASE_SEARCH_PIPELINES = int(os.getenv("CASE_SEARCH_PIPELINES", "13"))
+
+# Local indexes searched alongside BioPortal in "multi" mode:
+# name → search(query, max_results) returning results in the BioPortal result
+# format with ICD-10-CM codes in `icd_code`
+LOCAL_SOURCES: Dict[str, Callable[[str, int], List[Dict[str, Any]]]] = {}
+
+def register_local_source(name: str, search: Callable[[str, int], List[Dict[str, Any]]]):
+    LOCAL_SOURCES[name] = search
+
+if CASE_MATCHER_LOCAL_ICD10:
+    register_local_source("ICD10CM_LOCAL", lambda query, max_results: get_icd10_table().search(query, max_results))
+
 # -------------------------------
 # Fetch Case Matches from BioPortal
 # -------------------------------
-def fetch_case_matches(query: str, max_results: int = 5):
-    """Search BioPortal API for ICD/SNOMED/MeSH terms related to query."""
+def fetch_case_matches(query: str, max_results: int = 5, timeout: float = 10):
+    """Search BioPortal API for ICD/SNOMED/MeSH terms related to query (shared-cached)."""
+    return cached_json(
+        "bioportal", make_key(query, max_results), EXTERNAL_CACHE_TTL_S,
+        lambda: _search_bioportal(query, max_results, timeout),
+    )
+
+def _search_bioportal(query: str, max_results: int, timeout: float):
+    return [_result(item) for item in _bioportal_collection(query, "ICD10CM,SNOMEDCT,MSH", max_results, timeout)]
+
+def _bioportal_collection(query: str, ontologies: str, max_results: int, timeout: float):
     if not BIOPORTAL_API_KEY:
         # Dev fallback without external call
         return []
     params = {
         "q": query,
-        "ontologies": "ICD10CM,SNOMEDCT,MSH",
+        "ontologies": ontologies,
         "apikey": BIOPORTAL_API_KEY,
         "pagesize": max_results,
     }
     try:
-        response = requests.get(BIOPORTAL_API_URL, params=params, timeout=10)
+        response = http_get("bioportal", BIOPORTAL_API_URL, params=params, timeout=timeout)
         response.raise_for_status()
     except Exception as e:
         print(f"❌ Error fetching BioPortal results: {e}")
         return []
 
-    data = response.json()
-    results = []
-    for item in data.get("collection", []):
-        results.append({
-            "icd_code": item.get("notation", "N/A"),
-            "name": item.get("prefLabel", "Unknown"),
-            "description": (item.get("definition") or ["No description available"])[0],
-            "score": item.get("score", 0),
-        })
+    return response.json().get("collection", [])[:max_results]
 
-    return results[:max_results]
+def _result(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "icd_code": item.get("notation", "N/A"),
+        "name": item.get("prefLabel", "Unknown"),
+        "description": (item.get("definition") or ["No description available"])[0],
+        "score": item.get("score", 0),
+    }
+
+# -------------------------------
+# Multi-source search with reciprocal rank fusion
+# -------------------------------
+_search_pool = None
+_search_pool_lock = threading.Lock()
+
+def search_pool_size() -> int:
+    return max(1, CASE_SEARCH_PIPELINES) * max(1, len(CASE_MATCHER_ONTOLOGIES))
+
+def _get_search_pool() -> ThreadPoolExecutor:
+    # Separate from the HTTP pool: these tasks block on http_get themselves
+    global _search_pool
+    if _search_pool is None:
+        with _search_pool_lock:
+            if _search_pool is None:
+                _search_pool = ThreadPoolExecutor(max_workers=search_pool_size(), thread_name_prefix="case-search")
+    return _search_pool
+
+def fetch_ontology_matches(query: str, ontology: str, max_results: int = 5, timeout: float = 10):
+    """One BioPortal ontology (shared-cached); results keep their UMLS CUIs for de-duplication."""
+    return cached_json(
+        "bioportal", make_key(query, ontology, max_results), EXTERNAL_CACHE_TTL_S,
+        lambda: [{**_result(item), "cuis": item.get("cui") or []}
+                 for item in _bioportal_collection(query, ontology, max_results, timeout)],
+    )
+
+def _timed(source: str, search: Callable[[], List[Dict[str, Any]]], submitted: float = None):
+    start = time.monotonic()
+    if submitted is not None:
+        metrics.observe("case_source_queue_seconds", start - submitted, source=source)
+    try:
+        results = search() or []
+    except Exception as e:
+        print(f"❌ Case source '{source}' failed: {e}")
+        results = []
+    metrics.observe("case_source_seconds", time.monotonic() - start, source=source)
+    metrics.inc("case_source_results", len(results), source=source)
+    return results
+
+def fuse_results(ranked_lists: Dict[str, List[Dict[str, Any]]], max_results: int = 5, k: int = RRF_K):
+    """Reciprocal rank fusion; hits mapping to the same ICD code (by code, CUI or name) are merged.
+
+    ICD-coded sources (ICD10CM and the local indexes) define the groups;
+    SNOMED CT / MeSH hits join a group through a shared UMLS CUI or an
+    identical name, otherwise they stand alone.
+    """
+    icd_sources = {s for s in ranked_lists if s == "ICD10CM" or s in LOCAL_SOURCES}
+    by_cui, by_name = {}, {}
+    for source in icd_sources:
+        for r in ranked_lists[source]:
+            for cui in r.get("cuis") or []:
+                by_cui.setdefault(cui, r["icd_code"])
+            by_name.setdefault(normalize(r.get("name")), r["icd_code"])
+
+    groups: Dict[str, Dict[str, Any]] = {}
+    for source, results in ranked_lists.items():
+        for rank, r in enumerate(results, 1):
+            if source in icd_sources:
+                key = r["icd_code"]
+            else:
+                key = next((by_cui[c] for c in r.get("cuis") or [] if c in by_cui), None) \
+                    or by_name.get(normalize(r.get("name"))) or f"{source}:{r.get('icd_code')}"
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {**{f: r.get(f) for f in ("icd_code", "name", "description", "score")},
+                                       "sources": [], "rrf_score": 0.0}
+            elif source in icd_sources and group["icd_code"] != key:
+                # An ICD-coded hit represents the group over a SNOMED / MeSH one
+                group.update({f: r.get(f) for f in ("icd_code", "name", "description")})
+            if source not in group["sources"]:
+                group["sources"].append(source)
+                group["rrf_score"] += 1.0 / (k + rank)
+            group["score"] = max(group["score"] or 0, r.get("score") or 0)
+
+    fused = sorted(groups.values(), key=lambda g: -g["rrf_score"])[:max_results]
+    for g in fused:
+        g["rrf_score"] = round(g["rrf_score"], 5)
+    return fused
+
+def fetch_case_matches_multi(query: str, max_results: int = 5, timeout: float = 10):
+    """Search each ontology and local index concurrently and fuse the rankings."""
+    searches = {o: (lambda o=o: fetch_ontology_matches(query, o, max_results, timeout)) for o in CASE_MATCHER_ONTOLOGIES}
+    pool = _get_search_pool()
+    # Each task runs in a copy of the caller's context (cache refresh window, token meter)
+    submitted = time.monotonic()
+    futures = {source: pool.submit(contextvars.copy_context().run, _timed, source, search, submitted)
+               for source, search in searches.items()}
+    # Local indexes are in-memory lookups: search them here while BioPortal answers
+    local = {name: _timed(name, lambda fn=fn: fn(query, max_results)) for name, fn in LOCAL_SOURCES.items()}
+    # Same wall-clock budget as the single combined search
+    wait(futures.values(), timeout=max(0.0, timeout - (time.monotonic() - submitted)))
+    ranked = {source: f.result() if f.done() else [] for source, f in futures.items()}
+    return fuse_results({**ranked, **local}, max_results)
+
+def search_case_matches(query: str, timeout: float = 10, mode: str = None):
+    if (mode or CASE_MATCHER_SEARCH).lower() == "multi":
+        return fetch_case_matches_multi(query, timeout=timeout)
+    return fetch_case_matches(query, timeout=timeout)
 
 # -------------------------------
 # LangChain LLM Setup
 # -------------------------------
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.2,
-    api_key=os.getenv("OPENROUTER_API_KEY"),   # ✅ OpenRouter key
-    base_url="https://openrouter.ai/api/v1"
-)
+LLM_TEMPERATURE = 0.2
 
 # Prompt for refinement
-matcher_prompt = ChatPromptTemplate.from_messages([
+matcher_prompt = LazyPrompt([
     ("system", """You are a clinical case matcher AI.
 Given ontology results, pick the **top 3 most relevant matches**.
 Return STRICT JSON in this schema:
@@ -73,45 +213,78 @@ Return STRICT JSON in this schema:
 ])
 
 # -------------------------------
-# Agent Function
+# Agent stages (shared with the fused post-retrieval agent)
 # -------------------------------
-def case_matcher_agent(state: Dict[str, Any]) -> Dict[str, Any]:
-    """LangGraph node for Case Matcher Agent (BioPortal + LLM refinement)."""
+def retrieve_case_matches(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the ontology query from patient context and search BioPortal."""
     symptoms = (state.get("symptoms") or "").strip()
-    diagnosis = (state.get("diagnosis") or "").strip()
     age = (state.get("age") or "").__str__().strip()
     gender = (state.get("gender") or "").strip()
     medical_history = (state.get("medicalHistory") or state.get("history") or "").strip()
 
-    # Build a richer query string for ontology search
-    parts = [p for p in [diagnosis, symptoms, gender, f"age {age}" if age else "", medical_history] if p]
-    query = " ".join(parts) or symptoms or diagnosis
-    if not query:
-        state["case_matcher"] = {
+    # Canonical ontology query (shared across paraphrases of the same case)
+    query = bioportal_query(state)
+
+    # Skip BioPortal entirely when the request deadline is nearly spent
+    skipped = bool(query) and not has_budget(state, MIN_HTTP_BUDGET)
+    return {
+        "query": query,
+        "raw_results": search_case_matches(query, timeout=call_timeout(state),
+                                           mode=(state.get("options") or {}).get("case_search"))
+        if query and not skipped else [],
+        "skipped": skipped,
+        "symptoms": symptoms,
+        "differentials": ((state.get("symptom_analysis") or {}).get("top_differentials") or []),
+        "patient_context": {
+            "age": age,
+            "gender": gender,
+            "medical_history": medical_history,
+        },
+    }
+
+def validate_case_matches(parsed: Any) -> bool:
+    """Check an LLM reply matches the matched_cases schema."""
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("matched_cases"), list):
+        return False
+    return all(isinstance(c, dict) and c.get("icd_code") and c.get("name") for c in parsed["matched_cases"])
+
+def use_local_ranker(state: Dict[str, Any]) -> bool:
+    ranker = ((state.get("options") or {}).get("case_ranker") or CASE_MATCHER_RANKER)
+    return str(ranker).lower() == "local"
+
+def rank_case_matches_locally(retrieval: Dict[str, Any]):
+    """Deterministic no-LLM ranking (BioPortal score + lexical overlap + ICD agreement)."""
+    return rank_locally(retrieval["raw_results"], retrieval["symptoms"], retrieval["differentials"])
+
+def rank_case_matches(retrieval: Dict[str, Any], timeout: float = None):
+    """Single LLM round trip picking the top 3 ontology hits (None if unavailable)."""
+    try:
+        if os.getenv("OPENROUTER_API_KEY"):
+            content = invoke_llm(
+                matcher_prompt, LLM_TEMPERATURE,
+                {"results": json.dumps(retrieval["raw_results"], indent=2)},
+                timeout=timeout, validate=lambda c: validate_case_matches(json.loads(c)),
+            )
+            parsed = json.loads(content)
+            if validate_case_matches(parsed):
+                return parsed
+    except Exception as e:
+        print(f"❌ Case matcher LLM error: {e}")
+    return None
+
+def build_case_matcher_output(retrieval: Dict[str, Any], parsed) -> Dict[str, Any]:
+    raw_results = retrieval["raw_results"]
+    if not retrieval["query"]:
+        return {
             "matched_cases": [],
             "disclaimer": "No query provided."
         }
-        return state
-
-    raw_results = fetch_case_matches(query)
-
     if not raw_results:
-        state["case_matcher"] = {
+        return {
             "matched_cases": [],
             "disclaimer": "No matches found from BioPortal."
         }
-        return state
 
-    # Send ontology results to LLM for ranking & selection
-    parsed = None
-    try:
-        if os.getenv("OPENROUTER_API_KEY"):
-            chain = matcher_prompt | llm
-            result = chain.invoke({"results": json.dumps(raw_results, indent=2)})
-            parsed = json.loads((result.content or "").strip())
-    except Exception as e:
-        print(f"❌ Case matcher LLM error: {e}")
-        parsed = None
     if parsed is None:
         # Simple passthrough of top 3 with basic mapping
         parsed = {
@@ -126,22 +299,46 @@ def case_matcher_agent(state: Dict[str, Any]) -> Dict[str, Any]:
             ]
         }
 
-    state["case_matcher"] = {
-        "query": query,
+    return {
+        "query": retrieval["query"],
         "matched_cases": parsed.get("matched_cases", []),
-        "patient_context": {
-            "age": age,
-            "gender": gender,
-            "medical_history": medical_history,
-        },
+        "patient_context": retrieval["patient_context"],
         "disclaimer": "Ontology matches are retrieved via BioPortal (ICD/SNOMED/MeSH) and AI-refined. Verify clinically."
     }
+
+# -------------------------------
+# Agent Function
+# -------------------------------
+def case_matcher_agent(state: Dict[str, Any]) -> Dict[str, Any]:
+    """LangGraph node for Case Matcher Agent (BioPortal + LLM refinement)."""
+    retrieval = retrieve_case_matches(state)
+    parsed = None
+    degraded, reason = retrieval["skipped"], "deadline"
+    if retrieval["raw_results"]:
+        # Rank locally, or send ontology results to LLM for ranking & selection
+        if use_local_ranker(state):
+            parsed = rank_case_matches_locally(retrieval)
+        elif has_budget(state, MIN_LLM_BUDGET):
+            parsed = rank_case_matches(retrieval, timeout=llm_timeout(state))
+            if parsed is None:
+                # LLM failed or timed out: same degraded path as out of budget
+                parsed = rank_case_matches_locally(retrieval)
+                degraded, reason = True, "llm_error"
+        else:
+            # Out of budget: the local ranker is the degraded path
+            parsed = rank_case_matches_locally(retrieval)
+            degraded = True
+    state["case_matcher"] = build_case_matcher_output(retrieval, parsed)
+    if degraded:
+        mark_partial(state, "case_matcher", reason)
     return state
 
 # -------------------------------
 # Build Graph (standalone version)
 # -------------------------------
 def build_case_matcher_graph():
+    from langgraph.graph import StateGraph, END
+
     graph = StateGraph(dict)
     graph.add_node("case_matcher", case_matcher_agent)
     graph.set_entry_point("case_matcher")
@@ -0,0 +1,198 @@
+import os
+import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+from dotenv import load_dotenv
+
+from backend.utils.openai_client import invoke_llm, LazyPrompt
+from backend.agents.literature_agent import (
+    retrieve_literature, format_abstracts, validate_literature,
+    summarize_articles, build_literature_output,
+    cached_summaries, uncached_articles, merge_summaries,
+)
+from backend.agents.case_matcher import (
+    retrieve_case_matches, validate_case_matches, use_local_ranker,
+    rank_case_matches, rank_case_matches_locally, build_case_matcher_output,
+)
+from backend.agents.treatment_agent import (
+    retrieve_treatments, validate_treatments, format_interactions, format_medications,
+    recommend_treatments, build_treatment_output,
+)
+from backend.utils.deadline import MIN_LLM_BUDGET, has_budget, llm_timeout, mark_partial
+
+# -------------------------------
+# Env & LLM
+# -------------------------------
+load_dotenv()
+
+LLM_TEMPERATURE = 0.2
+
+# -------------------------------
+# Prompt (one call for literature + case matching + treatment)
+# -------------------------------
+fused_prompt = LazyPrompt([
+    ("system", """You are a clinical evidence assistant completing three tasks in one reply.
+
+1. LITERATURE: summarize each PubMed abstract into ≤70 words, from the abstract alone (do not refer to the patient).
+2. CASE_MATCHER: from the ontology results, pick the **top 3 most relevant matches**.
+3. TREATMENT: given drug results + condition, suggest BOTH drug and non-drug interventions.
+   Incorporate patient context (age, gender, medical history) for tailoring. Drug interactions with the checked
+   medications were already checked locally: narrate each flagged pair relevant to a suggestion in its rationale
+   and do not speculate about other interactions with those medications. The local table does not cover the
+   unchecked medications: note contraindications and interactions between them and your suggestions yourself.
+
+Return STRICT JSON ONLY in this schema (use empty lists when a section has no input):
+{{
+  "literature": {{
+    "summaries": [
+      {{"pmid": "string", "title": "string", "summary": "string"}}
+    ]
+  }},
+  "case_matcher": {{
+    "matched_cases": [
+      {{"icd_code": "string", "name": "string", "description": "string", "match_score": float}}
+    ]
+  }},
+  "treatment": {{
+    "treatments": [
+      {{"name": "string", "class": "string", "type": "drug/non-drug", "rationale": "string", "source": "string"}}
+    ]
+  }}
+}}"""),
+    ("user", """=== LITERATURE ===
+Abstracts:
+{abstracts}
+
+=== PATIENT (for CASE_MATCHER and TREATMENT) ===
+Age: {age}
+Gender: {gender}
+Medical History: {medical_history}
+Current Medications: {current_meds}
+
+=== CASE_MATCHER ===
+Ontology results:
+{ontology_results}
+
+=== TREATMENT ===
+Condition: {condition}
+Checked Medications: {checked_meds}
+Unchecked Medications: {unchecked_meds}
+Flagged Interactions:
+{interactions}
+Drug Results:
+{drug_results}""")
+])
+
+# -------------------------------
+# Sections: (state key, validator, standalone LLM step, output builder)
+# -------------------------------
+_SECTIONS = {
+    "literature": (validate_literature, summarize_articles, build_literature_output),
+    "case_matcher": (validate_case_matches, rank_case_matches, build_case_matcher_output),
+    "treatment": (validate_treatments, recommend_treatments, build_treatment_output),
+}
+
+def _has_input(key: str, retrieval: Dict[str, Any]) -> bool:
+    if key == "literature":
+        return bool(retrieval["articles"])
+    if key == "case_matcher":
+        return bool(retrieval["raw_results"])
+    return bool(retrieval["query"])
+
+def _needs_llm(key: str, retrieval: Dict[str, Any], local_ranking: bool) -> bool:
+    if key == "case_matcher" and local_ranking:
+        return False
+    if key == "literature":
+        return bool(retrieval["uncached"])
+    return _has_input(key, retrieval)
+
+def _fused_llm_call(state: Dict[str, Any], retrievals: Dict[str, Dict[str, Any]], local_ranking: bool):
+    """One LLM round trip covering all three sections (None if unavailable)."""
+    try:
+        if os.getenv("OPENROUTER_API_KEY"):
+            content = invoke_llm(fused_prompt, LLM_TEMPERATURE, {
+                "age": (state.get("age") or ""),
+                "gender": (state.get("gender") or ""),
+                "medical_history": (state.get("medicalHistory") or state.get("history") or ""),
+                "current_meds": (state.get("currentMedications") or ""),
+                # Abstracts with a cached per-PMID summary stay out of the prompt
+                "abstracts": format_abstracts(retrievals["literature"]["uncached"]) or "(none)",
+                # Locally ranked cases don't need the LLM; keep them out of the prompt
+                "ontology_results": "[]" if local_ranking else json.dumps(retrievals["case_matcher"]["raw_results"], indent=2),
+                "condition": retrievals["treatment"]["query"],
+                **format_medications(retrievals["treatment"]),
+                "interactions": format_interactions(retrievals["treatment"]["flagged"]),
+                "drug_results": json.dumps(retrievals["treatment"]["drug_results"], indent=2),
+            }, timeout=llm_timeout(state), validate=lambda c: isinstance(json.loads(c), dict))
+            parsed = json.loads(content)
+            if isinstance(parsed, dict):
+                return parsed
+    except Exception as e:
+        print(f"❌ Fused LLM error: {e}")
+    return None
+
+# -------------------------------
+# Agent node
+# -------------------------------
+def fused_post_retrieval_agent(state: Dict[str, Any]) -> Dict[str, Any]:
+    """LangGraph node replacing literature_agent → case_matcher → treatment_agent.
+
+    Runs the three retrievals concurrently, then makes a single LLM call and
+    splits the JSON reply back into the `literature`, `case_matcher` and
+    `treatment` state keys. A section whose part is missing (the fused call
+    failed or timed out) or fails validation falls back to that agent's own
+    LLM step, so output quality never drops below the three-call flow; if
+    that fails too, the section is marked partial.
+    """
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        # Run in copies of the caller's context: cache refresh and token metering are contextvars
+        futures = {
+            key: pool.submit(contextvars.copy_context().run, retrieve, state)
+            for key, retrieve in (("literature", retrieve_literature), ("case_matcher", retrieve_case_matches),
+                                  ("treatment", retrieve_treatments))
+        }
+        retrievals = {key: f.result() for key, f in futures.items()}
+    literature = retrievals["literature"]
+    literature["cached"] = cached_summaries(literature["articles"])
+    literature["uncached"] = uncached_articles(literature["articles"], literature["cached"])
+
+    local_ranking = use_local_ranker(state)
+    # Out of budget: skip the LLM and return raw retrieval results
+    out_of_budget = not has_budget(state, MIN_LLM_BUDGET)
+    fused = None
+    if not out_of_budget and any(_needs_llm(key, r, local_ranking) for key, r in retrievals.items()):
+        fused = _fused_llm_call(state, retrievals, local_ranking)
+
+    for key, (validate, standalone, build) in _SECTIONS.items():
+        retrieval = retrievals[key]
+        parsed = None
+        degraded, reason = retrieval["skipped"], "deadline"
+        if key == "case_matcher" and (local_ranking or out_of_budget):
+            if retrieval["raw_results"]:
+                parsed = rank_case_matches_locally(retrieval)
+                degraded = degraded or not local_ranking
+        elif key == "literature" and _has_input(key, retrieval) and not retrieval["uncached"]:
+            parsed = merge_summaries(retrieval["articles"], retrieval["cached"], None)
+        elif _has_input(key, retrieval):
+            part = (fused or {}).get(key)
+            if key == "literature" and validate(part):
+                # Written alongside patient context: used for this request only, not cached per PMID
+                parsed = merge_summaries(retrieval["articles"], retrieval["cached"], part, store=False)
+            elif validate(part):
+                parsed = part
+            elif out_of_budget:
+                degraded = True
+            else:
+                # Missing (failed or timed-out fused call) or invalid part: the agent's own LLM step
+                if has_budget(state, MIN_LLM_BUDGET):
+                    print(f"❌ Fused reply missing or invalid for '{key}', falling back to single-agent call")
+                    parsed = standalone(retrieval, timeout=llm_timeout(state))
+                if parsed is None:
+                    degraded, reason = True, "llm_error"
+                    if key == "case_matcher":
+                        parsed = rank_case_matches_locally(retrieval)
+        state[key] = build(retrieval, parsed)
+        if degraded:
+            mark_partial(state, key, reason)
+    return state
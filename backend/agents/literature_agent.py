@@ -1,84 +1,70 @@
 import os
 import json
-import requests
 from typing import Dict, Any
 from dotenv import load_dotenv
-from xml.etree import ElementTree as ET
 
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langgraph.graph import StateGraph, END
+from backend.utils import metrics
+from backend.utils.openai_client import invoke_llm, LazyPrompt
+from backend.utils.literature_ranker import rank_articles
+from backend.utils.pubmed_scheduler import FetchTimeout, get_pubmed_scheduler
+from backend.utils.query_canon import pubmed_query
+from backend.utils.shared_cache import cached_json, get_cache, make_key, EXTERNAL_CACHE_TTL_S
+from backend.utils.deadline import (
+    MIN_HTTP_BUDGET, MIN_LLM_BUDGET, has_budget, call_timeout, llm_timeout, mark_partial,
+)
 
 # Load environment variables
 load_dotenv()
 
-# PubMed endpoints
-PUBMED_SEARCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-PUBMED_FETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+# Candidates fetched from PubMed, re-ranked locally, and the best k summarized
+LITERATURE_POOL_SIZE = int(os.getenv("LITERATURE_POOL_SIZE", "50"))
+LITERATURE_TOP_K = int(os.getenv("LITERATURE_TOP_K", "3"))
+LITERATURE_RERANK = os.getenv("LITERATURE_RERANK", "1").lower() not in ("0", "false", "no")
+
+# Per-PMID summaries are reused across queries until the abstract changes or
+# SUMMARY_CACHE_VERSION is bumped (do so whenever summary_prompt changes)
+SUMMARY_CACHE_VERSION = 2
+SUMMARY_CACHE_TTL_S = float(os.getenv("SUMMARY_CACHE_TTL_S", str(30 * 86400)))
 
 # -------------------------------
 # PubMed Fetch Function
 # -------------------------------
-def fetch_pubmed_articles(query: str, max_results: int = 3):
-    """Fetch top PubMed articles with full abstracts."""
-    params = {
-        "db": "pubmed",
-        "term": query,
-        "retmode": "json",
-        "retmax": max_results
-    }
+def fetch_pubmed_articles(query: str, max_results: int = 3, timeout: float = None):
+    """Fetch top PubMed articles with full abstracts.
+
+    Results are shared across workers via the shared cache; misses go through
+    the process-wide PubMed scheduler so concurrent analyses share the NCBI
+    rate limit and have their efetch calls merged. Raises FetchTimeout when
+    the articles did not arrive in time (nothing is cached then).
+    """
+    return cached_json(
+        "pubmed", make_key(query, max_results), EXTERNAL_CACHE_TTL_S,
+        lambda: _search_pubmed(query, max_results, timeout),
+    )
+
+def _search_pubmed(query: str, max_results: int, timeout: float):
+    scheduler = get_pubmed_scheduler()
     try:
-        search_resp = requests.get(PUBMED_SEARCH_URL, params=params, timeout=10)
-        search_resp.raise_for_status()
-        search_data = search_resp.json()
+        id_list = scheduler.search(query, max_results, timeout=timeout)
     except Exception as e:
         print(f"❌ PubMed search error: {e}")
         return []
-    id_list = search_data.get("esearchresult", {}).get("idlist", [])
 
     if not id_list:
         return []
 
-    fetch_params = {
-        "db": "pubmed",
-        "id": ",".join(id_list),
-        "retmode": "xml"
-    }
-    try:
-        fetch_resp = requests.get(PUBMED_FETCH_URL, params=fetch_params, timeout=10)
-        fetch_resp.raise_for_status()
-        root = ET.fromstring(fetch_resp.text)
-    except Exception as e:
-        print(f"❌ PubMed fetch error: {e}")
-        return []
-
-    results = []
-    for article in root.findall(".//PubmedArticle"):
-        pmid = article.findtext(".//PMID")
-        title = article.findtext(".//ArticleTitle", default="No title")
-        abstract_texts = [ab.text for ab in article.findall(".//AbstractText") if ab.text]
-
-        abstract = " ".join(abstract_texts).strip()
-        results.append({
-            "pmid": pmid,
-            "title": title,
-            "abstract": abstract
-        })
+    articles = scheduler.fetch(id_list, timeout=timeout)
+    results = [articles[pmid] for pmid in id_list if pmid in articles]
 
     return results[:max_results]
 
 # -------------------------------
 # LangChain LLM Setup
 # -------------------------------
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.3,
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1"
-)
+LLM_TEMPERATURE = 0.3
 
 # Prompt template for summarizing PubMed abstracts
-summary_prompt = ChatPromptTemplate.from_messages([
+summary_prompt = LazyPrompt([
     ("system", """You are a medical research summarizer.
 Summarize each abstract into ≤70 words.
 Return STRICT JSON as:
@@ -91,13 +77,10 @@ Return STRICT JSON as:
 ])
 
 # -------------------------------
-# Agent Function
+# Agent stages (shared with the fused post-retrieval agent)
 # -------------------------------
-def literature_agent(state: Dict[str, Any]) -> Dict[str, Any]:
-    """LangGraph node for Literature Agent (PubMed + LLM summarizer).
-
-    Builds a more specific PubMed query using patient context to improve personalization.
-    """
+def retrieve_literature(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a targeted PubMed query from patient context and fetch articles."""
     symptoms = (state.get("symptoms") or "").strip()
     diagnosis = (state.get("diagnosis") or "").strip()
     age = (state.get("age") or "").__str__().strip()
@@ -105,77 +88,170 @@ def literature_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     medical_history = (state.get("medicalHistory") or state.get("history") or "").strip()
     current_meds = (state.get("currentMedications") or "").strip()
 
-    # Construct targeted PubMed query
-    query_terms = []
-    if diagnosis:
-        query_terms.append(diagnosis)
-    if symptoms:
-        query_terms.append(symptoms)
-    if gender:
-        query_terms.append(gender)
-    if age:
-        query_terms.append(f"age {age}")
-    if medical_history:
-        query_terms.append(medical_history)
-    if current_meds:
-        query_terms.append(current_meds)
-
-    query = " AND ".join([t for t in query_terms if t]) or symptoms or diagnosis
-
-    articles = fetch_pubmed_articles(query)
+    # Canonical query: paraphrases of the same case share PubMed searches and cache entries
+    query = pubmed_query(state)
 
-    if not articles:
-        state["literature"] = {
-            "query": query,
-            "articles": [],
-            "disclaimer": "No articles found."
-        }
-        return state
+    # Skip PubMed entirely when the request deadline is nearly spent
+    skipped = not has_budget(state, MIN_HTTP_BUDGET)
+    top_k = int((state.get("options") or {}).get("literature_top_k") or LITERATURE_TOP_K)
+    articles = []
+    try:
+        if not skipped and LITERATURE_RERANK:
+            # Larger candidate pool, best k by local relevance (no LLM call)
+            pool = fetch_pubmed_articles(query, max_results=LITERATURE_POOL_SIZE,
+                                         timeout=call_timeout(state, default=None))
+            differentials = (state.get("symptom_analysis") or {}).get("top_differentials") or []
+            articles = rank_articles(pool, symptoms or diagnosis, differentials,
+                                     context=" ".join([medical_history, current_meds]), top_k=top_k)
+        elif not skipped:
+            articles = fetch_pubmed_articles(query, max_results=top_k, timeout=call_timeout(state, default=None))
+    except FetchTimeout as e:
+        # Ran out of time waiting for the abstracts: reported as a partial section
+        print(f"❌ {e}")
+        skipped = True
+    return {
+        "query": query,
+        "articles": articles,
+        "skipped": skipped,
+        "patient_context": {
+            "age": age,
+            "gender": gender,
+            "medical_history": medical_history,
+            "current_medications": current_meds,
+        },
+    }
 
-    # Prepare abstracts as input
-    abstracts_text = "\n\n".join(
+def format_abstracts(articles) -> str:
+    return "\n\n".join(
         [f"PMID: {a['pmid']}\nTitle: {a['title']}\nAbstract: {a['abstract']}" for a in articles]
     )
 
-    # If LLM unavailable or fails, provide minimal summaries from abstracts
-    parsed = None
+def validate_literature(parsed: Any) -> bool:
+    """Check an LLM reply matches the summaries schema."""
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("summaries"), list):
+        return False
+    return all(isinstance(s, dict) and isinstance(s.get("summary"), str) for s in parsed["summaries"])
+
+def _abstract_hash(article: Dict[str, Any]) -> str:
+    return make_key(article.get("title", ""), article.get("abstract", ""))
+
+def cached_summaries(articles) -> Dict[str, Dict[str, Any]]:
+    """PMID → cached summary, for articles whose abstract and prompt version still match."""
+    cache = get_cache()
+    found = {}
+    for a in articles:
+        pmid = str(a.get("pmid") or "")
+        entry = cache.get_json("pmid_summary", pmid) if pmid else None
+        if (entry and entry.get("version") == SUMMARY_CACHE_VERSION
+                and entry.get("abstract_hash") == _abstract_hash(a)):
+            found[pmid] = entry
+    metrics.inc("pmid_summary_cache", len(found), outcome="hit")
+    metrics.inc("pmid_summary_cache", len(articles) - len(found), outcome="miss")
+    return found
+
+def uncached_articles(articles, cached: Dict[str, Dict[str, Any]]):
+    return [a for a in articles if str(a.get("pmid") or "") not in cached]
+
+def merge_summaries(articles, cached: Dict[str, Dict[str, Any]], parsed, store: bool = True) -> Dict[str, Any]:
+    """Store the fresh summaries in `parsed` per PMID; return all summaries in article order.
+
+    Articles the LLM reply skipped fall back to the start of their abstract
+    (and are not cached). Only replies to `summary_prompt`, which sees the
+    abstracts alone, are cached (`store`): summaries written next to a
+    patient's context must not be served to other patients.
+    """
+    cache = get_cache()
+    fresh = {str(s.get("pmid") or ""): s for s in (parsed or {}).get("summaries", [])}
+    summaries = []
+    for a in articles:
+        pmid = str(a.get("pmid") or "")
+        entry = cached.get(pmid)
+        if entry is None and pmid in fresh and pmid:
+            entry = {"pmid": pmid, "title": a.get("title", ""), "summary": fresh[pmid]["summary"],
+                     "abstract_hash": _abstract_hash(a), "version": SUMMARY_CACHE_VERSION}
+            if store:
+                cache.set_json("pmid_summary", pmid, entry, SUMMARY_CACHE_TTL_S)
+        if entry is None:
+            entry = {"summary": a.get("abstract", "")[:500] or "No abstract available."}
+        summaries.append({"pmid": pmid, "title": a.get("title", ""), "summary": entry["summary"]})
+    return {"summaries": summaries}
+
+def summarize_articles(retrieval: Dict[str, Any], timeout: float = None):
+    """Summaries for the retrieved abstracts (None if the LLM is needed but unavailable).
+
+    Only PMIDs without a valid cached summary are sent to the LLM, in one
+    batched call; when every PMID is cached no LLM call is made.
+    """
+    articles = retrieval["articles"]
+    cached = cached_summaries(articles)
+    missing = uncached_articles(articles, cached)
+    if not missing:
+        return merge_summaries(articles, cached, None)
     try:
         if os.getenv("OPENROUTER_API_KEY"):
-            chain = summary_prompt | llm
-            result = chain.invoke({"abstracts": abstracts_text})
-            parsed = json.loads((result.content or "").strip())
+            content = invoke_llm(
+                summary_prompt, LLM_TEMPERATURE,
+                {"abstracts": format_abstracts(missing)},
+                timeout=timeout, validate=lambda c: validate_literature(json.loads(c)),
+            )
+            parsed = json.loads(content)
+            if validate_literature(parsed):
+                return merge_summaries(articles, cached, parsed)
     except Exception as e:
         print(f"❌ Literature summarizer error: {e}")
-        parsed = None
-    if parsed is None:
-        parsed = {
-            "summaries": [
-                {
-                    "pmid": a.get("pmid", ""),
-                    "title": a.get("title", ""),
-                    "summary": (a.get("abstract", "")[:500] or "No abstract available.")
-                }
-                for a in articles
-            ]
+    return None
+
+def build_literature_output(retrieval: Dict[str, Any], parsed) -> Dict[str, Any]:
+    articles = retrieval["articles"]
+    if not articles:
+        return {
+            "query": retrieval["query"],
+            "articles": [],
+            "disclaimer": "No articles found."
         }
 
-    state["literature"] = {
-        "query": query,
+    # If LLM unavailable or fails, use cached summaries and minimal ones from abstracts
+    if parsed is None:
+        parsed = merge_summaries(articles, cached_summaries(articles), None)
+
+    return {
+        "query": retrieval["query"],
         "articles": parsed,
-        "patient_context": {
-            "age": age,
-            "gender": gender,
-            "medical_history": medical_history,
-            "current_medications": current_meds,
-        },
+        "patient_context": retrieval["patient_context"],
         "disclaimer": "These references are from PubMed and AI-summarized; verify with a professional."
     }
+
+# -------------------------------
+# Agent Function
+# -------------------------------
+def literature_agent(state: Dict[str, Any]) -> Dict[str, Any]:
+    """LangGraph node for Literature Agent (PubMed + LLM summarizer).
+
+    Builds a more specific PubMed query using patient context to improve personalization.
+    """
+    retrieval = retrieve_literature(state)
+    parsed = None
+    # Out of budget: return raw abstracts instead of LLM summaries
+    degraded, reason = retrieval["skipped"], "deadline"
+    if retrieval["articles"]:
+        if has_budget(state, MIN_LLM_BUDGET):
+            parsed = summarize_articles(retrieval, timeout=llm_timeout(state))
+            if parsed is None:
+                # LLM failed or timed out: cached summaries and abstract excerpts
+                degraded, reason = True, "llm_error"
+        else:
+            degraded = True
+    state["literature"] = build_literature_output(retrieval, parsed)
+    if degraded:
+        mark_partial(state, "literature", reason)
     return state
 
 # -------------------------------
 # Build Graph (standalone version)
 # -------------------------------
 def build_literature_graph():
+    from langgraph.graph import StateGraph, END
+
     graph = StateGraph(dict)
     graph.add_node("literature_agent", literature_agent)
     graph.set_entry_point("literature_agent")
@@ -3,21 +3,15 @@ import json
 from typing import Dict, Any, List
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langgraph.graph import StateGraph, END
+from backend.utils.openai_client import invoke_llm, LazyPrompt
+from backend.utils.deadline import MIN_LLM_BUDGET, has_budget, llm_timeout, mark_partial
 
 # -------------------------------
 # Env & LLM
 # -------------------------------
 load_dotenv()
 
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.2,
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1",
-)
+LLM_TEMPERATURE = 0.2
 
 # -------------------------------
 # Helpers to gather upstream outputs
@@ -94,7 +88,7 @@ def _extract_inputs(state: Dict[str, Any]) -> Dict[str, Any]:
 # -------------------------------
 # Prompt (STRICT JSON)
 # -------------------------------
-summary_prompt = ChatPromptTemplate.from_messages([
+summary_prompt = LazyPrompt([
     ("system", """You are a medical report summarizer. 
 You will receive patient context and outputs from multiple agents (differentials, literature, case matches, and treatments).
 Write two concise summaries and recommended next steps.
@@ -148,18 +142,21 @@ def summarizer_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     }
 
     parsed = None
+    # Out of budget: fall through to the deterministic summary
+    degraded = not has_budget(state, MIN_LLM_BUDGET)
+    attempted = bool(os.getenv("OPENROUTER_API_KEY")) and not degraded
     try:
-        if os.getenv("OPENROUTER_API_KEY"):
-            chain = summary_prompt | llm
-            result = chain.invoke({
+        if attempted:
+            raw = invoke_llm(summary_prompt, LLM_TEMPERATURE, {
                 "payload_json": json.dumps(payload, indent=2, ensure_ascii=False)
-            })
-            raw = (result.content or "").strip()
+            }, timeout=llm_timeout(state), validate=lambda c: isinstance(json.loads(c), dict))
             parsed = json.loads(raw)
     except Exception as e:
         print(f"❌ Summarizer LLM error: {e}")
         parsed = None
 
+    # The LLM call ran but timed out or failed: the canned summary below is a degraded result
+    failed = attempted and parsed is None
     if parsed is None:
         # Simple deterministic summary for dev mode
         pc = payload.get("patient_context", {})
@@ -177,12 +174,18 @@ def summarizer_agent(state: Dict[str, Any]) -> Dict[str, Any]:
 
     state["summary"] = parsed.get("summary", {})
     state["summary_disclaimer"] = parsed.get("disclaimer", "This is AI-generated and not medical advice.")
+    if degraded:
+        mark_partial(state, "summary")
+    elif failed:
+        mark_partial(state, "summary", "llm_error")
     return state
 
 # -------------------------------
 # Build graph (standalone)
 # -------------------------------
 def build_summarizer_graph():
+    from langgraph.graph import StateGraph, END
+
     graph = StateGraph(dict)
     graph.add_node("summarizer", summarizer_agent)
     graph.set_entry_point("summarizer")
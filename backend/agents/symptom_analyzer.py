@@ -3,9 +3,9 @@ import json
 from typing import Dict, Any
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langgraph.graph import StateGraph, END   # ✅ works in 0.6.7
+from backend.utils.openai_client import invoke_llm, LazyPrompt
+from backend.utils.icd10 import ICD10CM_VALIDATE, get_icd10_table
+from backend.utils.deadline import MIN_LLM_BUDGET, has_budget, llm_timeout, mark_partial
 
 # Load environment variables
 load_dotenv()
@@ -13,17 +13,12 @@ load_dotenv()
 # -------------------------------
 # Define Model (LangChain wrapper for OpenRouter)
 # -------------------------------
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.2,
-    api_key=os.getenv("OPENROUTER_API_KEY"),   # ✅ from .env
-    base_url="https://openrouter.ai/api/v1"    # ✅ OpenRouter base URL
-)
+LLM_TEMPERATURE = 0.2
 
 # -------------------------------
 # Prompt Template (with ICD-10-CM India requirement)
 # -------------------------------
-prompt = ChatPromptTemplate.from_messages([
+prompt = LazyPrompt([
         ("system", """You are a medical reasoning assistant.
 For each differential diagnosis, return the official ICD-10-CM (India edition) code along with rationale.
 
@@ -57,9 +52,19 @@ def symptom_analyzer_agent(state: Dict[str, Any]) -> Dict[str, Any]:
         }
         return state
 
+    # Not enough request budget left for an LLM round trip
+    if not has_budget(state, MIN_LLM_BUDGET):
+        state["symptom_analysis"] = {
+            "top_differentials": [],
+            "risk_level": "low",
+            "disclaimer": "Request deadline nearly reached; symptom analysis was skipped."
+        }
+        mark_partial(state, "symptom_analysis")
+        return state
+
+    failed = False
     try:
-        chain = prompt | llm
-        result = chain.invoke({
+        raw_content = invoke_llm(prompt, LLM_TEMPERATURE, {
             "symptoms": state.get("symptoms", ""),
             "age": state.get("age", ""),
             # Back-compat: prefer medicalHistory, fallback to history
@@ -67,14 +72,15 @@ def symptom_analyzer_agent(state: Dict[str, Any]) -> Dict[str, Any]:
             "gender": state.get("gender", ""),
             "currentMedications": state.get("currentMedications", ""),
             "urgency": state.get("urgency", ""),
-        })
+        }, timeout=llm_timeout(state), validate=lambda c: isinstance(json.loads(c), dict))
 
-        raw_content = (result.content or "").strip()
         try:
             parsed = json.loads(raw_content)
         except json.JSONDecodeError:
             parsed = {"raw_output": raw_content}
     except Exception as e:
+        # Timed out against the deadline or failed: the placeholder must not pass as a result
+        failed = True
         parsed = {
             "top_differentials": [],
             "risk_level": "low",
@@ -82,14 +88,25 @@ def symptom_analyzer_agent(state: Dict[str, Any]) -> Dict[str, Any]:
             "disclaimer": "Symptom analyzer failed to run. Placeholder returned."
         }
 
+    # Check the LLM's ICD-10-CM codes against the local table (no network call)
+    if ICD10CM_VALIDATE and isinstance(parsed.get("top_differentials"), list):
+        try:
+            parsed["top_differentials"] = get_icd10_table().validate_differentials(parsed["top_differentials"])
+        except Exception as e:
+            print(f"❌ ICD-10-CM validation error: {e}")
+
     # Add output back into state
     state["symptom_analysis"] = parsed
+    if failed:
+        mark_partial(state, "symptom_analysis", "llm_error")
     return state
 
 # -------------------------------
 # Build Graph (compile workflow)
 # -------------------------------
 def build_symptom_graph():
+    from langgraph.graph import StateGraph, END
+
     graph = StateGraph(dict)
 
     # Add Symptom Analyzer node
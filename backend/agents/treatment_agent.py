@@ -1,12 +1,17 @@
 import os
 import json
-import requests
 from typing import Dict, Any
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langgraph.graph import StateGraph, END
+from backend.utils.openai_client import invoke_llm, LazyPrompt
+from backend.utils import metrics
+from backend.utils.http_client import http_get
+from backend.utils.interactions import get_interactions
+from backend.utils.query_canon import rxnorm_query
+from backend.utils.shared_cache import cached_json, make_key, EXTERNAL_CACHE_TTL_S
+from backend.utils.deadline import (
+    MIN_HTTP_BUDGET, MIN_LLM_BUDGET, has_budget, call_timeout, llm_timeout, mark_partial,
+)
 
 # -------------------------------
 # Load environment
@@ -18,10 +23,16 @@ RXNORM_API = "https://rxnav.nlm.nih.gov/REST/drugs.json"
 # -------------------------------
 # Fetch drugs from RxNorm
 # -------------------------------
-def fetch_drug_treatments(query: str, max_results: int = 5):
-    """Query RxNorm API to fetch drug treatments for a condition or drug name."""
+def fetch_drug_treatments(query: str, max_results: int = 5, timeout: float = 10):
+    """Query RxNorm API to fetch drug treatments for a condition or drug name (shared-cached)."""
+    return cached_json(
+        "rxnorm", make_key(query, max_results), EXTERNAL_CACHE_TTL_S,
+        lambda: _search_rxnorm(query, max_results, timeout),
+    )
+
+def _search_rxnorm(query: str, max_results: int, timeout: float):
     try:
-        response = requests.get(RXNORM_API, params={"name": query}, timeout=10)
+        response = http_get("rxnorm", RXNORM_API, params={"name": query}, timeout=timeout)
         response.raise_for_status()
     except Exception as e:
         print(f"❌ Error fetching RxNorm results: {e}")
@@ -42,55 +53,115 @@ def fetch_drug_treatments(query: str, max_results: int = 5):
 # -------------------------------
 # LangChain LLM setup
 # -------------------------------
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.3,
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1"
-)
+LLM_TEMPERATURE = 0.3
 
 # ✅ Escaped JSON braces inside the system prompt
-treatment_prompt = ChatPromptTemplate.from_messages([
+treatment_prompt = LazyPrompt([
         ("system", """You are a medical treatment recommender.
 Given drug results + condition, suggest BOTH drug and non-drug interventions.
-Incorporate patient context (age, gender, medical history, current medications) to note contraindications, interactions, and tailoring.
+Incorporate patient context (age, gender, medical history) for tailoring.
+Drug interactions with the checked medications were already checked locally: narrate each flagged pair relevant to a suggestion in its rationale and do not speculate about other interactions with those medications.
+The local table does not cover the unchecked medications: note contraindications and interactions between them and your suggestions yourself.
 Output STRICT JSON:
 {{
     "treatments": [
         {{"name": "string", "class": "string", "type": "drug/non-drug", "rationale": "string", "source": "string"}}
     ]
 }}"""),
-        ("user", "Condition: {condition}\nAge: {age}\nGender: {gender}\nMedical History: {medical_history}\nCurrent Medications: {current_meds}\nDrug Results:\n{results}")
+        ("user", "Condition: {condition}\nAge: {age}\nGender: {gender}\nMedical History: {medical_history}\nCurrent Medications: {current_meds}\nChecked Medications: {checked_meds}\nUnchecked Medications: {unchecked_meds}\nFlagged Interactions:\n{interactions}\nDrug Results:\n{results}")
 ])
 
 # -------------------------------
-# Agent Function
+# Agent stages (shared with the fused post-retrieval agent)
 # -------------------------------
-def treatment_agent(state: Dict[str, Any]) -> Dict[str, Any]:
-    """LangGraph node for Treatment Agent."""
+def retrieve_treatments(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Look up candidate drugs in RxNorm for the working diagnosis or symptoms."""
     query = state.get("diagnosis", "") or state.get("symptoms", "")
-    if not query:
-        state["treatment"] = {"treatments": [], "disclaimer": "No input provided."}
-        return state
+    search = rxnorm_query(state)
+    # Skip RxNorm entirely when the request deadline is nearly spent
+    skipped = bool(search) and not has_budget(state, MIN_HTTP_BUDGET)
+    drug_results = fetch_drug_treatments(search, timeout=call_timeout(state)) if search and not skipped else []
 
-    drug_results = fetch_drug_treatments(query)
+    # Check every candidate against the current medications before the LLM step
+    matrix = get_interactions()
+    current = matrix.resolve(state.get("currentMedications") or "")
+    # Medications the table can't resolve are left to the LLM's own interaction check
+    unchecked = matrix.unresolved(state.get("currentMedications"))
+    drug_results = [{**r, "interactions": matrix.check_text(r.get("name"), current)} for r in drug_results]
+    return {
+        "query": query,
+        "drug_results": drug_results,
+        "current_rxcuis": current,
+        "unchecked_medications": unchecked,
+        "flagged": [f for r in drug_results for f in r["interactions"]],
+        "skipped": skipped,
+        "patient_context": {
+            "age": state.get("age"),
+            "gender": state.get("gender"),
+            "medical_history": state.get("medicalHistory", state.get("history")),
+            "current_medications": state.get("currentMedications"),
+        },
+    }
 
-    parsed = None
+def format_interactions(flagged) -> str:
+    seen, lines = set(), []
+    for f in flagged:
+        key = (f["drug_rxcui"], f["interacts_with_rxcui"])
+        if key not in seen:
+            seen.add(key)
+            lines.append(f"- {f['drug']} + {f['interacts_with']} ({f['severity']}): {f['effect']} {f['management']}")
+    return "\n".join(lines) or "(none)"
+
+def format_medications(retrieval: Dict[str, Any]) -> Dict[str, str]:
+    """Prompt inputs splitting current medications into locally checked and unchecked."""
+    names = get_interactions().names
+    return {
+        "checked_meds": ", ".join(names.get(r, r) for r in retrieval.get("current_rxcuis", [])) or "(none)",
+        "unchecked_meds": ", ".join(retrieval.get("unchecked_medications", [])) or "(none)",
+    }
+
+def attach_interactions(treatments, current_rxcuis):
+    """Deterministic interaction flags on each suggested treatment (whatever the LLM wrote)."""
+    matrix = get_interactions()
+    out = []
+    for t in treatments:
+        flagged = matrix.check_text(t.get("name"), current_rxcuis) if isinstance(t, dict) else []
+        for f in flagged:
+            metrics.inc("drug_interactions_flagged", severity=f["severity"])
+        out.append({**t, "interactions": flagged} if isinstance(t, dict) else t)
+    return out
+
+def validate_treatments(parsed: Any) -> bool:
+    """Check an LLM reply matches the treatments schema."""
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("treatments"), list):
+        return False
+    return all(isinstance(t, dict) and t.get("name") for t in parsed["treatments"])
+
+def recommend_treatments(retrieval: Dict[str, Any], timeout: float = None):
+    """Single LLM round trip composing patient-aware treatments (None if unavailable)."""
+    pc = retrieval["patient_context"]
     try:
         if os.getenv("OPENROUTER_API_KEY"):
-            chain = treatment_prompt | llm
-            result = chain.invoke({
-                "condition": query,
-                "age": (state.get("age") or ""),
-                "gender": (state.get("gender") or ""),
-                "medical_history": (state.get("medicalHistory") or state.get("history") or ""),
-                "current_meds": (state.get("currentMedications") or ""),
-                "results": json.dumps(drug_results, indent=2)
-            })
-            parsed = json.loads((result.content or "").strip())
+            content = invoke_llm(treatment_prompt, LLM_TEMPERATURE, {
+                "condition": retrieval["query"],
+                "age": (pc.get("age") or ""),
+                "gender": (pc.get("gender") or ""),
+                "medical_history": (pc.get("medical_history") or ""),
+                "current_meds": (pc.get("current_medications") or ""),
+                **format_medications(retrieval),
+                "interactions": format_interactions(retrieval["flagged"]),
+                "results": json.dumps(retrieval["drug_results"], indent=2)
+            }, timeout=timeout, validate=lambda c: validate_treatments(json.loads(c)))
+            parsed = json.loads(content)
+            if validate_treatments(parsed):
+                return parsed
     except Exception as e:
         print(f"❌ Treatment LLM error: {e}")
-        parsed = None
+    return None
+
+def build_treatment_output(retrieval: Dict[str, Any], parsed) -> Dict[str, Any]:
+    if not retrieval["query"]:
+        return {"treatments": [], "disclaimer": "No input provided."}
 
     if parsed is None:
         # Minimal passthrough list from RxNorm
@@ -103,27 +174,46 @@ def treatment_agent(state: Dict[str, Any]) -> Dict[str, Any]:
                     "rationale": "Listed based on RxNorm lookup; details unavailable in dev mode.",
                     "source": "RxNorm"
                 }
-                for r in drug_results
+                for r in retrieval["drug_results"]
             ]
         }
 
-    state["treatment"] = {
-        "query": query,
-        "treatments": parsed.get("treatments", []),
-        "patient_context": {
-            "age": state.get("age"),
-            "gender": state.get("gender"),
-            "medical_history": state.get("medicalHistory", state.get("history")),
-            "current_medications": state.get("currentMedications"),
-        },
+    return {
+        "query": retrieval["query"],
+        "treatments": attach_interactions(parsed.get("treatments", []), retrieval.get("current_rxcuis", [])),
+        "unchecked_medications": retrieval.get("unchecked_medications", []),
+        "patient_context": retrieval["patient_context"],
         "disclaimer": "AI + RxNorm suggestions personalized by patient context. In development, outputs may be simplified if API keys are missing. Verify with clinical guidelines."
     }
+
+# -------------------------------
+# Agent Function
+# -------------------------------
+def treatment_agent(state: Dict[str, Any]) -> Dict[str, Any]:
+    """LangGraph node for Treatment Agent."""
+    retrieval = retrieve_treatments(state)
+    parsed = None
+    degraded, reason = retrieval["skipped"], "deadline"
+    if retrieval["query"]:
+        if has_budget(state, MIN_LLM_BUDGET):
+            parsed = recommend_treatments(retrieval, timeout=llm_timeout(state))
+            if parsed is None:
+                # LLM failed or timed out: plain RxNorm passthrough
+                degraded, reason = True, "llm_error"
+        else:
+            # Out of budget: plain RxNorm passthrough
+            degraded = True
+    state["treatment"] = build_treatment_output(retrieval, parsed)
+    if degraded:
+        mark_partial(state, "treatment", reason)
     return state
 
 # -------------------------------
 # Build Graph (standalone)
 # -------------------------------
 def build_treatment_graph():
+    from langgraph.graph import StateGraph, END
+
     graph = StateGraph(dict)
     graph.add_node("treatment_agent", treatment_agent)
     graph.set_entry_point("treatment_agent")
@@ -0,0 +1,70 @@
+import os
+import json
+import math
+import time
+
+from backend.utils.case_ranker import rank_locally
+
+# Quality comparison of case-matcher rankers on a labeled set:
+# BioPortal order (passthrough), local deterministic ranker, and the LLM ranker
+# (only when OPENROUTER_API_KEY is set).
+# Usage: python -m backend.bench_case_ranker
+
+LABELED_SET = os.path.join(os.path.dirname(__file__), "data", "case_ranker_labeled.json")
+K = 3
+
+
+def precision_at_k(ranked, relevant, k=K):
+    return sum(1 for code in ranked[:k] if code in relevant) / k
+
+
+def reciprocal_rank(ranked, relevant):
+    for idx, code in enumerate(ranked, 1):
+        if code in relevant:
+            return 1.0 / idx
+    return 0.0
+
+
+def ndcg_at_k(ranked, relevant, k=K):
+    dcg = sum(1.0 / math.log2(i + 2) for i, code in enumerate(ranked[:k]) if code in relevant)
+    ideal = sum(1.0 / math.log2(i + 2) for i in range(min(k, len(relevant))))
+    return dcg / ideal if ideal else 0.0
+
+
+def passthrough(case):
+    return [c["icd_code"] for c in case["candidates"][:K]]
+
+
+def local(case):
+    parsed = rank_locally(case["candidates"], case["symptoms"], case["differentials"], top_k=K)
+    return [c["icd_code"] for c in parsed["matched_cases"]]
+
+
+def llm(case):
+    from backend.agents.case_matcher import rank_case_matches
+    parsed = rank_case_matches({"raw_results": case["candidates"]}) or {"matched_cases": []}
+    return [c.get("icd_code") for c in parsed["matched_cases"]]
+
+
+if __name__ == "__main__":
+    with open(LABELED_SET, encoding="utf-8") as f:
+        cases = json.load(f)
+
+    rankers = [("bioportal", passthrough), ("local", local)]
+    if os.getenv("OPENROUTER_API_KEY"):
+        rankers.append(("llm", llm))
+
+    print(f"\n=== Case ranker quality on {len(cases)} labeled cases ===\n")
+    print(f"{'ranker':<10} {'P@3':>6} {'MRR':>6} {'nDCG@3':>7} {'ms/case':>8}")
+    for name, ranker in rankers:
+        p, rr, nd, elapsed = 0.0, 0.0, 0.0, 0.0
+        for case in cases:
+            relevant = set(case["relevant"])
+            start = time.perf_counter()
+            ranked = ranker(case)
+            elapsed += time.perf_counter() - start
+            p += precision_at_k(ranked, relevant)
+            rr += reciprocal_rank(ranked, relevant)
+            nd += ndcg_at_k(ranked, relevant)
+        n = len(cases)
+        print(f"{name:<10} {p / n:>6.2f} {rr / n:>6.2f} {nd / n:>7.2f} {1000 * elapsed / n:>8.2f}")
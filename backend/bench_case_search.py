@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import random
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from backend.agents import case_matcher
+from backend.bench_case_ranker import LABELED_SET
+from backend.utils.query_canon import bioportal_query
+
+# Combined BioPortal search vs. per-ontology concurrent search with reciprocal
+# rank fusion on the labeled case-ranker set: wall-clock latency, ontologies
+# represented in the top 5 and recall of the labeled ICD codes.
+# Needs BIOPORTAL_API_KEY; run with SHARED_CACHE_ENABLED=0 to measure live calls.
+# `--simulate` needs no key: concurrent "multi" searches against ontologies
+# with BioPortal-like latency, comparing the old fixed 8-thread search pool
+# with the sized one – per-request latency and ontologies answered in time.
+# Usage: python -m backend.bench_case_search [repeats | --simulate [concurrency]]
+
+
+def _sources(results):
+    return {s for r in results for s in r.get("sources", ["combined"])}
+
+
+def run(search, cases, repeats):
+    latencies, recalls, coverage = [], [], []
+    for case in cases:
+        query = bioportal_query({"symptoms": case["symptoms"]})
+        for _ in range(repeats):
+            start = time.perf_counter()
+            results = search(query)
+            latencies.append(time.perf_counter() - start)
+        codes = {r["icd_code"] for r in results}
+        recalls.append(len(codes & set(case["relevant"])) / len(case["relevant"]))
+        coverage.append(len(_sources(results)))
+    return statistics.median(latencies), statistics.mean(recalls), statistics.mean(coverage)
+
+
+def simulate(concurrency, rounds=5, timeout=1.0):
+    def ontology(query, name, max_results, timeout):
+        time.sleep(random.uniform(0.15, 0.45))
+        return [{"icd_code": f"{name}-{query}", "name": f"{name} hit", "description": "", "score": 1}]
+
+    def request(i):
+        start = time.perf_counter()
+        fused = case_matcher.fetch_case_matches_multi(f"q{i}", timeout=timeout)
+        return time.perf_counter() - start, len(fused)
+
+    n_ontologies = len(case_matcher.CASE_MATCHER_ONTOLOGIES)
+    print(f"\n=== Simulated multi search: {concurrency} concurrent requests, {n_ontologies} ontologies, "
+          f"{timeout:.1f} s timeout ===\n")
+    print(f"{'search pool':<14} {'p50 s':>7} {'p95 s':>7} {'ontologies':>11}")
+    for label, size in (("8 (fixed)", 8), (f"{case_matcher.search_pool_size()} (sized)", case_matcher.search_pool_size())):
+        pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix="case-search")
+        with mock.patch.object(case_matcher, "fetch_ontology_matches", ontology), \
+                mock.patch.object(case_matcher, "_search_pool", pool), \
+                mock.patch.dict(case_matcher.LOCAL_SOURCES, {}, clear=True), \
+                ThreadPoolExecutor(max_workers=concurrency) as clients:
+            samples = [r for _ in range(rounds) for r in clients.map(request, range(concurrency))]
+        pool.shutdown()
+        latencies = sorted(s[0] for s in samples)
+        answered = statistics.mean(s[1] for s in samples)
+        print(f"{label:<14} {statistics.median(latencies):>7.2f} {latencies[int(0.95 * (len(latencies) - 1))]:>7.2f} "
+              f"{answered:>6.2f} / {n_ontologies}")
+
+
+if __name__ == "__main__":
+    if "--simulate" in sys.argv:
+        args = [a for a in sys.argv[1:] if a != "--simulate"]
+        simulate(int(args[0]) if args else 8)
+        sys.exit()
+    if not os.getenv("BIOPORTAL_API_KEY"):
+        sys.exit("BIOPORTAL_API_KEY is required for this benchmark")
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    with open(LABELED_SET, encoding="utf-8") as f:
+        cases = json.load(f)
+
+    print(f"\n=== Case search: combined vs. multi-source RRF ({len(cases)} cases) ===\n")
+    print(f"{'mode':<10} {'p50 s':>8} {'recall@5':>9} {'sources':>8}")
+    for mode, search in (("combined", case_matcher.fetch_case_matches),
+                         ("multi", case_matcher.fetch_case_matches_multi)):
+        p50, recall, sources = run(search, cases, repeats)
+        print(f"{mode:<10} {p50:>8.2f} {recall:>9.2f} {sources:>8.1f}")
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import statistics
+
+# Measure real LLM calls, not shared-cache hits
+os.environ.setdefault("SHARED_CACHE_ENABLED", "0")
+
+from langchain_core.callbacks import get_usage_metadata_callback
+
+from backend.orchestrator.orchestrator import build_orchestrator_graph
+
+# Latency and token cost: fused single-call mode vs. the three-call flow.
+# Needs OPENROUTER_API_KEY (and network) to be meaningful.
+# Usage: python -m backend.bench_fused [runs]
+
+CASES = [
+    {
+        "symptoms": "increased thirst, frequent urination, unexplained weight loss",
+        "age": 45,
+        "gender": "female",
+        "medicalHistory": "family history of type 2 diabetes",
+        "currentMedications": "",
+        "urgency": "moderate",
+    },
+    {
+        "symptoms": "Crushing chest pain radiating to left arm, diaphoresis, dyspnea",
+        "age": 62,
+        "gender": "male",
+        "medicalHistory": "hypertension, smoker, family history of CAD",
+        "currentMedications": "amlodipine",
+        "urgency": "high",
+    },
+]
+
+
+def run(graph, runs: int):
+    latencies, tokens_in, tokens_out = [], [], []
+    for _ in range(runs):
+        for case in CASES:
+            with get_usage_metadata_callback() as cb:
+                start = time.perf_counter()
+                graph.invoke(dict(case))
+                latencies.append(time.perf_counter() - start)
+            usage = cb.usage_metadata.values()
+            tokens_in.append(sum(u.get("input_tokens", 0) for u in usage))
+            tokens_out.append(sum(u.get("output_tokens", 0) for u in usage))
+    return latencies, tokens_in, tokens_out
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    print("\n=== Fused vs. three-call post-retrieval benchmark ===\n")
+    print(f"{'mode':<10} {'p50 s':>8} {'max s':>8} {'in tok':>8} {'out tok':>8}")
+    for label, fused in (("three-call", False), ("fused", True)):
+        latencies, tokens_in, tokens_out = run(build_orchestrator_graph(fused=fused), runs)
+        print(f"{label:<10} {statistics.median(latencies):>8.2f} {max(latencies):>8.2f} "
+              f"{statistics.mean(tokens_in):>8.0f} {statistics.mean(tokens_out):>8.0f}")
@@ -0,0 +1,44 @@
+import sys
+import time
+import statistics
+
+from backend.utils.icd10 import ICD10CM_CODES_PATH, ICD10Table
+
+# Load time of the ICD-10-CM table and per-differential validation time
+# (valid codes, categories to refine, typos and lay names to correct).
+# Point ICD10CM_CODES_PATH at the full CMS order file to bench the full release.
+# Usage: python -m backend.bench_icd10 [rounds]
+
+DIFFERENTIALS = [
+    {"name": "Non-ST elevation myocardial infarction", "icd10cm_code": "I21.4"},
+    {"name": "Heart attack", "icd10cm_code": "I21"},
+    {"name": "COPD exacerbation", "icd10cm_code": "J44"},
+    {"name": "Community acquired pnuemonia", "icd10cm_code": "18.9"},
+    {"name": "Afib", "icd10cm_code": None},
+    {"name": "Type 2 diabetes", "icd10cm_code": "E11.9"},
+    {"name": "Gastroesophageal reflux", "icd10cm_code": "K21.9"},
+    {"name": "Tension headache", "icd10cm_code": "G44.209"},
+    {"name": "Pneumonia", "icd10cm_code": "I10"},
+]
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    start = time.perf_counter()
+    table = ICD10Table.load(ICD10CM_CODES_PATH)
+    load_ms = (time.perf_counter() - start) * 1e3
+    print(f"loaded {len(table):,} codes in {load_ms:.1f} ms (complete={table.complete})")
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        table.validate_differentials(DIFFERENTIALS)
+        samples.append((time.perf_counter() - start) / len(DIFFERENTIALS))
+    print(f"validation: {statistics.median(samples) * 1e6:.1f} µs per differential (median of {rounds})\n")
+
+    for d, out in zip(DIFFERENTIALS, table.validate_differentials(DIFFERENTIALS)):
+        print(f"{d['name']:<40} {str(d['icd10cm_code']):<9} → {out['icd10cm_code']:<9} {out['icd10cm_status']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import sys
+import time
+
+from backend.utils.interactions import get_interactions
+
+# Cost of the local interaction check per request: resolving the patient's
+# medication list and checking every treatment candidate against it.
+# Usage: python -m backend.bench_interactions [iterations]
+
+MEDICATIONS = "Coumadin 5 mg daily, lisinopril 10 mg, atorvastatin 40 mg nightly, omeprazole 20 mg"
+CANDIDATES = [
+    "ibuprofen 400 MG Oral Tablet", "aspirin 81 MG Delayed Release Oral Tablet",
+    "clarithromycin 500 MG Oral Tablet", "acetaminophen 325 MG Oral Tablet",
+    "clopidogrel 75 MG Oral Tablet", "Physical therapy", "sildenafil 50 MG Oral Tablet",
+]
+
+
+def _per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    matrix = get_interactions()
+    current = matrix.resolve(MEDICATIONS)
+    flagged = sum(len(matrix.check_text(c, current)) for c in CANDIDATES)
+
+    print(f"\n=== Local drug interaction check ({len(matrix)} known pairs) ===\n")
+    print(f"resolve medication list:         {_per_call_us(lambda: matrix.resolve(MEDICATIONS), iterations):8.1f} µs")
+    print(f"check one candidate:             {_per_call_us(lambda: matrix.check_text(CANDIDATES[0], current), iterations):8.1f} µs")
+    print(f"check {len(CANDIDATES)} candidates ({flagged} flagged): "
+          f"{_per_call_us(lambda: [matrix.check_text(c, current) for c in CANDIDATES], iterations):8.1f} µs")
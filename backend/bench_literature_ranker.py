@@ -0,0 +1,55 @@
+import sys
+import time
+import random
+import statistics
+
+from backend.utils import literature_ranker
+from backend.utils.literature_ranker import rank_articles
+
+# Latency of the local PubMed re-ranker on realistic candidate pools
+# (structured abstracts of ~250 words, 10 MeSH terms each). "cold" is the
+# first ranking of a pool (articles tokenized), the rest reuse the token ids.
+# Usage: python -m backend.bench_literature_ranker [repeats]
+
+_VOCAB = ("chest pain dyspnea troponin myocardial infarction aortic dissection pulmonary embolism "
+          "hypertension diabetes statin anticoagulation cohort randomized outcome mortality biomarker "
+          "imaging echocardiography angiography sepsis fever pneumonia migraine stroke").split()
+_TYPES = ("Journal Article", "Review", "Case Reports", "Randomized Controlled Trial", "Meta-Analysis")
+
+
+def candidate_pool(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    return [
+        {
+            "pmid": str(30000000 + i),
+            "title": " ".join(rnd.choices(_VOCAB, k=10)),
+            "abstract": " ".join(rnd.choices(_VOCAB, k=250)),
+            "mesh_terms": rnd.sample(_VOCAB, 10),
+            "publication_types": [rnd.choice(_TYPES)],
+            "year": str(rnd.randint(1995, 2025)),
+        }
+        for i in range(n)
+    ]
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    differentials = [{"name": "Acute myocardial infarction"}, {"name": "Aortic dissection"},
+                     {"name": "Pulmonary embolism"}]
+
+    print("\n=== Local literature re-ranking ===\n")
+    print(f"{'pool':>6} {'cold ms':>8} {'median ms':>10} {'p95 ms':>8}")
+    for n in (10, 50, 100, 200, 500):
+        pool = candidate_pool(n)
+        literature_ranker._indexed.cache_clear()
+        start = time.perf_counter()
+        rank_articles(pool, "chest pain", differentials, top_k=3)
+        cold = (time.perf_counter() - start) * 1000
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            rank_articles(pool, "chest pain radiating to back, dyspnea", differentials,
+                          context="hypertension statin", top_k=3)
+            times.append((time.perf_counter() - start) * 1000)
+        times.sort()
+        print(f"{n:>6} {cold:>8.2f} {statistics.median(times):>10.2f} {times[int(0.95 * (len(times) - 1))]:>8.2f}")
@@ -0,0 +1,91 @@
+import sys
+import time
+import statistics
+
+from backend.utils.pdf_generator import PDF, build_report, get_unicode_fonts, needs_unicode, _font_files
+
+# File size and render time (layout + output) of PDF reports: core Helvetica vs.
+# an embedded Unicode font subset (stock font file vs. the hinting-free copy
+# used by default), with and without content-stream compression, for a typical
+# report and a ~100-page one. The default `auto` mode picks core or unicode per
+# report; the sample reports' text is Latin-1, so it renders them as core.
+# Usage: python -m backend.bench_pdf [rounds]
+
+
+def _report(n_articles: int, n_cases: int) -> dict:
+    disclaimer = "This is AI-generated and not medical advice. Consult a licensed clinician."
+    return {
+        "patient_info": {"patientId": "P-1042", "age": 58, "gender": "male",
+                         "medicalHistory": "Hypertension, hyperlipidemia – Müller, 2019",
+                         "currentMedications": "Atorvastatin 20 mg, amlodipine ≥ 5 mg", "urgency": "high"},
+        "symptom_analysis": {
+            "top_differentials": [
+                {"name": f"Differential {i}", "icd10cm_code": f"I2{i}.9",
+                 "rationale": "Typical presentation with radiating pain and risk factors. " * 3}
+                for i in range(5)
+            ],
+            "risk_level": "high", "disclaimer": disclaimer,
+        },
+        "literature": {
+            "query": "acute coronary syndrome chest pain",
+            "articles": [
+                {"pmid": str(30000000 + i), "title": f"Study {i} of chest pain outcomes",
+                 "summary": "Randomized trial of early invasive strategy in NSTEMI patients. " * 6}
+                for i in range(n_articles)
+            ],
+            "disclaimer": disclaimer,
+        },
+        "case_matcher": {
+            "matched_cases": [
+                {"icd_code": f"I21.{i % 10}", "name": f"Acute myocardial infarction {i}",
+                 "description": "Case with ST changes, troponin rise and typical symptoms.", "match_score": 0.9}
+                for i in range(n_cases)
+            ],
+            "disclaimer": disclaimer,
+        },
+        "treatment": {
+            "treatments": [
+                {"name": f"Drug {i}", "class": "antiplatelet", "rationale": "Guideline first line. " * 4}
+                for i in range(5)
+            ],
+            "disclaimer": disclaimer,
+        },
+        "summary": {"patient_summary": "Findings suggest acute coronary syndrome. " * 8,
+                    "clinical_summary": "Leading differential NSTEMI; obtain serial troponins and ECG. " * 6},
+    }
+
+
+def _render(variant, report):
+    mode, fonts, compress = variant
+    pdf = PDF(mode, fonts)
+    pdf.set_compression(compress)
+    build_report(pdf, report)
+    return bytes(pdf.output()), pdf.page_no()
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    variants = [("core", ("core", None, True))]
+    lean, stock = get_unicode_fonts(), _font_files()
+    if lean:
+        variants += [
+            ("unicode, stock font", ("unicode", stock, True)),
+            ("unicode", ("unicode", lean, True)),
+            ("unicode, uncompressed", ("unicode", lean, False)),
+        ]
+    reports = [("typical", _report(10, 10), rounds), ("100 pages", _report(820, 820), max(1, rounds // 5))]
+
+    print(f"{'report':<10} {'variant':<24} {'pages':>5} {'bytes':>9} {'ms':>8}")
+    for label, report, n in reports:
+        for name, variant in variants:
+            samples = []
+            for _ in range(n):
+                start = time.perf_counter()
+                data, pages = _render(variant, report)
+                samples.append(time.perf_counter() - start)
+            print(f"{label:<10} {name:<24} {pages:>5} {len(data):>9,} {statistics.median(samples) * 1e3:>8.1f}")
+        print(f"{label:<10} auto -> {'unicode' if needs_unicode(report) else 'core'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import io
+import sys
+import time
+import statistics
+import tracemalloc
+from xml.etree import ElementTree as ET
+
+from backend.utils.pubmed_scheduler import _article_dict, iter_efetch_articles
+
+# Previous DOM parser (decode to str, ET.fromstring, findall) vs. the streaming
+# iterparse parser on synthetic efetch payloads of realistic article size.
+# "dom+fields" builds the full DOM but extracts the same fields as streaming,
+# separating parser cost from the extra MeSH / section / year extraction.
+# Usage: python -m backend.bench_pubmed_parse [repeats]
+
+_SECTION = ("Lorem ipsum clinical outcome text with numbers 12.5% (95% CI 1.1-2.3) and "
+            "<i>inline</i> markup describing cohorts, endpoints and adverse events. ") * 6
+
+
+def efetch_payload(n_articles: int) -> bytes:
+    parts = ['<?xml version="1.0" ?>\n<PubmedArticleSet>']
+    for i in range(n_articles):
+        pmid = 30000000 + i
+        parts.append(
+            f"<PubmedArticle><MedlineCitation Status=\"MEDLINE\"><PMID Version=\"1\">{pmid}</PMID>"
+            f"<Article><Journal><JournalIssue><PubDate><Year>{2000 + i % 25}</Year></PubDate></JournalIssue>"
+            f"<Title>Journal {i % 40}</Title></Journal>"
+            f"<ArticleTitle>Study {i} of <i>chest pain</i> outcomes</ArticleTitle><Abstract>"
+            + "".join(f'<AbstractText Label="{label}">{_SECTION}</AbstractText>'
+                      for label in ("BACKGROUND", "METHODS", "RESULTS", "CONCLUSIONS"))
+            + "</Abstract><AuthorList>"
+            + "".join(f"<Author><LastName>Author{a}</LastName><ForeName>A</ForeName></Author>" for a in range(8))
+            + "</AuthorList><PublicationTypeList><PublicationType>Journal Article</PublicationType>"
+            "</PublicationTypeList></Article><MeshHeadingList>"
+            + "".join(f"<MeshHeading><DescriptorName>Term {m}</DescriptorName></MeshHeading>" for m in range(10))
+            + "</MeshHeadingList></MedlineCitation><PubmedData><ReferenceList>"
+            + "".join(f"<Reference><Citation>Ref {r} et al. J Med. 2001;1:1.</Citation></Reference>" for r in range(30))
+            + "</ReferenceList></PubmedData></PubmedArticle>"
+        )
+    parts.append("</PubmedArticleSet>")
+    return "".join(parts).encode("utf-8")
+
+
+def dom_parse(payload: bytes):
+    root = ET.fromstring(payload.decode("utf-8"))
+    results = []
+    for article in root.findall(".//PubmedArticle"):
+        abstract_texts = [ab.text for ab in article.findall(".//AbstractText") if ab.text]
+        results.append({
+            "pmid": article.findtext(".//PMID"),
+            "title": article.findtext(".//ArticleTitle", default="No title"),
+            "abstract": " ".join(abstract_texts).strip(),
+        })
+    return results
+
+
+def dom_full_parse(payload: bytes):
+    return [_article_dict(a) for a in ET.fromstring(payload).iter("PubmedArticle")]
+
+
+def stream_parse(payload: bytes):
+    # The scheduler reads from the response socket; BytesIO stands in for it
+    return list(iter_efetch_articles(io.BytesIO(payload)))
+
+
+def measure(fn, payload: bytes, repeats: int):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(payload)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times) * 1000, peak / 1e6
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print("\n=== efetch XML parsing: DOM vs. streaming ===\n")
+    print(f"{'articles':>8} {'payload MB':>10} {'parser':<10} {'ms':>9} {'peak MB':>9}")
+    for n in (3, 50, 200, 1000):
+        payload = efetch_payload(n)
+        for label, fn in (("dom", dom_parse), ("dom+fields", dom_full_parse), ("streaming", stream_parse)):
+            ms, peak = measure(fn, payload, repeats)
+            print(f"{n:>8} {len(payload) / 1e6:>10.2f} {label:<10} {ms:>9.1f} {peak:>9.2f}")
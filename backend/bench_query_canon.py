@@ -0,0 +1,83 @@
+import sys
+import random
+
+from backend.utils.cassette import Cassette
+from backend.utils.query_canon import SYNONYMS, normalize, pubmed_query, bioportal_query, rxnorm_query
+
+# Shared-cache hit rate of external queries, raw vs. canonical, over a request
+# corpus: the /analyze bodies of a recorded cassette, or a synthetic corpus of
+# held-out paraphrases – written independently of query_canon.SYNONYMS (the
+# bench refuses to run if one contains a listed lay term or abbreviation), with
+# ages spread over every MeSH age group and mixed genders.
+# Hit rate = share of requests whose query was already seen (unbounded cache).
+# Usage: python -m backend.bench_query_canon [traffic.cassette.jsonl]
+
+_CASES = [
+    (["Chest pain and breathing difficulty", "pain in the chest, winded", "chest pain, can't catch my breath",
+      "crushing chest pain with dyspnea on exertion", "Breathing difficulty and chest pain"],
+     ["unstable angina", "Angina"], ["elevated BP", "hypertension", ""], ["atorvastatin 20 mg", "statin", ""]),
+    (["Fever and cough", "cough with fever", "feverish, productive cough", "hacking cough and chills",
+      "temperature of 39 and a cough"],
+     ["pneumonia", "Community acquired pneumonia"], ["", "asthma"], ["", "salbutamol inhaler"]),
+    (["Headache and nausea", "throbbing head pain, feeling sick", "migraine-type headache with queasiness",
+      "head pounding and nausea", "nausea, headache"],
+     ["migraine", "Migraine without aura"], ["", "migraines"], ["sumatriptan 50 mg", ""]),
+    (["Abdominal pain and vomiting", "tummy pain, vomiting", "epigastric pain with retching",
+      "vomiting and cramping abdominal pain", "puking, gut pain"],
+     ["gastroenteritis", "Acute gastroenteritis"], ["", "high blood sugar"], ["insulin", ""]),
+    (["Palpitations and dizziness", "fluttering heartbeat, feeling faint", "pounding heart, woozy",
+      "rapid heartbeat with vertigo", "dizziness, palpitations"],
+     ["supraventricular tachycardia", "SVT"], ["irregular heartbeat", ""], ["blood thinner", "apixaban 5 mg"]),
+]
+_GENDERS = ["male", "Male", "M", "man", "female", "Female", "F", "woman", ""]
+
+
+def _leaked_terms(text: str):
+    """Listed lay terms / abbreviations (not canonical names) a held-out phrase uses."""
+    words = f" {normalize(text)} "
+    return [v for variants in SYNONYMS.values() for v in variants if f" {v} " in words]
+
+
+def synthetic_corpus(n: int, seed: int = 0):
+    leaks = {p: _leaked_terms(p) for case in _CASES for field in case for p in field if _leaked_terms(p)}
+    if leaks:
+        raise ValueError(f"held-out phrases use SYNONYMS entries: {leaks}")
+    rnd = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        symptoms, diagnoses, histories, meds = rnd.choice(_CASES)
+        corpus.append({
+            "symptoms": rnd.choice(symptoms),
+            "diagnosis": rnd.choice(diagnoses) if rnd.random() < 0.5 else "",
+            "age": str(rnd.randint(1, 90)),
+            "gender": rnd.choice(_GENDERS),
+            "medicalHistory": rnd.choice(histories),
+            "currentMedications": rnd.choice(meds),
+        })
+    return corpus
+
+
+def hit_rate(keys) -> float:
+    seen, hits = set(), 0
+    for key in keys:
+        hits += key in seen
+        seen.add(key)
+    return hits / len(keys) if keys else 0.0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        corpus = [e["body"] for e in Cassette(sys.argv[1]).recorded_requests()
+                  if e["path"] == "/analyze" and isinstance(e.get("body"), dict)]
+        source = sys.argv[1]
+    else:
+        corpus = synthetic_corpus(500)
+        source = "held-out synthetic paraphrases"
+
+    print(f"\n=== External query cache hit rate ({len(corpus)} requests, {source}) ===\n")
+    print(f"{'backend':<10} {'mode':<10} {'distinct':>8} {'hit rate':>9} {'avg chars':>10}")
+    for name, build in (("pubmed", pubmed_query), ("bioportal", bioportal_query), ("rxnorm", rxnorm_query)):
+        for mode, canonical in (("raw", False), ("canonical", True)):
+            keys = [build(state, canonical=canonical) for state in corpus]
+            avg = sum(map(len, keys)) / len(keys) if keys else 0
+            print(f"{name:<10} {mode:<10} {len(set(keys)):>8} {hit_rate(keys):>8.1%} {avg:>10.1f}")
@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+import subprocess
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from backend.bench_startup import ROOT, _free_port
+from backend.utils.cassette import Cassette
+
+# Load generator: replays the request stream of a recorded cassette against the
+# API at a configurable speed and concurrency, with PubMed/BioPortal/RxNorm and
+# LLM responses served from the same cassette (CASSETTE_MODE=replay).
+#
+# Record (real backends):  CASSETTE_MODE=record SHARED_CACHE_ENABLED=0 uvicorn server.main:app
+# Replay:                  python -m backend.bench_replay <CASSETTE_PATH> --speed 4 --concurrency 16
+# Against a running server: add --url http://host:8000 (it must run with CASSETTE_MODE=replay)
+
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def start_server(cassette_path: str, workers: int, latency_scale: float):
+    port = _free_port()
+    env = {
+        **os.environ,
+        "CASSETTE_MODE": "replay",
+        "CASSETTE_PATH": os.path.abspath(cassette_path),
+        "CASSETTE_LATENCY_SCALE": str(latency_scale),
+        "SHARED_CACHE_ENABLED": "0",
+        "CHECKPOINTS_ENABLED": os.environ.get("CHECKPOINTS_ENABLED", "0"),
+    }
+    # Agents skip the LLM / BioPortal without keys; replay never sends them anywhere
+    env.setdefault("OPENROUTER_API_KEY", "replay")
+    env.setdefault("BIOPORTAL_API_KEY", "replay")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url + "/", timeout=1).status_code == 200:
+                return proc, url
+        except requests.RequestException:
+            time.sleep(0.05)
+    proc.terminate()
+    raise TimeoutError("replay server did not start")
+
+
+def replay(url: str, recorded: list, speed: float, concurrency: int, loops: int):
+    """Send the recorded requests; `speed` scales inter-arrival gaps (0 = as fast as possible)."""
+    local = threading.local()
+    results = []
+    lock = threading.Lock()
+
+    def send(entry):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        target = f"{url}{entry['path']}" + (f"?{entry['query']}" if entry.get("query") else "")
+        # Distinct clients keep their own admission-control queue
+        headers = {"Authorization": f"Bearer {entry.get('client', 'anonymous')}"}
+        start = time.perf_counter()
+        try:
+            status = session.request(entry["method"], target, json=entry.get("body"), headers=headers,
+                                     timeout=120).status_code
+        except requests.RequestException:
+            status = "exception"
+        with lock:
+            results.append((entry["path"], status, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for loop in range(loops):
+            loop_start = time.perf_counter()
+            for entry in recorded:
+                if speed > 0:
+                    delay = entry["t"] / speed - (time.perf_counter() - loop_start)
+                    if delay > 0:
+                        time.sleep(delay)
+                pool.submit(send, entry)
+    return results, time.perf_counter() - start
+
+
+def report(results: list, elapsed: float):
+    print(f"\nrequests: {len(results)}  duration: {elapsed:.1f} s  throughput: {len(results) / elapsed:.2f} req/s")
+    by_path = defaultdict(list)
+    for path, status, latency in results:
+        by_path[path].append((status, latency))
+    by_path["all"] = [(s, l) for _, s, l in results]
+    print(f"\n{'path':<16} {'n':>6} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'errors':>8}")
+    for path, rows in by_path.items():
+        latencies = sorted(l for _, l in rows)
+        errors = sum(1 for s, _ in rows if s == "exception" or s >= 400)
+        print(f"{path:<16} {len(rows):>6} {_percentile(latencies, 0.5):>8.2f} {_percentile(latencies, 0.95):>8.2f} "
+              f"{_percentile(latencies, 0.99):>8.2f} {errors / len(rows):>7.1%}")
+    statuses = Counter(str(s) for _, s, _ in results)
+    print("\nstatus codes:", ", ".join(f"{k}: {v}" for k, v in sorted(statuses.items())))
+    if results:
+        print(f"mean latency: {statistics.mean(l for _, _, l in results):.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded traffic cassette against the API")
+    parser.add_argument("cassette")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression of arrivals (0 = no gaps)")
+    parser.add_argument("--concurrency", type=int, default=8, help="max requests in flight")
+    parser.add_argument("--loops", type=int, default=1, help="replay the stream this many times")
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the spawned server")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier for recorded backend latency")
+    args = parser.parse_args()
+
+    recorded = sorted(Cassette(args.cassette).recorded_requests(), key=lambda e: e["t"])
+    if not recorded:
+        sys.exit(f"No recorded requests in {args.cassette}")
+    print(f"\n=== Replaying {len(recorded)} requests × {args.loops} "
+          f"(speed {args.speed}x, concurrency {args.concurrency}) ===")
+
+    proc = None
+    url = args.url
+    if url is None:
+        proc, url = start_server(args.cassette, args.workers, args.latency_scale)
+    try:
+        report(*replay(url, recorded, args.speed, args.concurrency, args.loops))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
@@ -0,0 +1,100 @@
+import sys
+import json
+import time
+import gzip
+import statistics
+
+from backend.utils import response_codec
+from backend.utils.response_codec import compact, serialize
+
+# Payload size and serialization time of /analyze responses:
+# FastAPI's default encoder (jsonable_encoder + json.dumps) vs. orjson / msgpack,
+# full vs. compact view, uncompressed vs. gzip / zstd.
+# Usage: python -m backend.bench_response [iterations]
+
+
+def _state(n_articles: int, n_cases: int, n_treatments: int) -> dict:
+    patient = {"age": 58, "gender": "male", "medical_history": "hypertension, hyperlipidemia",
+               "current_medications": "atorvastatin 20 mg"}
+    disclaimer = "This is AI-generated and not medical advice. Consult a licensed clinician."
+    return {
+        "symptoms": "Chest pain radiating to left arm, shortness of breath, diaphoresis",
+        "age": 58, "gender": "male", "medicalHistory": "hypertension, hyperlipidemia",
+        "currentMedications": "atorvastatin 20 mg", "urgency": "high",
+        "symptom_analysis": {
+            "top_differentials": [
+                {"name": f"Differential {i}", "icd10cm_code": f"I2{i}.9",
+                 "rationale": "Typical presentation with radiating pain and risk factors. " * 3}
+                for i in range(5)
+            ],
+            "risk_level": "high", "disclaimer": disclaimer,
+        },
+        "literature": {
+            "query": "acute coronary syndrome chest pain",
+            "articles": {"summaries": [
+                {"pmid": str(30000000 + i), "title": f"Study {i} of chest pain outcomes",
+                 "summary": "Randomized trial of early invasive strategy in NSTEMI patients. " * 6}
+                for i in range(n_articles)
+            ]},
+            "patient_context": patient, "disclaimer": disclaimer,
+        },
+        "case_matcher": {
+            "matched_cases": [
+                {"id": f"http://purl.bioontology.org/ontology/ICD10CM/I21.{i}", "label": f"Case {i}",
+                 "score": 0.9 - i / 100, "rationale": "Matches presentation and ICD category. " * 2}
+                for i in range(n_cases)
+            ],
+            "patient_context": patient, "disclaimer": disclaimer,
+        },
+        "treatment": {
+            "treatments": [
+                {"name": f"Drug {i}", "rxcui": str(1000 + i),
+                 "notes": "Consider contraindications and current medications. " * 3}
+                for i in range(n_treatments)
+            ],
+            "patient_context": patient, "disclaimer": disclaimer,
+        },
+        "summary": {"text": "Findings suggest ACS; initiate MONA and cardiology consult. " * 8},
+        "summary_disclaimer": disclaimer,
+        "partial_sections": [],
+        "run_id": "0" * 32,
+    }
+
+
+def _fastapi_default(obj) -> bytes:
+    from fastapi.encoders import jsonable_encoder
+    return json.dumps(jsonable_encoder(obj), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _time(fn, obj, iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(obj)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+
+def run(label: str, state: dict, iterations: int):
+    print(f"\n--- {label} state ---")
+    print(f"{'encoder':<26} {'µs':>9} {'bytes':>8} {'gzip':>8} {'zstd':>8}")
+    encoders = [
+        ("fastapi default (json)", _fastapi_default, state),
+        ("orjson", serialize, state),
+        ("msgpack", lambda o: serialize(o, msgpack=True), state),
+        ("orjson compact", lambda o: serialize(compact(o)), state),
+        ("msgpack compact", lambda o: serialize(compact(o), msgpack=True), state),
+    ]
+    for name, fn, obj in encoders:
+        body = fn(obj)
+        zipped = len(gzip.compress(body, compresslevel=response_codec.GZIP_LEVEL))
+        zstd = len(response_codec._zstd(body)) if response_codec.zstandard else "n/a"
+        print(f"{name:<26} {_time(fn, obj, iterations):>9.1f} {len(body):>8} {zipped:>8} {zstd:>8}")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    print("\n=== /analyze response encoding ===")
+    run("typical (3 articles, 3 cases, 3 treatments)", _state(3, 3, 3), iterations)
+    run("large (50 articles, 50 cases, 30 treatments)", _state(50, 50, 30), iterations)
@@ -0,0 +1,71 @@
+import os
+import sys
+import random
+import tempfile
+import multiprocessing
+
+from backend.utils.shared_cache import SharedCache, make_key
+
+# Hit rate and memory of the cross-worker shared cache vs. per-process caches
+# as the number of uvicorn-like workers grows. Requests follow a Zipf-like
+# distribution over case keys (few hot presentations, long tail).
+# Usage: python -m backend.bench_shared_cache [requests_per_worker]
+
+N_KEYS = 2000
+VALUE_BYTES = 2048
+ZIPF_S = 1.1
+
+
+def _weights():
+    return [1.0 / (rank ** ZIPF_S) for rank in range(1, N_KEYS + 1)]
+
+
+def _worker(args):
+    mode, path, n_requests, seed = args
+    rng = random.Random(seed)
+    weights = _weights()
+    keys = rng.choices(range(N_KEYS), weights=weights, k=n_requests)
+    payload = b"x" * VALUE_BYTES
+    hits = 0
+    if mode == "shared":
+        cache = SharedCache(path=path)
+        for k in keys:
+            key = make_key("bench", k)
+            if cache.get("bench", key) is not None:
+                hits += 1
+            else:
+                cache.set("bench", key, payload, ttl=600)
+        private_bytes = 0
+    else:
+        private = {}
+        for k in keys:
+            if k in private:
+                hits += 1
+            else:
+                private[k] = payload
+        private_bytes = len(private) * VALUE_BYTES
+    return hits, private_bytes
+
+
+def run(workers: int, n_requests: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench_cache.sqlite")
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for mode in ("private", "shared"):
+        with ctx.Pool(workers) as pool:
+            out = pool.map(_worker, [(mode, path, n_requests, seed) for seed in range(workers)])
+        hits = sum(h for h, _ in out)
+        mem = sum(b for _, b in out) if mode == "private" else SharedCache(path=path).stats()["bytes"]
+        results[mode] = (hits / (workers * n_requests), mem)
+    return results
+
+
+if __name__ == "__main__":
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print("\n=== Shared vs. per-process cache ===\n")
+    print(f"{'workers':>7} {'private hit':>12} {'shared hit':>11} {'private MB':>11} {'shared MB':>10}")
+    for workers in (1, 2, 4, 8):
+        r = run(workers, n_requests)
+        print(f"{workers:>7} {r['private'][0]:>12.1%} {r['shared'][0]:>11.1%} "
+              f"{r['private'][1] / 1e6:>11.2f} {r['shared'][1] / 1e6:>10.2f}")
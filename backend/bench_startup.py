@@ -0,0 +1,77 @@
+import os
+import re
+import sys
+import time
+import socket
+import subprocess
+import urllib.request
+
+# Cold-start benchmark for the API server:
+#  1) `python -X importtime -c "import server.main"` – total and top imports
+#  2) time-to-first-response of a fresh uvicorn worker (GET /), lazy vs. EAGER_INIT=1
+# Usage (from repo root): python -m backend.bench_startup [--top N]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_profile(env=None):
+    """Return (total_us, [(cumulative_us, module), ...]) for importing server.main."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server.main"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if m:
+            depth = len(m.group(3)) // 2
+            rows.append((int(m.group(2)), depth, m.group(4)))
+    total = sum(cum for cum, depth, _ in rows if depth == 0)
+    top = sorted(((cum, name) for cum, depth, name in rows if depth <= 1), reverse=True)
+    return total, top
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_response(env=None, timeout: float = 60) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError("server did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    top_n = int(sys.argv[sys.argv.index("--top") + 1]) if "--top" in sys.argv else 10
+    lazy_env = {**os.environ, "EAGER_INIT": "0"}
+    eager_env = {**os.environ, "EAGER_INIT": "1"}
+
+    total, top = import_profile(lazy_env)
+    print("\n=== python -X importtime: import server.main ===\n")
+    print(f"total: {total / 1000:.1f} ms")
+    for cum, name in top[:top_n]:
+        print(f"  {cum / 1000:>8.1f} ms  {name}")
+
+    print("\n=== Time to first response (GET /) ===\n")
+    for label, env in (("lazy (default)", lazy_env), ("EAGER_INIT=1", eager_env)):
+        print(f"{label:<16} {time_to_first_response(env):.2f} s")
@@ -0,0 +1,110 @@
+import sys
+import time
+import gc
+import statistics
+import tracemalloc
+
+import orjson
+import ormsgpack
+
+from backend.orchestrator import state as typed_state
+from backend.orchestrator.state import AnalysisState
+
+# Per-state memory and serialization time of the analysis state: plain dicts
+# (what StateGraph(dict) and the job queue held) vs. the typed records of
+# backend/orchestrator/state.py, and orjson / msgpack of the dict vs. typed
+# msgpack rows (checkpoints).
+# Usage: python -m backend.bench_state [n_states]
+
+
+def _state(i: int) -> dict:
+    # Fresh objects per state, like states built by separate requests
+    context = {"age": 40 + i % 40, "gender": "male" if i % 2 else "female",
+               "medical_history": "hypertension, hyperlipidemia", "current_medications": "atorvastatin 20 mg"}
+    disclaimer = "This is AI-generated and not medical advice. Verify clinically."
+    return orjson.loads(orjson.dumps({
+        "symptoms": f"Chest pain radiating to left arm, shortness of breath {i}",
+        "age": context["age"], "gender": context["gender"], "medicalHistory": context["medical_history"],
+        "currentMedications": context["current_medications"], "urgency": "high",
+        "options": {"profile": "full", "fused": False}, "deadline": 1.7e9 + i,
+        "symptom_analysis": {
+            "top_differentials": [
+                {"name": f"Differential {d}", "rationale": "Typical presentation with radiating pain.",
+                 "icd10cm_code": f"I2{d}.9"} for d in range(3)],
+            "risk_level": "high", "disclaimer": disclaimer,
+        },
+        "literature": {"query": "chest pain AND dyspnea AND male AND middle aged", "articles": {"summaries": [
+            {"pmid": str(30000000 + a), "title": f"Outcomes of early invasive strategy {a}",
+             "summary": "Randomized trial of early invasive strategy in NSTEMI patients."} for a in range(3)]},
+            "patient_context": dict(context), "disclaimer": disclaimer},
+        "case_matcher": {"query": "chest pain dyspnea", "matched_cases": [
+            {"icd_code": f"I21.{c}", "name": f"Acute myocardial infarction {c}", "description": "",
+             "match_score": 0.9 - c / 10} for c in range(3)],
+            "patient_context": {k: context[k] for k in ("age", "gender", "medical_history")},
+            "disclaimer": disclaimer},
+        "treatment": {"query": "chest pain dyspnea", "treatments": [
+            {"name": f"Drug {t}", "class": "antiplatelet", "type": "drug", "rationale": "Guideline first line.",
+             "source": "RxNorm", "interactions": []} for t in range(3)],
+            "patient_context": dict(context), "disclaimer": disclaimer},
+        "summary": {"patient_summary": "Findings suggest ACS.", "clinical_summary": "Leading differential I21.9.",
+                    "recommendations": [{"type": "next_steps", "content": "ECG and troponin."}]},
+        "summary_disclaimer": disclaimer,
+        "partial_sections": [],
+        "pipeline": {"profile": "full", "ran": ["symptom_analyzer", "literature_agent", "case_matcher",
+                                                 "treatment_agent", "summarizer_agent"], "skipped": []},
+    }))
+
+
+def _retained(build) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    held = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return held, size
+
+
+def _time(fn, items) -> float:
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    dicts, dict_bytes = _retained(lambda: [_state(i) for i in range(n)])
+    del dicts
+    typed, typed_bytes = _retained(lambda: [AnalysisState.from_dict(_state(i)) for i in range(n)])
+    del typed
+    packed, packed_bytes = _retained(lambda: [typed_state.pack(_state(i)) for i in range(n)])
+    del packed
+
+    print(f"--- memory held for {n} states ---")
+    print(f"{'form':<18} {'bytes/state':>12}")
+    for label, total in (("dict", dict_bytes), ("typed records", typed_bytes), ("typed msgpack", packed_bytes)):
+        print(f"{label:<18} {total / n:>12,.0f}")
+
+    states = [_state(i) for i in range(min(n, 1000))]
+    typed = [AnalysisState.from_dict(s) for s in states]
+    rows = [typed_state.pack(t) for t in typed]
+    print("\n--- serialization (median µs per state) ---")
+    print(f"{'codec':<26} {'encode':>8} {'decode':>8} {'bytes':>7}")
+    cases = [
+        ("orjson dict", orjson.dumps, orjson.loads, states),
+        ("msgpack dict", ormsgpack.packb, ormsgpack.unpackb, states),
+        ("typed rows (from typed)", typed_state.pack, typed_state.unpack_typed, typed),
+        ("typed rows (from dict)", typed_state.pack, typed_state.unpack, states),
+    ]
+    for label, encode, decode, items in cases:
+        blobs = [encode(item) for item in items]
+        size = statistics.median(len(b) for b in blobs)
+        print(f"{label:<26} {_time(encode, items):>8.1f} {_time(decode, blobs):>8.1f} {size:>7.0f}")
+    assert typed_state.unpack(rows[0]) == states[0]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import os
+import time
+import uuid
+import sqlite3
+import tempfile
+import threading
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+
+from backend.orchestrator import state as typed_state
+from backend.utils import metrics
+from backend.utils.deadline import DEADLINE_KEY, set_deadline
+from backend.utils.private_files import connect_private, private_path
+
+# -------------------------------
+# Pipeline checkpoints
+# -------------------------------
+# LangGraph stores the graph state after every node through this saver. Runs
+# are keyed by run_id (the LangGraph thread_id), so a failed or degraded run
+# can be resumed or a single agent re-run without redoing the upstream
+# PubMed/BioPortal/RxNorm calls and LLM steps. Values go through LangGraph's
+# serializer, which packs state with ormsgpack; the analysis state itself is
+# stored as typed rows (backend/orchestrator/state.py) unless
+# CHECKPOINT_TYPED_STATE=0. The database holds full patient state: it is
+# created 0600 in a per-user 0700 directory (backend/utils/private_files.py).
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", private_path(tempfile.gettempdir(), "checkpoints.sqlite"))
+CHECKPOINT_TTL_S = float(os.getenv("CHECKPOINT_TTL_S", "86400"))
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "1").lower() not in ("0", "false", "no")
+CHECKPOINT_TYPED_STATE = os.getenv("CHECKPOINT_TYPED_STATE", "1").lower() not in ("0", "false", "no")
+
+# LangGraph channel holding the dict state of StateGraph(dict)
+ROOT_CHANNEL = "__root__"
+
+# Purge expired runs at most this often
+_PURGE_INTERVAL_S = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    thread_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_expires ON runs (expires);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+def _pack_state(value: Any) -> Any:
+    if not (CHECKPOINT_TYPED_STATE and isinstance(value, dict)):
+        return value
+    try:
+        return typed_state.pack(value)
+    except TypeError:
+        # Values msgpack cannot encode: leave them to LangGraph's serializer
+        return value
+
+
+def _unpack_state(value: Any) -> Any:
+    return typed_state.unpack(value) if isinstance(value, bytes) else value
+
+
+def _with_root(checkpoint: Checkpoint, convert) -> Checkpoint:
+    values = checkpoint.get("channel_values") or {}
+    if ROOT_CHANNEL not in values:
+        return checkpoint
+    return {**checkpoint, "channel_values": {**values, ROOT_CHANNEL: convert(values[ROOT_CHANNEL])}}
+
+
+def _ids(config) -> tuple:
+    conf = config["configurable"]
+    return conf["thread_id"], conf.get("checkpoint_ns", ""), conf.get("checkpoint_id")
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver):
+    """Expiring SQLite checkpoint store (sync API only; the graph is invoked synchronously)."""
+
+    def __init__(self, path: str = CHECKPOINT_PATH, ttl: float = CHECKPOINT_TTL_S):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = connect_private(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # ---- reads ----
+    def get_tuple(self, config) -> Optional[CheckpointTuple]:
+        thread_id, ns, checkpoint_id = _ids(config)
+        conn = self._conn()
+        if not self._alive(conn, thread_id):
+            return None
+        query = (
+            "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+            "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        args = [thread_id, ns]
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            args.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        row = conn.execute(query, args).fetchone()
+        return None if row is None else self._tuple(conn, thread_id, ns, row)
+
+    def list(self, config, *, filter: Optional[Dict[str, Any]] = None, before=None,
+             limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        conn = self._conn()
+        query = (
+            "SELECT c.thread_id, c.checkpoint_ns, c.checkpoint_id, c.parent_checkpoint_id, c.type, "
+            "c.checkpoint, c.metadata_type, c.metadata FROM checkpoints c "
+            "JOIN runs r ON r.thread_id = c.thread_id WHERE r.expires >= ?"
+        )
+        args: list = [time.time()]
+        if config is not None:
+            thread_id, ns, checkpoint_id = _ids(config)
+            query += " AND c.thread_id = ? AND c.checkpoint_ns = ?"
+            args += [thread_id, ns]
+            if checkpoint_id:
+                query += " AND c.checkpoint_id = ?"
+                args.append(checkpoint_id)
+        if before is not None:
+            query += " AND c.checkpoint_id < ?"
+            args.append(before["configurable"]["checkpoint_id"])
+        query += " ORDER BY c.checkpoint_id DESC"
+        emitted = 0
+        for thread_id, ns, *row in conn.execute(query, args).fetchall():
+            tup = self._tuple(conn, thread_id, ns, row)
+            if filter and any(tup.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yield tup
+            emitted += 1
+            if limit is not None and emitted >= limit:
+                return
+
+    def _tuple(self, conn, thread_id: str, ns: str, row) -> CheckpointTuple:
+        checkpoint_id, parent_id, ctype, cblob, mtype, mblob = row
+        writes = conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+            checkpoint=_with_root(self.serde.loads_typed((ctype, cblob)), _unpack_state),
+            metadata=self.serde.loads_typed((mtype, mblob)),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[
+                (task_id, channel, self._load_write(channel, t, v)) for task_id, channel, t, v in writes
+            ],
+        )
+
+    def _load_write(self, channel: str, vtype: str, vblob: bytes) -> Any:
+        value = self.serde.loads_typed((vtype, vblob))
+        return _unpack_state(value) if channel == ROOT_CHANNEL else value
+
+    def _alive(self, conn, thread_id: str) -> bool:
+        row = conn.execute("SELECT expires FROM runs WHERE thread_id = ?", (thread_id,)).fetchone()
+        return row is not None and row[0] >= time.time()
+
+    # ---- writes ----
+    def put(self, config, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions):
+        thread_id, ns, parent_id = _ids(config)
+        ctype, cblob = self.serde.dumps_typed(_with_root(checkpoint, _pack_state))
+        mtype, mblob = self.serde.dumps_typed(dict(metadata))
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Every new checkpoint extends the run's lifetime
+            conn.execute(
+                "INSERT INTO runs (thread_id, created, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT (thread_id) DO UPDATE SET expires = excluded.expires",
+                (thread_id, now, now + self.ttl),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, "
+                "parent_checkpoint_id, type, checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, ns, checkpoint["id"], parent_id, ctype, cblob, mtype, mblob),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        metrics.observe("checkpoint_bytes", len(cblob))
+        self._maybe_purge(now)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        thread_id, ns, checkpoint_id = _ids(config)
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            vtype, vblob = self.serde.dumps_typed(_pack_state(value) if channel == ROOT_CHANNEL else value)
+            rows.append((thread_id, ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, vtype, vblob, task_path))
+        # Special channels (errors, interrupts) overwrite; regular writes are kept once
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        conn = self._conn()
+        conn.executemany(
+            f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, "
+            "task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def delete_thread(self, thread_id: str) -> None:
+        conn = self._conn()
+        for table in ("writes", "checkpoints", "runs"):
+            conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def _maybe_purge(self, now: float):
+        if now - self._last_purge < _PURGE_INTERVAL_S:
+            return
+        self._last_purge = now
+        conn = self._conn()
+        expired = [r[0] for r in conn.execute("SELECT thread_id FROM runs WHERE expires < ?", (now,)).fetchall()]
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        if expired:
+            metrics.inc("checkpoint_runs_expired", len(expired))
+
+
+_saver = None
+_saver_lock = threading.Lock()
+
+
+def get_checkpointer() -> Optional[SqliteCheckpointSaver]:
+    """Shared saver for the API graphs (None when CHECKPOINTS_ENABLED=0)."""
+    global _saver
+    if not CHECKPOINTS_ENABLED:
+        return None
+    if _saver is None:
+        with _saver_lock:
+            if _saver is None:
+                _saver = SqliteCheckpointSaver()
+    return _saver
+
+
+# -------------------------------
+# Run helpers
+# -------------------------------
+class RunNotFoundError(KeyError):
+    pass
+
+
+class AgentNotInRunError(LookupError):
+    """The run exists, but the agent never ran in it (skipped by its profile or not reached)."""
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+
+def run_config(run_id: str) -> dict:
+    return {"configurable": {"thread_id": run_id}}
+
+
+def run_profile(saver: BaseCheckpointSaver, run_id: str) -> str:
+    """The pipeline profile a stored run belongs to, from the `options` in its state."""
+    tup = saver.get_tuple(run_config(run_id))
+    if tup is None:
+        raise RunNotFoundError(run_id)
+    values = tup.checkpoint["channel_values"].get(ROOT_CHANNEL) or {}
+    options = values.get("options") or {}
+    return options.get("profile") or ("fused" if options.get("fused") else "full")
+
+
+def run_status(graph, run_id: str) -> dict:
+    snapshot = graph.get_state(run_config(run_id))
+    if not snapshot.values and not snapshot.next:
+        raise RunNotFoundError(run_id)
+    errors = {task.name: task.error for task in snapshot.tasks if getattr(task, "error", None)}
+    if not snapshot.next:
+        status = "completed"
+    elif errors:
+        status = "failed"
+    else:
+        status = "interrupted"
+    return {
+        "run_id": run_id,
+        "status": status,
+        "next": list(snapshot.next),
+        "errors": {name: str(err) for name, err in errors.items()},
+        "state": snapshot.values,
+    }
+
+
+def _refresh(values: dict, timeout_s: Optional[float]) -> dict:
+    # A resumed run gets a fresh deadline; the stored one has long expired
+    state = dict(values)
+    state.pop(DEADLINE_KEY, None)
+    set_deadline(state, timeout_s)
+    return state
+
+
+def rerun_from(graph, nodes: Sequence[str], run_id: str, node: str, timeout_s: Optional[float] = None) -> dict:
+    """Re-run `node` and everything downstream of it from the checkpoint taken just before it."""
+    if node not in nodes:
+        raise ValueError(f"Unknown agent '{node}' (expected one of {', '.join(nodes)})")
+    config = run_config(run_id)
+    history = list(graph.get_state_history(config))
+    if not history:
+        raise RunNotFoundError(run_id)
+    target = next((s for s in history if s.next == (node,)), None)
+    if target is None:
+        raise AgentNotInRunError(f"Agent '{node}' was not part of run '{run_id}' "
+                                 f"(skipped by its profile or not reached)")
+    state = _refresh(target.values, timeout_s)
+    idx = nodes.index(node)
+    if idx == 0:
+        # Nothing upstream: start again from the original input on the same run
+        return graph.invoke(state, config)
+    new_config = graph.update_state(target.config, state, as_node=nodes[idx - 1])
+    return graph.invoke(None, new_config)
+
+
+def resume(graph, nodes: Sequence[str], run_id: str, timeout_s: Optional[float] = None) -> dict:
+    """Continue a failed or interrupted run at its next pending node (no-op when completed)."""
+    snapshot = graph.get_state(run_config(run_id))
+    if not snapshot.values and not snapshot.next:
+        raise RunNotFoundError(run_id)
+    if not snapshot.next:
+        return snapshot.values
+    return rerun_from(graph, nodes, run_id, snapshot.next[0], timeout_s)
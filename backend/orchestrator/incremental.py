@@ -0,0 +1,153 @@
+import copy
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from backend.orchestrator.checkpoints import RunNotFoundError, run_config
+from backend.utils.deadline import DEADLINE_KEY, PARTIAL_KEY, set_deadline
+
+# -------------------------------
+# Incremental re-analysis
+# -------------------------------
+# When a clinician edits one field of a finished run, only the agents that read
+# that field – and the agents consuming those agents' outputs – are recomputed.
+# A downstream agent is skipped when the part of the upstream outputs it reads
+# came out unchanged (e.g. the same differentials after a medication edit, even
+# if the analyzer reworded its rationale).
+_ALL_AGENTS = {"symptom_analyzer", "literature_agent", "case_matcher", "treatment_agent",
+               "post_retrieval", "summarizer_agent"}
+
+# PatientInput field → agents whose prompts / queries read it
+FIELD_READERS: Dict[str, set] = {
+    "symptoms": _ALL_AGENTS,
+    "age": _ALL_AGENTS,
+    "gender": _ALL_AGENTS,
+    "medicalHistory": _ALL_AGENTS,
+    "currentMedications": {"symptom_analyzer", "literature_agent", "treatment_agent",
+                           "post_retrieval", "summarizer_agent"},
+    "urgency": {"symptom_analyzer", "summarizer_agent"},
+    # Per-request options
+    "options.case_ranker": {"case_matcher", "post_retrieval"},
+}
+
+# Agent → agents whose output it reads
+NODE_INPUTS: Dict[str, set] = {
+    "literature_agent": {"symptom_analyzer"},      # re-ranks PubMed hits against top_differentials
+    "case_matcher": {"symptom_analyzer"},          # ranks against top_differentials
+    "post_retrieval": {"symptom_analyzer"},
+    "summarizer_agent": {"symptom_analyzer", "literature_agent", "case_matcher", "treatment_agent",
+                         "post_retrieval"},
+}
+
+
+def _differentials_view(state: Dict[str, Any]) -> List[Any]:
+    """Differential names and ICD codes (what the rankers read; not the free-text rationale)."""
+    diffs = (state.get("symptom_analysis") or {}).get("top_differentials") or []
+    return [(d.get("name"), d.get("icd10cm_code")) if isinstance(d, dict) else d for d in diffs]
+
+
+# Agent → projection of its upstream outputs it actually reads; an agent
+# without one is recomputed whenever an input agent's output changed at all
+NODE_VIEWS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "literature_agent": _differentials_view,
+    "case_matcher": _differentials_view,
+    "post_retrieval": _differentials_view,
+}
+
+# Agent → state keys it writes
+NODE_OUTPUTS: Dict[str, List[str]] = {
+    "symptom_analyzer": ["symptom_analysis"],
+    "literature_agent": ["literature"],
+    "case_matcher": ["case_matcher"],
+    "treatment_agent": ["treatment"],
+    "post_retrieval": ["literature", "case_matcher", "treatment"],
+    "summarizer_agent": ["summary", "summary_disclaimer"],
+}
+
+
+def changed_fields(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """Input fields (and `options.*` keys) whose value differs between two runs."""
+    fields = [f for f in FIELD_READERS if "." not in f and f in new and new[f] != old.get(f)]
+    old_opts, new_opts = old.get("options") or {}, new.get("options") or {}
+    for f in FIELD_READERS:
+        if f.startswith("options."):
+            key = f.split(".", 1)[1]
+            if key in new_opts and new_opts[key] != old_opts.get(key):
+                fields.append(f)
+    return fields
+
+
+def affected_nodes(fields: Iterable[str], nodes: Sequence[str]) -> List[str]:
+    """Pipeline nodes that read any of `fields` directly, in pipeline order."""
+    readers = set().union(*(FIELD_READERS.get(f, set()) for f in fields))
+    return [n for n in nodes if n in readers]
+
+
+def update_run(graph, nodes: Sequence[str], run_id: str, new_input: Dict[str, Any],
+               node_functions: Dict[str, Callable], timeout_s: Optional[float] = None,
+               should_run: Callable[[str, Dict[str, Any]], bool] = None) -> Dict[str, Any]:
+    """Apply `new_input` to a completed run, recomputing only what depends on the changes.
+
+    `should_run(node, state)` applies a profile's step conditions: an agent that
+    was skipped before but is now needed runs, one no longer needed has its
+    output removed. Returns the new final state with `changed_fields` and
+    `recomputed` (node names) set; the result is stored as the run's latest
+    checkpoint.
+    """
+    snapshot = graph.get_state(run_config(run_id))
+    if not snapshot.values and not snapshot.next:
+        raise RunNotFoundError(run_id)
+    if snapshot.next:
+        raise ValueError(f"Run '{run_id}' has not completed; resume it before updating")
+
+    old = snapshot.values
+    fields = changed_fields(old, new_input)
+    state = copy.deepcopy(old)
+    state.pop(DEADLINE_KEY, None)
+    for f in fields:
+        if f.startswith("options."):
+            key = f.split(".", 1)[1]
+            state.setdefault("options", {})[key] = new_input["options"][key]
+        else:
+            state[f] = new_input[f]
+    set_deadline(state, timeout_s)
+
+    dirty = set(affected_nodes(fields, nodes))
+    views = {n: view(old) for n, view in NODE_VIEWS.items()}
+    changed_outputs = set()
+    recomputed = []
+    ran = list((state.get("pipeline") or {}).get("ran", nodes))
+    for node in nodes:
+        outputs = NODE_OUTPUTS.get(node, [])
+        if should_run is not None:
+            if not should_run(node, state):
+                if node in ran:
+                    ran.remove(node)
+                    for k in outputs:
+                        state.pop(k, None)
+                    if state.get(PARTIAL_KEY):
+                        state[PARTIAL_KEY] = [k for k in state[PARTIAL_KEY] if k not in outputs]
+                    changed_outputs.add(node)
+                continue
+            if node not in ran:
+                ran.append(node)
+                dirty.add(node)
+        if node not in dirty:
+            if not NODE_INPUTS.get(node, set()) & changed_outputs:
+                continue
+            if node in views and NODE_VIEWS[node](state) == views[node]:
+                continue
+        before = {k: copy.deepcopy(state.get(k)) for k in outputs}
+        if state.get(PARTIAL_KEY):
+            state[PARTIAL_KEY] = [k for k in state[PARTIAL_KEY] if k not in outputs]
+        state = node_functions[node](state)
+        recomputed.append(node)
+        if any(state.get(k) != before[k] for k in outputs):
+            changed_outputs.add(node)
+
+    if "pipeline" in state:
+        ran = [n for n in nodes if n in ran]
+        state["pipeline"] = {**state["pipeline"], "ran": ran, "skipped": [n for n in nodes if n not in ran]}
+    if recomputed or fields:
+        graph.update_state(run_config(run_id), state, as_node=nodes[-1])
+    state["changed_fields"] = fields
+    state["recomputed"] = recomputed
+    return state
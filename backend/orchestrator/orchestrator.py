@@ -1,5 +1,5 @@
+import os
 import json
-from langgraph.graph import StateGraph, END   # ✅ fixed import
 
 # Import agents
 from backend.agents.symptom_analyzer import symptom_analyzer_agent
@@ -7,26 +7,75 @@ from backend.agents.literature_agent import literature_agent
 from backend.agents.case_matcher import case_matcher_agent
 from backend.agents.treatment_agent import treatment_agent
 from backend.agents.summarizer_agent import summarizer_agent   # ✅ new import
+from backend.agents.fused_agent import fused_post_retrieval_agent
+from backend.orchestrator.profiles import get_profile
+
+FUSED_LLM_MODE = os.getenv("FUSED_LLM_MODE", "").lower() in ("1", "true", "yes")
+
+# Profile used when a request names none (pipelines.yaml); FUSED_LLM_MODE or
+# ?fused=true select the "fused" profile instead
+PIPELINE_PROFILE = os.getenv("PIPELINE_PROFILE", "full")
+
+# Node name → agent function (shared by the graph and incremental re-runs)
+NODE_FUNCTIONS = {
+    "symptom_analyzer": symptom_analyzer_agent,
+    "literature_agent": literature_agent,
+    "case_matcher": case_matcher_agent,
+    "treatment_agent": treatment_agent,
+    "post_retrieval": fused_post_retrieval_agent,
+    "summarizer_agent": summarizer_agent,
+}
+
+def profile_name(fused: bool = None, profile: str = None) -> str:
+    if profile:
+        return profile
+    if fused is None:
+        fused = FUSED_LLM_MODE
+    return "fused" if fused else PIPELINE_PROFILE
+
+def pipeline_nodes(fused: bool = None, profile: str = None) -> list:
+    return get_profile(profile_name(fused, profile)).nodes
 
 # -------------------------------
 # Orchestrator Graph
 # -------------------------------
-def build_orchestrator_graph():
+def build_orchestrator_graph(fused: bool = None, checkpointer=None, profile: str = None):
+    """Compile the agent pipeline of a profile (see pipelines.yaml).
+
+    Without `profile`, `fused` (default: FUSED_LLM_MODE env) picks the "fused"
+    profile, where literature, case matching and treatment share one LLM
+    call, and PIPELINE_PROFILE otherwise. Conditional steps become
+    conditional edges that route around agents the case doesn't need. With a
+    `checkpointer`, state is saved after every node and invocations need a
+    `{"configurable": {"thread_id": run_id}}` config.
+    """
+    # Imported here so the API server can start without loading LangGraph
+    from langgraph.graph import StateGraph, END
+
+    spec = get_profile(profile_name(fused, profile))
+    unknown = [n for n in spec.nodes if n not in NODE_FUNCTIONS]
+    if unknown:
+        raise ValueError(f"Profile '{spec.name}' uses unknown agents: {', '.join(unknown)}")
     graph = StateGraph(dict)
 
-    # Add agents as nodes
-    graph.add_node("symptom_analyzer", symptom_analyzer_agent)
-    graph.add_node("literature_agent", literature_agent)
-    graph.add_node("case_matcher", case_matcher_agent)
-    graph.add_node("treatment_agent", treatment_agent)
-    graph.add_node("summarizer_agent", summarizer_agent)   # ✅ new
-
-    # Flow: Entry → Symptom Analyzer → Literature Agent → Case Matcher → Treatment Agent → Summarizer Agent → End
-    graph.set_entry_point("symptom_analyzer")
-    graph.add_edge("symptom_analyzer", "literature_agent")
-    graph.add_edge("literature_agent", "case_matcher")
-    graph.add_edge("case_matcher", "treatment_agent")
-    graph.add_edge("treatment_agent", "summarizer_agent")   # ✅ added
-    graph.add_edge("summarizer_agent", END)                 # ✅ final step
-
-    return graph.compile()
+    # Flow (full): Entry → Symptom Analyzer → Literature Agent → Case Matcher → Treatment Agent → Summarizer Agent → End
+    for node in spec.nodes:
+        graph.add_node(node, spec.tracked(node, NODE_FUNCTIONS[node]))
+    graph.set_entry_point(spec.nodes[0])
+
+    for i, node in enumerate(spec.nodes):
+        following = spec.nodes[i + 1:]
+        if not following:
+            graph.add_edge(node, END)
+        elif following[0] not in spec.conditions:
+            graph.add_edge(node, following[0])
+        else:
+            # Route to the first downstream agent whose condition holds
+            targets = following[:next((j for j, n in enumerate(following) if n not in spec.conditions),
+                                      len(following) - 1) + 1]
+            graph.add_conditional_edges(
+                node, lambda state, node=node: spec.next_node(node, state) or END,
+                {**{t: t for t in targets}, END: END},
+            )
+
+    return graph.compile(checkpointer=checkpointer)
@@ -0,0 +1,164 @@
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from backend.utils.deadline import PARTIAL_KEY
+
+# -------------------------------
+# Pipeline profiles
+# -------------------------------
+# Declarative pipelines loaded from YAML (see pipelines.yaml): an ordered list
+# of agents, each optionally gated by a condition on the state. The
+# orchestrator compiles a profile into a graph whose conditional edges route
+# around agents whose condition does not hold.
+PIPELINE_PROFILES_PATH = os.getenv(
+    "PIPELINE_PROFILES_PATH", os.path.join(os.path.dirname(__file__), "pipelines.yaml")
+)
+
+Condition = Callable[[Dict[str, Any]], bool]
+
+# Keys an agent leaves in its section when it failed or was cut short; the
+# placeholder values next to them (e.g. risk_level "low") must not gate anything
+_UNRELIABLE_KEYS = ("error", "raw_output", "partial")
+
+
+def _norm(value: Any) -> Any:
+    return value.lower() if isinstance(value, str) else value
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or (hasattr(value, "__len__") and len(value) == 0)
+
+
+_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda v, arg: _norm(v) == _norm(arg),
+    "ne": lambda v, arg: _norm(v) != _norm(arg),
+    "in": lambda v, arg: _norm(v) in [_norm(a) for a in arg],
+    "not_in": lambda v, arg: _norm(v) not in [_norm(a) for a in arg],
+    "empty": lambda v, arg: _is_empty(v) == bool(arg),
+}
+
+
+def lookup(state: Dict[str, Any], path: str) -> Any:
+    value: Any = state
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def compile_condition(spec: Any) -> Condition:
+    """`when` spec → predicate on the state (ValueError on unknown operators)."""
+    if isinstance(spec, list):
+        alternatives = [compile_condition(s) for s in spec]
+        return lambda state: any(c(state) for c in alternatives)
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError(f"Invalid condition: {spec!r}")
+    checks = []
+    for path, test in spec.items():
+        tests = test if isinstance(test, dict) else {"eq": test}
+        for op, arg in tests.items():
+            if op not in _OPS:
+                raise ValueError(f"Unknown condition operator '{op}' (expected one of {', '.join(_OPS)})")
+            checks.append((path, _OPS[op], arg))
+    return lambda state: all(fn(lookup(state, path), arg) for path, fn, arg in checks)
+
+
+def condition_sections(spec: Any) -> Set[str]:
+    """Top-level state sections a `when` spec reads."""
+    if isinstance(spec, list):
+        return set().union(*(condition_sections(s) for s in spec))
+    return {path.split(".", 1)[0] for path in spec}
+
+
+def unreliable(state: Dict[str, Any], section: str) -> bool:
+    """True when `section` is partial or errored (its agent's fallback output)."""
+    if section in (state.get(PARTIAL_KEY) or []):
+        return True
+    value = state.get(section)
+    return isinstance(value, dict) and any(key in value for key in _UNRELIABLE_KEYS)
+
+
+class PipelineProfile:
+    def __init__(self, name: str, spec: Dict[str, Any]):
+        self.name = name
+        self.description = spec.get("description", "")
+        self.options = dict(spec.get("options") or {})
+        self.nodes: List[str] = []
+        self.conditions: Dict[str, Condition] = {}
+        self.inputs: Dict[str, Set[str]] = {}
+        for step in spec.get("steps") or []:
+            node = step if isinstance(step, str) else step.get("node")
+            if not node or node in self.nodes:
+                raise ValueError(f"Profile '{name}': invalid or duplicate step {step!r}")
+            self.nodes.append(node)
+            if isinstance(step, dict) and step.get("when") is not None:
+                self.conditions[node] = compile_condition(step["when"])
+                self.inputs[node] = condition_sections(step["when"])
+        if not self.nodes:
+            raise ValueError(f"Profile '{name}' has no steps")
+        if self.nodes[0] in self.conditions:
+            raise ValueError(f"Profile '{name}': the first step cannot be conditional")
+
+    def should_run(self, node: str, state: Dict[str, Any]) -> bool:
+        condition = self.conditions.get(node)
+        if condition is None:
+            return True
+        # A condition on partial or failed output can't be trusted: run the agent
+        if any(unreliable(state, section) for section in self.inputs[node]):
+            return True
+        return condition(state)
+
+    def next_node(self, after: str, state: Dict[str, Any]) -> Optional[str]:
+        """The next agent whose condition holds after `after` (None: end of pipeline)."""
+        for node in self.nodes[self.nodes.index(after) + 1:]:
+            if self.should_run(node, state):
+                return node
+        return None
+
+    def tracked(self, node: str, fn: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        """Wrap an agent so the state records which agents ran and which were skipped."""
+        idx = self.nodes.index(node)
+
+        def run(state: Dict[str, Any]) -> Dict[str, Any]:
+            before = (state.get("pipeline") or {}).get("ran", [])
+            # Drop entries at or after this node (re-runs from a checkpoint)
+            ran = [n for n in before if n in self.nodes and self.nodes.index(n) < idx] + [node]
+            state = fn(state)
+            state["pipeline"] = {"profile": self.name, "ran": ran,
+                                 "skipped": [n for n in self.nodes[:idx] if n not in ran]}
+            return state
+        return run
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "description": self.description, "nodes": self.nodes,
+                "conditional": sorted(self.conditions), "options": self.options}
+
+
+def load_profiles(path: str = PIPELINE_PROFILES_PATH) -> Dict[str, PipelineProfile]:
+    import yaml
+
+    with open(path, encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    return {name: PipelineProfile(name, spec or {}) for name, spec in (data.get("profiles") or {}).items()}
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def get_profiles() -> Dict[str, PipelineProfile]:
+    global _profiles
+    if _profiles is None:
+        with _profiles_lock:
+            if _profiles is None:
+                _profiles = load_profiles()
+    return _profiles
+
+
+def get_profile(name: str) -> PipelineProfile:
+    profiles = get_profiles()
+    if name not in profiles:
+        raise ValueError(f"Unknown pipeline profile '{name}' (expected one of {', '.join(profiles)})")
+    return profiles[name]
@@ -0,0 +1,319 @@
+import sys
+from dataclasses import dataclass, fields
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
+
+import ormsgpack
+
+# -------------------------------
+# Typed analysis state
+# -------------------------------
+# The graph itself runs on plain dicts (StateGraph(dict)). This is the compact
+# form for states held in bulk (finished jobs waiting to be fetched) and for
+# binary storage (checkpoints): slotted records for differentials, articles,
+# case matches and treatments, the patient context stored once with every
+# section's `patient_context` kept as a view of it, and msgpack rows –
+# positional arrays without the repeated key names. Conversion is lossless:
+# keys a record does not know go to its `extra` dict, values that do not fit
+# the schema are kept as they are. Compare with `python -m backend.bench_state`.
+STATE_FORMAT_VERSION = 1
+
+
+class _Missing:
+    """Marks a field whose key was absent (as opposed to present and None)."""
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+    def __bool__(self) -> bool:
+        return False
+
+
+MISSING = _Missing()
+
+# One tuple per distinct set of patient_context keys, shared by every section
+_views: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _view(keys) -> Tuple[str, ...]:
+    keys = tuple(keys)
+    return _views.setdefault(keys, keys)
+
+
+class Record:
+    """Base of the slotted records: dict ↔ record ↔ msgpack row."""
+    __slots__ = ()
+
+    # field → record class for nested records (a dict, or a list of dicts)
+    _nested: ClassVar[Dict[str, type]] = {}
+    # field → dict key where the key is not a valid identifier
+    _renamed: ClassVar[Dict[str, str]] = {}
+    # fields whose strings repeat across states (disclaimers, enums): interned
+    _interned: ClassVar[frozenset] = frozenset({"disclaimer", "risk_level", "type", "source", "drug_class",
+                                                "gender", "urgency"})
+
+    @classmethod
+    def _layout(cls) -> List[Tuple[str, str]]:
+        layout = cls.__dict__.get("_layout_cache")
+        if layout is None:
+            layout = [(f.name, cls._renamed.get(f.name, f.name)) for f in fields(cls) if f.name != "extra"]
+            setattr(cls, "_layout_cache", layout)
+        return layout
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Record":
+        values = {}
+        layout = cls._layout()
+        for name, key in layout:
+            value = d.get(key, MISSING)
+            nested = cls._nested.get(name)
+            if nested is not None and value is not MISSING:
+                value = _typed(value, nested)
+            elif name in cls._interned and isinstance(value, str):
+                value = sys.intern(value)
+            values[name] = value
+        known = {key for _, key in layout}
+        extra = {k: v for k, v in d.items() if k not in known}
+        return cls(**values, extra=extra or None)
+
+    def to_dict(self, patient: Optional["PatientContext"] = None) -> Dict[str, Any]:
+        out = {}
+        for name, key in self._layout():
+            value = getattr(self, name)
+            if value is MISSING:
+                continue
+            if isinstance(value, Record):
+                value = value.to_dict(patient)
+            elif isinstance(value, list) and value and isinstance(value[0], Record):
+                value = [v.to_dict(patient) for v in value]
+            elif name == "patient_context" and isinstance(value, tuple):
+                value = {k: getattr(patient, k) for k in value}
+            out[key] = value
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+    def to_row(self) -> list:
+        """[missing mask, typed mask, extra, *values] with nested records as rows."""
+        missing = typed = 0
+        values = []
+        for i, (name, _) in enumerate(self._layout()):
+            value = getattr(self, name)
+            if value is MISSING:
+                missing |= 1 << i
+                value = None
+            elif isinstance(value, Record):
+                typed |= 1 << i
+                value = value.to_row()
+            elif isinstance(value, list) and value and isinstance(value[0], Record):
+                typed |= 1 << i
+                value = [v.to_row() for v in value]
+            elif isinstance(value, tuple):
+                value = list(value)
+            values.append(value)
+        return [missing, typed, self.extra, *values]
+
+    @classmethod
+    def from_row(cls, row: list) -> "Record":
+        missing, typed, extra, *values = row
+        out = {}
+        for i, ((name, _), value) in enumerate(zip(cls._layout(), values)):
+            if missing & (1 << i):
+                value = MISSING
+            elif typed & (1 << i):
+                nested = cls._nested[name]
+                value = nested.from_row(value) if value and isinstance(value[0], int) else [
+                    nested.from_row(v) for v in value]
+            elif name == "patient_context" and isinstance(value, list):
+                value = _view(value)
+            elif name in cls._interned and isinstance(value, str):
+                value = sys.intern(value)
+            out[name] = value
+        return cls(**out, extra=extra)
+
+
+def _typed(value: Any, cls: type) -> Any:
+    if isinstance(value, dict):
+        return cls.from_dict(value)
+    if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+        return [cls.from_dict(v) for v in value]
+    return value
+
+
+# -------------------------------
+# Records
+# -------------------------------
+@dataclass(slots=True)
+class PatientContext(Record):
+    age: Any = MISSING
+    gender: Any = MISSING
+    medical_history: Any = MISSING
+    current_medications: Any = MISSING
+    symptoms: Any = MISSING
+    urgency: Any = MISSING
+    working_diagnosis: Any = MISSING
+    extra: Optional[dict] = None
+
+
+@dataclass(slots=True)
+class Differential(Record):
+    name: Any = MISSING
+    rationale: Any = MISSING
+    icd10cm_code: Any = MISSING
+    extra: Optional[dict] = None
+
+
+@dataclass(slots=True)
+class SymptomAnalysis(Record):
+    _nested: ClassVar[Dict[str, type]] = {"top_differentials": Differential}
+
+    top_differentials: Any = MISSING
+    risk_level: Any = MISSING
+    rationale: Any = MISSING
+    disclaimer: Any = MISSING
+    extra: Optional[dict] = None
+
+
+@dataclass(slots=True)
+class Article(Record):
+    pmid: Any = MISSING
+    title: Any = MISSING
+    summary: Any = MISSING
+    extra: Optional[dict] = None
+
+
+@dataclass(slots=True)
+class Articles(Record):
+    _nested: ClassVar[Dict[str, type]] = {"summaries": Article}
+
+    summaries: Any = MISSING
+    extra: Optional[dict] = None
+
+
+@dataclass(slots=True)
+class Literature(Record):
+    _nested: ClassVar[Dict[str, type]] = {"articles": Articles}
+
+    query: Any = MISSING
+    articles: Any = MISSING
+    patient_context: Any = MISSING
+    disclaimer: Any = MISSING
+    extra: Optional[dict] = None
+
+
+@dataclass(slots=True)
+class CaseMatch(Record):
+    icd_code: Any = MISSING
+    name: Any = MISSING
+    description: Any = MISSING
+    match_score: Any = MISSING
+    extra: Optional[dict] = None
+
+
+@dataclass(slots=True)
+class CaseMatches(Record):
+    _nested: ClassVar[Dict[str, type]] = {"matched_cases": CaseMatch}
+
+    query: Any = MISSING
+    matched_cases: Any = MISSING
+    patient_context: Any = MISSING
+    disclaimer: Any = MISSING
+    extra: Optional[dict] = None
+
+
+@dataclass(slots=True)
+class Treatment(Record):
+    _renamed: ClassVar[Dict[str, str]] = {"drug_class": "class"}
+
+    name: Any = MISSING
+    drug_class: Any = MISSING
+    type: Any = MISSING
+    rationale: Any = MISSING
+    source: Any = MISSING
+    interactions: Any = MISSING
+    extra: Optional[dict] = None
+
+
+@dataclass(slots=True)
+class TreatmentPlan(Record):
+    _nested: ClassVar[Dict[str, type]] = {"treatments": Treatment}
+
+    query: Any = MISSING
+    treatments: Any = MISSING
+    patient_context: Any = MISSING
+    disclaimer: Any = MISSING
+    extra: Optional[dict] = None
+
+
+_SECTIONS = ("literature", "case_matcher", "treatment")
+
+
+@dataclass(slots=True)
+class AnalysisState(Record):
+    _nested: ClassVar[Dict[str, type]] = {
+        "symptom_analysis": SymptomAnalysis, "literature": Literature,
+        "case_matcher": CaseMatches, "treatment": TreatmentPlan, "patient": PatientContext,
+    }
+    _renamed: ClassVar[Dict[str, str]] = {"patient": "~patient"}
+
+    symptoms: Any = MISSING
+    age: Any = MISSING
+    gender: Any = MISSING
+    medicalHistory: Any = MISSING
+    currentMedications: Any = MISSING
+    urgency: Any = MISSING
+    options: Any = MISSING
+    symptom_analysis: Any = MISSING
+    literature: Any = MISSING
+    case_matcher: Any = MISSING
+    treatment: Any = MISSING
+    summary: Any = MISSING
+    summary_disclaimer: Any = MISSING
+    partial_sections: Any = MISSING
+    pipeline: Any = MISSING
+    run_id: Any = MISSING
+    # Union of the sections' patient_context copies (never a key of the dict state)
+    patient: Any = MISSING
+    extra: Optional[dict] = None
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "AnalysisState":
+        state = super(AnalysisState, cls).from_dict(d)
+        known = {key for _, key in PatientContext._layout()}
+        patient: Dict[str, Any] = {}
+        for name in _SECTIONS:
+            section = getattr(state, name)
+            pc = getattr(section, "patient_context", None)
+            # Only copies consistent with the ones before share the context
+            if isinstance(pc, dict) and pc.keys() <= known and all(
+                    k not in patient or (type(patient[k]) is type(v) and patient[k] == v) for k, v in pc.items()):
+                patient.update(pc)
+                section.patient_context = _view(pc)
+        state.patient = PatientContext.from_dict(patient) if patient else MISSING
+        return state
+
+    def to_dict(self, patient: Optional[PatientContext] = None) -> Dict[str, Any]:
+        out = Record.to_dict(self, self.patient or None)
+        out.pop("~patient", None)
+        return out
+
+
+# -------------------------------
+# Binary round trip
+# -------------------------------
+def pack(state: Any) -> bytes:
+    """msgpack rows of a dict state (or an AnalysisState)."""
+    typed = state if isinstance(state, AnalysisState) else AnalysisState.from_dict(state)
+    return ormsgpack.packb([STATE_FORMAT_VERSION, typed.to_row()], option=ormsgpack.OPT_NON_STR_KEYS)
+
+
+def unpack(data: bytes) -> Dict[str, Any]:
+    """The dict state `pack` was given."""
+    return unpack_typed(data).to_dict()
+
+
+def unpack_typed(data: bytes) -> AnalysisState:
+    version, row = ormsgpack.unpackb(data)
+    if version != STATE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported state format {version} (expected {STATE_FORMAT_VERSION})")
+    return AnalysisState.from_row(row)
@@ -0,0 +1,88 @@
+import time
+import asyncio
+import threading
+
+from backend.utils.admission import AdmissionController, client_key
+
+
+def _wait_queued(ctl, n):
+    while ctl._queued < n:
+        time.sleep(0.001)
+
+
+def test_round_robin_across_clients():
+    ctl = AdmissionController(max_inflight=1, max_queue=10, max_queue_per_client=5, max_wait_s=2)
+    holder = ctl.acquire("a")
+    order, lock = [], threading.Lock()
+
+    def request(client, tag):
+        ticket = ctl.acquire(client)
+        with lock:
+            order.append(tag)
+        time.sleep(0.01)
+        ctl.release(ticket)
+
+    threads = []
+    for client, tag in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")]:
+        t = threading.Thread(target=request, args=(client, tag))
+        t.start()
+        threads.append(t)
+        _wait_queued(ctl, len(threads))
+    ctl.release(holder)
+    for t in threads:
+        t.join()
+    # b1 arrived last but is served right after the flooding client's first request
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+def test_rejections_are_fast():
+    ctl = AdmissionController(max_inflight=1, max_queue=10, max_queue_per_client=1, max_wait_s=0.05)
+    holder = ctl.acquire("a")
+    waiter = threading.Thread(target=ctl.acquire, args=("a",))
+    waiter.start()
+    _wait_queued(ctl, 1)
+
+    start = time.monotonic()
+    full = ctl.acquire("a")
+    assert not full.admitted and full.reason == "client_queue_full"
+    assert time.monotonic() - start < 0.05
+
+    late = ctl.acquire("b")
+    assert not late.admitted and late.reason == "timeout"
+    waiter.join()
+    assert ctl.retry_after() >= 1
+    ctl.release(holder)
+
+
+def test_async_waiters_do_not_hold_threads():
+    ctl = AdmissionController(max_inflight=1, max_queue=50, max_queue_per_client=50, max_wait_s=2)
+    holder = ctl.acquire("a")
+
+    async def main():
+        threads = threading.active_count()
+        waiters = [asyncio.create_task(ctl.acquire_async("b")) for _ in range(20)]
+        while ctl._queued < 20:
+            await asyncio.sleep(0.001)
+        assert threading.active_count() == threads
+        # A slot freed from another thread wakes the first waiter on the loop
+        threading.Thread(target=ctl.release, args=(holder,)).start()
+        first = await waiters[0]
+        assert first.admitted and ctl._queued == 19
+        # A cancelled waiter leaves the queue
+        waiters[1].cancel()
+        await asyncio.gather(waiters[1], return_exceptions=True)
+        assert ctl._queued == 18
+        for w in waiters[2:]:
+            w.cancel()
+        await asyncio.gather(*waiters[2:], return_exceptions=True)
+        ctl.release(first)
+
+    asyncio.run(main())
+    assert ctl._queued == 0 and ctl._inflight == 0
+
+
+def test_client_key_hashes_bearer_token():
+    key = client_key("Bearer secret-token", "10.0.0.1")
+    assert key.startswith("token:") and "secret" not in key
+    assert key == client_key("bearer secret-token", "10.0.0.2")
+    assert client_key(None, "10.0.0.1") == "ip:10.0.0.1"
@@ -0,0 +1,140 @@
+import os
+import stat
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from backend.agents import case_matcher
+from backend.utils import openai_client, shared_cache
+from backend.utils.cache_warmer import CacheWarmer, CaseHistory, case_input, in_hours, parse_hours, record_case
+from backend.utils.private_files import private_path
+from backend.utils.shared_cache import SharedCache, refreshing
+
+
+def _history(tmp_path):
+    return CaseHistory(path=str(tmp_path / "history.sqlite"), half_life_s=3600)
+
+
+def test_paraphrases_rank_as_one_case(tmp_path):
+    history = _history(tmp_path)
+    now = time.time()
+    for text in ["SOB and CP", "shortness of breath, chest pain", "SOB and CP"]:
+        history.record(case_input({"symptoms": text, "age": 58, "gender": "male"}), now)
+    history.record(case_input({"symptoms": "cough", "age": 30}), now)
+    top, other = history.hot_cases(now=now)
+    assert top["seen"] == 3 and "chest pain" in top["label"] and "dyspnea" in top["label"]
+    # The most frequent exact input is the one replayed (LLM entries are keyed on it)
+    assert top["payload"]["symptoms"] == "SOB and CP"
+    assert other["seen"] == 1
+
+
+def test_old_traffic_decays(tmp_path):
+    history = _history(tmp_path)
+    now = time.time()
+    for _ in range(4):
+        history.record(case_input({"symptoms": "headache"}), now - 3 * 3600)
+    for _ in range(2):
+        history.record(case_input({"symptoms": "fever"}), now)
+    assert [c["label"] for c in history.hot_cases(now=now)] == ["fever", "headache"]
+
+
+def test_refreshing_misses_entries_about_to_expire(tmp_path):
+    cache = SharedCache(path=str(tmp_path / "cache.sqlite"))
+    cache.set("llm", "soon", b"a", ttl=60)
+    cache.set("llm", "later", b"b", ttl=3600)
+    with refreshing(600):
+        assert cache.get("llm", "soon") is None
+        assert cache.get("llm", "later") == b"b"
+    assert cache.get("llm", "soon") == b"a"
+
+
+def test_warm_one_replays_due_cases_within_budget(tmp_path):
+    history = _history(tmp_path)
+    history.record(case_input({"symptoms": "chest pain", "age": 58}, profile="full"))
+    runs = []
+
+    def runner(payload):
+        runs.append(payload)
+        reply = SimpleNamespace(content="ok", usage_metadata={"total_tokens": 120})
+        openai_client._count_tokens([], reply, "test")
+
+    warmer = CacheWarmer(runner, history, tokens_per_day=100, refresh_ahead_s=600, idle_rpm=100)
+    result = warmer.warm_one()
+    assert runs[0] == {"symptoms": "chest pain", "age": 58, "options": {"profile": "full"}}
+    assert result["tokens"] == 120 and history.spent_today() == 120
+    # Just warmed: not due again until shortly before its entries expire
+    assert warmer.warm_one() is None
+    # Over the day's budget: nothing more runs
+    history.record(case_input({"symptoms": "cough"}))
+    assert warmer.next_case() is None
+
+
+def test_off_peak_window_and_lease(tmp_path):
+    assert parse_hours("") is None and parse_hours("22-5") == (22, 5)
+    assert in_hours(23, (22, 5)) and in_hours(2, (22, 5)) and not in_hours(12, (22, 5))
+    history = _history(tmp_path)
+    warmer = CacheWarmer(lambda payload: None, history, idle_rpm=1)
+    assert warmer.off_peak()
+    for _ in range(2):
+        history.record(case_input({"symptoms": "cough"}))
+    assert not warmer.off_peak()
+    assert history.acquire_lease("a") and history.acquire_lease("a")
+    assert not history.acquire_lease("b")
+
+
+def test_refresh_window_and_meter_reach_search_threads():
+    seen = []
+
+    def search(query, ontology, max_results, timeout):
+        seen.append(shared_cache._refresh_ahead.get())
+        openai_client._count_tokens([], SimpleNamespace(content="", usage_metadata={"total_tokens": 7}), "test")
+        return []
+
+    with mock.patch.object(case_matcher, "CASE_MATCHER_ONTOLOGIES", ["A", "B"]), \
+            mock.patch.object(case_matcher, "fetch_ontology_matches", search), \
+            mock.patch.dict(case_matcher.LOCAL_SOURCES, {}, clear=True):
+        with refreshing(600), openai_client.metered_tokens() as spent:
+            case_matcher.fetch_case_matches_multi("cough", timeout=5)
+    assert seen == [600, 600] and spent[0] == 14
+
+
+def test_history_file_is_private(tmp_path):
+    history = CaseHistory(path=private_path(str(tmp_path), "history.sqlite"))
+    history.record(case_input({"symptoms": "cough"}))
+    assert stat.S_IMODE(os.stat(os.path.dirname(history.path)).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(history.path).st_mode) == 0o600
+
+
+def test_failed_runs_stay_cold_and_back_off(tmp_path):
+    history = _history(tmp_path)
+    history.record(case_input({"symptoms": "chest pain"}))
+    outcomes = iter([RuntimeError("upstream down"), {"partial_sections": ["literature"]}, {}])
+
+    def runner(payload):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    warmer = CacheWarmer(runner, history, tokens_per_day=0, retry_s=60, idle_rpm=100)
+    now = time.time()
+    assert warmer.warm_one(now)["outcome"] == "error"
+    case = history.hot_cases(now=now)[0]
+    assert case["warmed"] == 0 and case["failures"] == 1
+    assert warmer.next_case(now + 30) is None
+    assert warmer.warm_one(now + 61)["outcome"] == "partial"
+    # Doubled after the second failure
+    assert warmer.next_case(now + 61 + 100) is None
+    assert warmer.warm_one(now + 61 + 121)["outcome"] == "ok"
+    case = history.hot_cases(now=now)[0]
+    assert case["warmed"] > 0 and case["failures"] == 0
+
+
+def test_anonymized_inputs_are_not_replayed(tmp_path):
+    history = _history(tmp_path)
+    with mock.patch("backend.utils.cache_warmer.CACHE_WARMER_ENABLED", True), \
+            mock.patch("backend.utils.cache_warmer.get_case_history", return_value=history):
+        record_case({"symptoms": "fall", "age": 93})
+        record_case({"symptoms": "fall", "age": 70})
+    assert [c["payload"]["age"] for c in history.hot_cases()] == [70]
+    assert history.requests_last_minute() == 2
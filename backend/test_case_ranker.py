@@ -0,0 +1,33 @@
+from backend.utils.case_ranker import rank_locally
+
+
+CANDIDATES = [
+    {"icd_code": "R35.0", "name": "Frequency of micturition", "description": "", "score": 12.1},
+    {"icd_code": "R63.1", "name": "Polydipsia", "description": "Excessive thirst.", "score": 10.9},
+    {"icd_code": "E11.9", "name": "Type 2 diabetes mellitus without complications", "description": "", "score": 9.2},
+]
+
+
+def test_icd_agreement_promotes_differential():
+    parsed = rank_locally(
+        CANDIDATES,
+        "increased thirst, frequent urination",
+        [{"name": "Type 2 diabetes mellitus", "icd10cm_code": "E11.9"}],
+    )
+    codes = [c["icd_code"] for c in parsed["matched_cases"]]
+    assert codes[0] == "E11.9"
+    assert len(codes) == 3
+
+
+def test_is_deterministic_without_context():
+    first = rank_locally(CANDIDATES, "", [])
+    second = rank_locally(CANDIDATES, "", [])
+    assert first == second
+    # With no overlap or codes, BioPortal order wins
+    assert [c["icd_code"] for c in first["matched_cases"]] == ["R35.0", "R63.1", "E11.9"]
+
+
+if __name__ == "__main__":
+    test_icd_agreement_promotes_differential()
+    test_is_deterministic_without_context()
+    print("✅ Case ranker tests passed")
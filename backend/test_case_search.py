@@ -0,0 +1,89 @@
+import time
+import threading
+from unittest import mock
+
+from backend.agents import case_matcher
+from backend.agents.case_matcher import fuse_results
+
+
+def _hit(code, name, cuis=(), score=10):
+    return {"icd_code": code, "name": name, "description": "", "score": score, "cuis": list(cuis)}
+
+
+def test_rrf_merges_cross_ontology_hits_on_icd_code():
+    ranked = {
+        "ICD10CM": [_hit("E11.9", "Type 2 diabetes mellitus without complications", ["C0011860"]),
+                    _hit("R35.0", "Frequency of micturition")],
+        "SNOMEDCT": [_hit("44054006", "Diabetes mellitus type 2", ["C0011860"], score=20),
+                     _hit("28442001", "Polydipsia")],
+        "MSH": [_hit("D003924", "Diabetes Mellitus, Type 2", ["C0011860"])],
+    }
+    fused = fuse_results(ranked, max_results=5)
+    assert fused[0]["icd_code"] == "E11.9"
+    assert fused[0]["sources"] == ["ICD10CM", "SNOMEDCT", "MSH"]
+    assert fused[0]["score"] == 20
+    # Unmapped SNOMED hit stays, so other ontologies are not crowded out
+    assert {f["icd_code"] for f in fused} == {"E11.9", "R35.0", "28442001"}
+    assert fused[0]["rrf_score"] > fused[1]["rrf_score"]
+
+
+def test_snomed_hit_arriving_first_is_represented_by_the_icd_code():
+    ranked = {
+        "SNOMEDCT": [_hit("22298006", "Myocardial infarction", ["C0027051"])],
+        "ICD10CM": [_hit("I21.9", "Acute myocardial infarction, unspecified", ["C0027051"])],
+    }
+    (merged,) = fuse_results(ranked)
+    assert merged["icd_code"] == "I21.9" and merged["sources"] == ["SNOMEDCT", "ICD10CM"]
+
+
+def test_multi_search_runs_sources_concurrently_and_includes_local_index():
+    def slow_ontology(query, ontology, max_results, timeout):
+        time.sleep(0.2)
+        return [_hit(f"{ontology}-1", f"{ontology} hit")]
+
+    local = mock.Mock(return_value=[_hit("R07.9", "Chest pain, unspecified")])
+    with mock.patch.object(case_matcher, "fetch_ontology_matches", slow_ontology), \
+            mock.patch.dict(case_matcher.LOCAL_SOURCES, {"icd10cm_table": local}, clear=True):
+        start = time.monotonic()
+        fused = case_matcher.fetch_case_matches_multi("chest pain", max_results=10, timeout=5)
+        elapsed = time.monotonic() - start
+    assert elapsed < 0.5
+    local.assert_called_once_with("chest pain", 10)
+    assert {f["sources"][0] for f in fused} == {"ICD10CM", "SNOMEDCT", "MSH", "icd10cm_table"}
+
+
+def test_concurrent_requests_do_not_queue_behind_each_other():
+    def ontology(query, ontology, max_results, timeout):
+        time.sleep(0.2)
+        return [_hit(f"{ontology}-{query}", f"{ontology} hit")]
+
+    results = {}
+
+    def request(i):
+        results[i] = case_matcher.fetch_case_matches_multi(str(i), timeout=0.6)
+
+    # Sized for 8 concurrent pipelines: all of their ontology searches start at once
+    with mock.patch.object(case_matcher, "fetch_ontology_matches", ontology), \
+            mock.patch.object(case_matcher, "CASE_SEARCH_PIPELINES", 8), \
+            mock.patch.object(case_matcher, "_search_pool", None), \
+            mock.patch.dict(case_matcher.LOCAL_SOURCES, {}, clear=True):
+        assert case_matcher.search_pool_size() == 8 * len(case_matcher.CASE_MATCHER_ONTOLOGIES)
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        case_matcher._search_pool.shutdown()
+    assert all(len(fused) == len(case_matcher.CASE_MATCHER_ONTOLOGIES) for fused in results.values())
+
+
+def test_slow_source_is_dropped_at_the_timeout():
+    def ontology(query, ontology, max_results, timeout):
+        if ontology == "MSH":
+            time.sleep(1.0)
+        return [_hit(f"{ontology}-1", f"{ontology} hit")]
+
+    with mock.patch.object(case_matcher, "fetch_ontology_matches", ontology), \
+            mock.patch.dict(case_matcher.LOCAL_SOURCES, clear=True):
+        fused = case_matcher.fetch_case_matches_multi("cough", timeout=0.3)
+    assert {f["sources"][0] for f in fused} == {"ICD10CM", "SNOMEDCT"}
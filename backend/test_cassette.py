@@ -0,0 +1,78 @@
+import os
+import stat
+import tempfile
+
+from backend.utils import cassette
+from backend.utils.cassette import Cassette, CassetteMiss, anonymize
+from backend.utils.private_files import private_path
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {"Content-Type": "application/json"}
+    raw = None
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+
+def _cassette():
+    return Cassette(path=os.path.join(tempfile.mkdtemp(), "traffic.cassette.jsonl"))
+
+
+def test_http_roundtrip_without_secrets(monkeypatch):
+    monkeypatch.setattr(cassette, "CASSETTE_LATENCY_SCALE", 0)
+    tape = _cassette()
+    url = "https://rxnav.nlm.nih.gov/REST/drugs.json"
+    tape.record_http("rxnorm", url, {"name": "aspirin", "apikey": "secret"}, FakeResponse(b'{"ok": 1}'), 0.2)
+    assert b"secret" not in open(tape.path, "rb").read()
+
+    resp = tape.replay_http("rxnorm", url, {"name": "aspirin", "apikey": "other"})
+    assert resp.status_code == 200 and resp.json() == {"ok": 1} and resp.raw.read() == b'{"ok": 1}'
+    # Unrecorded params fall back to a response from the same endpoint
+    assert tape.replay_http("rxnorm", url, {"name": "warfarin"}).json() == {"ok": 1}
+
+
+def test_llm_replay_and_miss(monkeypatch):
+    monkeypatch.setattr(cassette, "CASSETTE_LATENCY_SCALE", 0)
+    tape = _cassette()
+    tape.record_llm("k1", "fam", "gpt-4o-mini", '{"summary": "x"}', 1.5)
+    assert tape.replay_llm("other", "fam") == '{"summary": "x"}'
+    try:
+        tape.replay_llm("k2", "unknown")
+        assert False, "expected a miss"
+    except CassetteMiss:
+        pass
+
+
+def test_request_anonymization():
+    tape = _cassette()
+    body = {"symptoms": "call 555-123-4567 or jo@example.com, MRN 12345678", "age": 94,
+            "patient_info": {"age": 40}}
+    tape.record_request("POST", "/analyze", "fused=true", "token:ab", body, 200, 1.0)
+    (entry,) = tape.recorded_requests()
+    assert entry["body"]["symptoms"] == "call [phone] or [email], MRN [id]"
+    assert entry["body"]["age"] == 90 and entry["body"]["patient_info"]["age"] == 40
+    assert anonymize(["a@b.co"]) == ["[email]"]
+
+
+def test_patient_identifiers_do_not_reach_the_file(monkeypatch):
+    monkeypatch.setattr(cassette, "CASSETTE_LATENCY_SCALE", 0)
+    tape = _cassette()
+    url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+    symptoms = "chest pain, call 555-123-4567"
+    tape.record_http("pubmed", url, {"term": symptoms}, FakeResponse(b'{"ok": 1}'), 0.1)
+    tape.record_llm("k1", "fam", "gpt-4o-mini", f'{{"summary": "Patient reports {symptoms}"}}', 1.0)
+    assert b"555-123-4567" not in open(tape.path, "rb").read()
+    # Exact replay still works: keys were taken from the original params
+    assert tape.replay_http("pubmed", url, {"term": symptoms}).json() == {"ok": 1}
+    assert tape.load()["key"][cassette.make_key("pubmed", url, {"term": symptoms})]
+    assert tape.replay_llm("k1", "fam") == '{"summary": "Patient reports chest pain, call [phone]"}'
+
+
+def test_cassette_file_is_private():
+    tape = Cassette(path=private_path(tempfile.mkdtemp(), "traffic.cassette.jsonl"))
+    tape.record_llm("k", "f", "model", "reply", 0.1)
+    assert stat.S_IMODE(os.stat(os.path.dirname(tape.path)).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(tape.path).st_mode) == 0o600
+    assert os.path.basename(os.path.dirname(cassette.CASSETTE_PATH)).startswith("gdhs-")
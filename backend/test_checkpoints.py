@@ -0,0 +1,111 @@
+import os
+import stat
+import time
+import tempfile
+
+from langgraph.graph import StateGraph, END
+
+from backend.orchestrator import checkpoints
+from backend.orchestrator.checkpoints import SqliteCheckpointSaver, run_config
+from backend.utils.private_files import private_path
+
+NODES = ["first", "second", "third"]
+
+
+def _saver(ttl=60):
+    return SqliteCheckpointSaver(path=os.path.join(tempfile.mkdtemp(), "runs.sqlite"), ttl=ttl)
+
+
+def _graph(saver, calls, fail_once=()):
+    failing = set(fail_once)
+
+    def make(name):
+        def node(state):
+            calls.append(name)
+            if name in failing:
+                failing.discard(name)
+                raise RuntimeError(f"{name} failed")
+            state[name] = state.get("seed", 0) + len(calls)
+            return state
+        return node
+
+    graph = StateGraph(dict)
+    for name in NODES:
+        graph.add_node(name, make(name))
+    graph.set_entry_point("first")
+    graph.add_edge("first", "second")
+    graph.add_edge("second", "third")
+    graph.add_edge("third", END)
+    return graph.compile(checkpointer=saver)
+
+
+def test_resume_skips_completed_nodes():
+    calls = []
+    graph = _graph(_saver(), calls, fail_once=["third"])
+    try:
+        graph.invoke({"seed": 1}, run_config("r1"))
+    except RuntimeError:
+        pass
+    status = checkpoints.run_status(graph, "r1")
+    assert status["status"] == "failed" and status["next"] == ["third"]
+
+    final = checkpoints.resume(graph, NODES, "r1")
+    assert calls == ["first", "second", "third", "third"]
+    assert final["first"] == 2 and "third" in final
+    assert checkpoints.run_status(graph, "r1")["status"] == "completed"
+
+
+def test_rerun_single_agent_and_downstream():
+    calls = []
+    graph = _graph(_saver(), calls)
+    graph.invoke({"seed": 0, "deadline": time.time() - 1}, run_config("r2"))
+    calls.clear()
+
+    final = checkpoints.rerun_from(graph, NODES, "r2", "second")
+    assert calls == ["second", "third"]
+    # Upstream output kept, stale deadline dropped
+    assert final["first"] == 1 and "deadline" not in final
+
+
+def test_rerun_of_an_agent_the_run_skipped():
+    graph = StateGraph(dict)
+    for name in NODES:
+        graph.add_node(name, lambda state: state)
+    graph.set_entry_point("first")
+    # The profile skipped "second" for this run
+    graph.add_conditional_edges("first", lambda state: "third", {"second": "second", "third": "third"})
+    graph.add_edge("second", "third")
+    graph.add_edge("third", END)
+    graph = graph.compile(checkpointer=_saver())
+    graph.invoke({"seed": 0}, run_config("r3"))
+
+    try:
+        checkpoints.rerun_from(graph, NODES, "r3", "second")
+        raise AssertionError("expected AgentNotInRunError")
+    except checkpoints.AgentNotInRunError as e:
+        assert "not part of run 'r3'" in str(e)
+    try:
+        checkpoints.rerun_from(graph, NODES, "missing", "second")
+        raise AssertionError("expected RunNotFoundError")
+    except checkpoints.RunNotFoundError:
+        pass
+
+
+def test_expired_runs_are_gone():
+    saver = _saver(ttl=0.05)
+    graph = _graph(saver, [])
+    graph.invoke({"seed": 0}, run_config("r3"))
+    time.sleep(0.1)
+    assert saver.get_tuple(run_config("r3")) is None
+
+
+def test_checkpoint_files_are_private():
+    saver = SqliteCheckpointSaver(path=private_path(tempfile.mkdtemp(), "runs.sqlite"))
+    old = os.umask(0o022)
+    try:
+        _graph(saver, []).invoke({"seed": 0}, run_config("r4"))
+    finally:
+        os.umask(old)
+    assert stat.S_IMODE(os.stat(os.path.dirname(saver.path)).st_mode) == 0o700
+    for suffix in ("", "-wal", "-shm"):
+        assert stat.S_IMODE(os.stat(saver.path + suffix).st_mode) == 0o600
@@ -0,0 +1,110 @@
+import time
+from unittest import mock
+
+from backend.agents import (
+    case_matcher, fused_agent, literature_agent, summarizer_agent, symptom_analyzer, treatment_agent,
+)
+from backend.utils.deadline import set_deadline
+from backend.utils.pubmed_scheduler import FetchTimeout
+
+ARTICLES = [{"pmid": "1", "title": "Chest pain outcomes", "abstract": "Early invasive strategy in NSTEMI."}]
+CASES = [{"icd_code": "R07.9", "name": "Chest pain", "description": "", "score": 0.5},
+         {"icd_code": "I21.4", "name": "NSTEMI", "description": "", "score": 0.9}]
+DRUGS = [{"rxcui": "1191", "name": "aspirin 81 MG Oral Tablet", "class": "SCD"}]
+CALLS = []
+
+
+def slow_llm(prompt, temperature, variables, timeout=None, validate=None):
+    # Started within budget, then the provider hangs until the call times out
+    CALLS.append(prompt)
+    time.sleep(0.05)
+    raise TimeoutError(f"LLM call timed out after {timeout:.1f}s")
+
+
+def _patched():
+    return [
+        mock.patch.dict("os.environ", {"OPENROUTER_API_KEY": "test"}),
+        *(mock.patch.object(m, "invoke_llm", slow_llm)
+          for m in (fused_agent, literature_agent, case_matcher, treatment_agent, symptom_analyzer,
+                    summarizer_agent)),
+        mock.patch.object(literature_agent, "cached_summaries", return_value={}),
+        mock.patch.object(fused_agent, "cached_summaries", return_value={}),
+        mock.patch.object(treatment_agent, "fetch_drug_treatments", return_value=DRUGS),
+    ]
+
+
+def _state():
+    CALLS.clear()
+    state = {"symptoms": "chest pain", "diagnosis": "NSTEMI", "options": {"case_ranker": "llm"}}
+    set_deadline(state, 30)
+    return state
+
+
+def _run(fn, state):
+    patches = _patched()
+    for p in patches:
+        p.start()
+    try:
+        return fn(state)
+    finally:
+        for p in reversed(patches):
+            p.stop()
+
+
+def test_timed_out_llm_steps_mark_sections_partial():
+    state = _state()
+    retrieval = {"query": "chest pain", "articles": ARTICLES, "skipped": False, "patient_context": {}}
+    with mock.patch.object(literature_agent, "retrieve_literature", return_value=retrieval):
+        state = _run(literature_agent.literature_agent, state)
+    state = _run(treatment_agent.treatment_agent, state)
+    assert state["partial_sections"] == ["literature", "treatment"]
+    assert state["literature"]["partial_reason"] == "llm_error"
+    assert state["literature"]["articles"]["summaries"][0]["summary"] == ARTICLES[0]["abstract"]
+    assert state["treatment"]["treatments"][0]["source"] == "RxNorm"
+
+
+def test_failed_fused_call_falls_back_and_marks_partial():
+    state = _state()
+    retrievals = {
+        "retrieve_literature": {"query": "chest pain", "articles": ARTICLES, "skipped": False,
+                                "patient_context": {}},
+        "retrieve_case_matches": {"query": "chest pain", "raw_results": CASES, "skipped": False,
+                                  "symptoms": "chest pain", "patient_context": {},
+                                  "differentials": [{"name": "NSTEMI", "icd10cm_code": "I21.4"}]},
+    }
+    with mock.patch.multiple(fused_agent, **{k: mock.Mock(return_value=v) for k, v in retrievals.items()}):
+        state = _run(fused_agent.fused_post_retrieval_agent, state)
+    assert state["partial_sections"] == ["literature", "case_matcher", "treatment"]
+    assert {state[k]["partial_reason"] for k in state["partial_sections"]} == {"llm_error"}
+    # Each section still tried its own LLM step after the fused call failed
+    assert CALLS == [fused_agent.fused_prompt, literature_agent.summary_prompt, case_matcher.matcher_prompt,
+                     treatment_agent.treatment_prompt]
+    # The case matcher degrades to the local ranker rather than raw passthrough
+    assert state["case_matcher"]["matched_cases"][0]["icd_code"] == "I21.4"
+
+
+def test_timed_out_symptom_analysis_is_partial():
+    state = _run(symptom_analyzer.symptom_analyzer_agent, _state())
+    assert CALLS == [symptom_analyzer.prompt]
+    assert state["symptom_analysis"]["top_differentials"] == []
+    assert state["partial_sections"] == ["symptom_analysis"]
+    assert state["symptom_analysis"]["partial_reason"] == "llm_error"
+
+
+def test_timed_out_summary_is_partial():
+    state = _run(summarizer_agent.summarizer_agent, _state())
+    assert CALLS == [summarizer_agent.summary_prompt]
+    # The canned summary is returned, but flagged as degraded
+    assert state["summary"]["patient_summary"].startswith("Patient with symptoms: chest pain")
+    assert state["partial_sections"] == ["summary"]
+    assert state["summary"]["partial_reason"] == "llm_error"
+
+
+def test_pubmed_fetch_timeout_marks_literature_partial():
+    state = _state()
+    timeout = FetchTimeout("PubMed fetch of 3 PMIDs timed out waiting for its batch")
+    with mock.patch.object(literature_agent, "fetch_pubmed_articles", side_effect=timeout):
+        state = _run(literature_agent.literature_agent, state)
+    assert state["partial_sections"] == ["literature"]
+    assert state["literature"]["partial_reason"] == "deadline"
+    assert state["literature"]["articles"] == []
@@ -0,0 +1,132 @@
+import os
+import json
+import tempfile
+from unittest import mock
+
+from backend.agents import case_matcher, fused_agent, literature_agent, treatment_agent
+from backend.utils.shared_cache import SharedCache
+
+ARTICLES = [{"pmid": "101", "title": "Chest pain outcomes", "abstract": "Early invasive strategy in NSTEMI."},
+            {"pmid": "102", "title": "Troponin assays", "abstract": "High-sensitivity troponin rules out MI."}]
+CASES = [{"icd_code": "R07.9", "name": "Chest pain", "description": "", "score": 0.5},
+         {"icd_code": "I21.4", "name": "NSTEMI", "description": "", "score": 0.9}]
+DRUGS = [{"rxcui": "1191", "name": "aspirin 81 MG Oral Tablet", "class": "SCD"}]
+
+
+def _retrievals():
+    return {
+        "retrieve_literature": mock.Mock(return_value={
+            "query": "chest pain", "articles": ARTICLES, "skipped": False, "patient_context": {}}),
+        "retrieve_case_matches": mock.Mock(return_value={
+            "query": "chest pain", "raw_results": CASES, "skipped": False, "symptoms": "chest pain",
+            "differentials": [], "patient_context": {}}),
+    }
+
+
+def _run(fused_reply, llm=None):
+    """Run the fused node on fixed retrievals; `llm` answers the single-agent fallback calls."""
+    cache = SharedCache(path=os.path.join(tempfile.mkdtemp(), "cache.sqlite"))
+    fused_llm = mock.Mock(return_value=json.dumps(fused_reply))
+    single_llm = mock.Mock(side_effect=llm or RuntimeError("no fallback expected"))
+    state = {"symptoms": "chest pain", "diagnosis": "NSTEMI", "age": 58, "options": {"case_ranker": "llm"}}
+    with mock.patch.dict("os.environ", {"OPENROUTER_API_KEY": "test"}), \
+            mock.patch.multiple(fused_agent, invoke_llm=fused_llm, **_retrievals()), \
+            mock.patch.object(literature_agent, "get_cache", return_value=cache), \
+            mock.patch.object(literature_agent, "invoke_llm", single_llm), \
+            mock.patch.object(case_matcher, "invoke_llm", single_llm), \
+            mock.patch.object(treatment_agent, "invoke_llm", single_llm), \
+            mock.patch.object(treatment_agent, "fetch_drug_treatments", return_value=DRUGS):
+        state = fused_agent.fused_post_retrieval_agent(state)
+    return state, cache, fused_llm, single_llm
+
+
+def test_fused_summaries_are_not_cached_per_pmid():
+    reply = {
+        "literature": {"summaries": [{"pmid": a["pmid"], "title": a["title"], "summary": "For this 58-year-old..."}
+                                     for a in ARTICLES]},
+        "case_matcher": {"matched_cases": [{"icd_code": "I21.4", "name": "NSTEMI", "description": "",
+                                            "match_score": 0.9}]},
+        "treatment": {"treatments": [{"name": "Aspirin", "type": "drug"}]},
+    }
+    state, cache, fused_llm, _ = _run(reply)
+    assert state["literature"]["articles"]["summaries"][0]["summary"] == "For this 58-year-old..."
+    assert cache.get_json("pmid_summary", "101") is None
+    # Patient context is not part of the literature section of the prompt
+    user = fused_agent.fused_prompt.format_messages(**fused_llm.call_args.args[2])[1].content
+    literature_part, rest = user.split("=== PATIENT")
+    assert "58" not in literature_part and "Age: 58" in rest
+
+
+def test_standalone_summaries_are_cached_per_pmid():
+    cache = SharedCache(path=os.path.join(tempfile.mkdtemp(), "cache.sqlite"))
+    reply = {"summaries": [{"pmid": a["pmid"], "title": a["title"], "summary": "Abstract-only summary."}
+                           for a in ARTICLES]}
+    with mock.patch.dict("os.environ", {"OPENROUTER_API_KEY": "test"}), \
+            mock.patch.object(literature_agent, "get_cache", return_value=cache), \
+            mock.patch.object(literature_agent, "invoke_llm", return_value=json.dumps(reply)):
+        literature_agent.summarize_articles({"articles": ARTICLES})
+    assert cache.get_json("pmid_summary", "101")["summary"] == "Abstract-only summary."
+
+
+def _reply(**parts):
+    reply = {
+        "literature": {"summaries": [{"pmid": a["pmid"], "title": a["title"], "summary": "Fused summary."}
+                                     for a in ARTICLES]},
+        "case_matcher": {"matched_cases": [{"icd_code": "I21.4", "name": "NSTEMI", "description": "",
+                                            "match_score": 0.9}]},
+        "treatment": {"treatments": [{"name": "Aspirin", "type": "drug"}]},
+    }
+    reply.update(parts)
+    return {k: v for k, v in reply.items() if v is not None}
+
+
+def _single_agent(replies):
+    """Single-agent LLM fake answering by prompt; a missing reply raises like a failed call."""
+    prompts = {literature_agent.summary_prompt: "literature", case_matcher.matcher_prompt: "case_matcher",
+               treatment_agent.treatment_prompt: "treatment"}
+
+    def llm(prompt, temperature, variables, timeout=None, validate=None):
+        reply = replies.get(prompts[prompt])
+        if reply is None:
+            raise RuntimeError("LLM call failed")
+        return json.dumps(reply)
+    return llm
+
+
+def test_valid_fused_reply_is_split_without_fallback_calls():
+    state, _, fused_llm, single_llm = _run(_reply())
+    assert fused_llm.call_count == 1 and single_llm.call_count == 0
+    assert state["literature"]["articles"]["summaries"][1]["summary"] == "Fused summary."
+    assert state["case_matcher"]["matched_cases"][0]["icd_code"] == "I21.4"
+    assert state["treatment"]["treatments"][0]["name"] == "Aspirin"
+    assert not state.get("partial_sections")
+
+
+def test_missing_or_invalid_parts_fall_back_per_section():
+    # case_matcher fails validation (no icd_code), treatment is missing; literature is valid
+    reply = _reply(case_matcher={"matched_cases": [{"name": "NSTEMI"}]}, treatment=None)
+    llm = _single_agent({
+        "case_matcher": {"matched_cases": [{"icd_code": "R07.9", "name": "Chest pain", "description": "",
+                                            "match_score": 0.7}]},
+        "treatment": {"treatments": [{"name": "Nitroglycerin", "type": "drug"}]},
+    })
+    state, _, _, single_llm = _run(reply, llm=llm)
+    assert [c.args[0] for c in single_llm.call_args_list] == [case_matcher.matcher_prompt,
+                                                              treatment_agent.treatment_prompt]
+    assert state["literature"]["articles"]["summaries"][0]["summary"] == "Fused summary."
+    assert state["case_matcher"]["matched_cases"][0]["icd_code"] == "R07.9"
+    assert state["treatment"]["treatments"][0]["name"] == "Nitroglycerin"
+    assert not state.get("partial_sections")
+
+
+def test_failed_fallback_marks_only_that_section_partial():
+    llm = _single_agent({"literature": {"summaries": [{"pmid": a["pmid"], "title": a["title"],
+                                                       "summary": "Single-agent summary."} for a in ARTICLES]}})
+    state, _, _, single_llm = _run(_reply(literature={"summaries": "not a list"}, treatment={"treatments": []},
+                                          case_matcher=None), llm=llm)
+    # Literature recovered from its own call; the case matcher's failed, so it fell back to the local ranker
+    assert state["literature"]["articles"]["summaries"][0]["summary"] == "Single-agent summary."
+    assert [c["icd_code"] for c in state["case_matcher"]["matched_cases"]][:2] == ["R07.9", "I21.4"]
+    assert state["partial_sections"] == ["case_matcher"]
+    assert state["case_matcher"]["partial_reason"] == "llm_error"
+    assert single_llm.call_count == 2
@@ -0,0 +1,84 @@
+from backend.utils import icd10
+from backend.utils.icd10 import CORRECTED, UNKNOWN, VALID, ICD10Table, format_code, normalize_code
+
+ENTRIES = [
+    ("I21", False, "Acute myocardial infarction"),
+    ("I214", True, "Non-ST elevation (NSTEMI) myocardial infarction"),
+    ("I219", True, "Acute myocardial infarction, unspecified"),
+    ("J18", False, "Pneumonia, unspecified organism"),
+    ("J189", True, "Pneumonia, unspecified organism"),
+    ("J44", False, "Other chronic obstructive pulmonary disease"),
+    ("J441", True, "Chronic obstructive pulmonary disease with (acute) exacerbation"),
+    ("J449", True, "Chronic obstructive pulmonary disease, unspecified"),
+    ("J45", False, "Asthma"),
+    ("J4590", False, "Unspecified asthma"),
+    ("J45901", True, "Unspecified asthma with (acute) exacerbation"),
+    ("R079", True, "Chest pain, unspecified"),
+]
+
+
+def test_code_formatting():
+    assert normalize_code(" i21.4 ") == "I214"
+    assert format_code("I214") == "I21.4" and format_code("J18") == "J18"
+
+
+def test_hierarchy():
+    table = ICD10Table(ENTRIES)
+    assert table.parent("J45901") == "J4590"
+    assert table.ancestors("J45.901") == ["J4590", "J45"]
+    assert sorted(table.descendants("I21")) == ["I214", "I219"]
+    assert table.is_billable("I21.9") and not table.is_billable("I21")
+
+
+def test_valid_codes_and_category_refinement():
+    table = ICD10Table(ENTRIES)
+    assert table.check("NSTEMI", "i21.4") == {"code": "I21.4", "status": VALID, "title": ENTRIES[1][2]}
+    # Non-billable category → billable code by name, else its "unspecified" code
+    assert table.check("COPD exacerbation", "J44")["code"] == "J44.1"
+    refined = table.check("Heart attack", "I21")
+    assert refined["code"] == "I21.9" and refined["status"] == CORRECTED
+
+
+def test_names_correct_bad_codes():
+    table = ICD10Table(ENTRIES, complete=True)
+    assert table.check("Community acquired pnuemonia", "XX1")["code"] == "J18.9"
+    assert table.check("Acute exacerbation of COPD", None)["code"] == "J44.1"
+    # Unknown child of a real category: the name picks the code within the branch
+    assert table.check("Myocardial infarction", "I21.99")["code"] == "I21.9"
+    assert table.check("Something else entirely", "Q99.9")["status"] == UNKNOWN
+
+
+def test_code_contradicting_the_name_is_corrected():
+    table = ICD10Table(ENTRIES + [("I10", True, "Essential (primary) hypertension")])
+    fixed = table.check("Pneumonia", "I10")
+    assert fixed["code"] == "J18.9" and fixed["status"] == CORRECTED
+    assert table.check("Hypertension", "I10")["status"] == VALID
+    # A name fitting the code's category, or one the index only partly knows, keeps its code
+    assert table.check("NSTEMI", "I21.4")["status"] == VALID
+    assert table.check("Viral URI", "I10")["status"] == VALID
+
+
+def test_partial_table_leaves_well_formed_codes_alone():
+    table = ICD10Table(ENTRIES)
+    assert not table.complete
+    assert table.check("Essential hypertension", "I10") == {"code": "I10", "status": UNKNOWN, "title": ""}
+
+
+def test_validate_differentials_annotates():
+    table = ICD10Table(ENTRIES)
+    out = table.validate_differentials([
+        {"name": "Pneumonia", "icd10cm_code": "J18.9", "rationale": "r"},
+        {"name": "Heart attack", "icd10cm_code": "I21"},
+        "not a differential",
+    ])
+    assert out[0]["icd10cm_status"] == VALID and out[0]["rationale"] == "r"
+    assert out[1]["icd10cm_code"] == "I21.9" and out[1]["icd10cm_original"] == "I21"
+    assert out[2] == "not a differential"
+
+
+def test_shipped_table_loads():
+    table = ICD10Table.load(icd10.ICD10CM_CODES_PATH)
+    assert len(table) > 200
+    assert table.title("I21.4").startswith("Non-ST elevation (NSTEMI)")
+    assert table.search("heart attack", 1)[0]["icd_code"].startswith("I21")
+    assert table.check("Heart attack", None)["code"] == "I21.9"
@@ -0,0 +1,87 @@
+import os
+import tempfile
+
+from langgraph.graph import StateGraph, END
+
+from backend.orchestrator.checkpoints import SqliteCheckpointSaver, run_config
+from backend.orchestrator.incremental import affected_nodes, changed_fields, update_run
+
+NODES = ["symptom_analyzer", "literature_agent", "case_matcher", "treatment_agent", "summarizer_agent"]
+OUTPUT = {"symptom_analyzer": "symptom_analysis", "literature_agent": "literature",
+          "case_matcher": "case_matcher", "treatment_agent": "treatment", "summarizer_agent": "summary"}
+
+
+def _functions(calls):
+    def make(name):
+        def node(state):
+            calls.append(name)
+            if name == "symptom_analyzer":
+                # Differentials depend on symptoms only
+                state[OUTPUT[name]] = {"top_differentials": [state["symptoms"]]}
+            else:
+                state[OUTPUT[name]] = {"meds": state.get("currentMedications"), "n": len(calls)}
+            return state
+        return node
+    return {name: make(name) for name in NODES}
+
+
+def _graph(functions):
+    saver = SqliteCheckpointSaver(path=os.path.join(tempfile.mkdtemp(), "runs.sqlite"))
+    graph = StateGraph(dict)
+    for name in NODES:
+        graph.add_node(name, functions[name])
+    graph.set_entry_point(NODES[0])
+    for a, b in zip(NODES, NODES[1:]):
+        graph.add_edge(a, b)
+    graph.add_edge(NODES[-1], END)
+    return graph.compile(checkpointer=saver)
+
+
+def test_dependency_map():
+    assert changed_fields({"age": 40, "urgency": "low"}, {"age": 41, "urgency": "low"}) == ["age"]
+    assert "case_matcher" not in affected_nodes(["currentMedications"], NODES)
+    assert affected_nodes(["urgency"], NODES) == ["symptom_analyzer", "summarizer_agent"]
+    assert changed_fields({}, {"options": {"case_ranker": "local"}}) == ["options.case_ranker"]
+
+
+def test_update_recomputes_only_affected_agents():
+    calls = []
+    functions = _functions(calls)
+    graph = _graph(functions)
+    case = {"symptoms": "cough", "age": 50, "currentMedications": "aspirin", "urgency": "low"}
+    graph.invoke(dict(case), run_config("r1"))
+    calls.clear()
+
+    # Unchanged differentials: case matching is not redone after a medication edit
+    state = update_run(graph, NODES, "r1", {**case, "currentMedications": "warfarin"}, functions)
+    assert state["recomputed"] == ["symptom_analyzer", "literature_agent", "treatment_agent", "summarizer_agent"]
+    assert state["treatment"]["meds"] == "warfarin"
+    assert graph.get_state(run_config("r1")).values["currentMedications"] == "warfarin"
+
+    # Nothing changed: nothing recomputed
+    calls.clear()
+    state = update_run(graph, NODES, "r1", {**case, "currentMedications": "warfarin"}, functions)
+    assert state["recomputed"] == [] and calls == []
+
+
+def test_reworded_rationale_does_not_redo_case_matching():
+    calls = []
+    functions = _functions(calls)
+
+    def analyzer(state):
+        calls.append("symptom_analyzer")
+        state["symptom_analysis"] = {"top_differentials": [
+            {"name": "Pneumonia", "icd10cm_code": "J18.9",
+             "rationale": f"Cough; on {state.get('currentMedications')}"}]}
+        return state
+
+    functions["symptom_analyzer"] = analyzer
+    graph = _graph(functions)
+    case = {"symptoms": "cough", "age": 50, "currentMedications": "aspirin", "urgency": "low"}
+    graph.invoke(dict(case), run_config("r2"))
+    calls.clear()
+
+    # Only the rationale changed: the summarizer sees it, the case matcher does not
+    state = update_run(graph, NODES, "r2", {**case, "currentMedications": "warfarin"}, functions)
+    assert "warfarin" in state["symptom_analysis"]["top_differentials"][0]["rationale"]
+    assert state["recomputed"] == ["symptom_analyzer", "literature_agent", "treatment_agent", "summarizer_agent"]
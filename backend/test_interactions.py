@@ -0,0 +1,73 @@
+from unittest import mock
+
+from backend.agents import treatment_agent
+from backend.utils.interactions import InteractionMatrix, get_interactions
+
+WARFARIN, ASPIRIN, IBUPROFEN, SIMVASTATIN, CLARITHROMYCIN = "11289", "1191", "5640", "36567", "21212"
+
+
+def test_resolves_generic_and_brand_names():
+    matrix = get_interactions()
+    assert matrix.resolve("Coumadin 5 mg daily, ASA 81mg, metformin") == [WARFARIN, ASPIRIN]
+    assert matrix.resolve("Warfarin Sodium 5 MG Oral Tablet") == [WARFARIN]
+    assert matrix.resolve("glyceryl trinitrate spray") == ["4917"]
+    assert matrix.resolve("") == []
+
+
+def test_check_is_symmetric_and_sorted_by_severity():
+    matrix = get_interactions()
+    assert matrix.lookup(WARFARIN, ASPIRIN) == matrix.lookup(ASPIRIN, WARFARIN)
+    flagged = matrix.check([CLARITHROMYCIN], [WARFARIN, SIMVASTATIN])
+    assert [(f["interacts_with"], f["severity"]) for f in flagged] == [
+        ("simvastatin", "contraindicated"), ("warfarin", "major"),
+    ]
+    assert matrix.check([WARFARIN], [WARFARIN]) == []
+
+
+def test_rejects_unknown_severity():
+    try:
+        InteractionMatrix({"ingredients": {}, "interactions": [{"a": "1", "b": "2", "severity": "bad"}]})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_candidates_are_flagged_before_the_llm():
+    drugs = [{"rxcui": "197361", "name": "ibuprofen 400 MG Oral Tablet", "class": "SCD"},
+             {"rxcui": "313782", "name": "acetaminophen 325 MG Oral Tablet", "class": "SCD"}]
+    with mock.patch.object(treatment_agent, "fetch_drug_treatments", return_value=drugs):
+        retrieval = treatment_agent.retrieve_treatments(
+            {"diagnosis": "back pain", "currentMedications": "Coumadin 5 mg, lisinopril"})
+    ibuprofen, acetaminophen = retrieval["drug_results"]
+    assert {f["interacts_with"] for f in ibuprofen["interactions"]} == {"warfarin", "lisinopril"}
+    assert acetaminophen["interactions"] == []
+    assert "ibuprofen + warfarin (major)" in treatment_agent.format_interactions(retrieval["flagged"])
+
+    out = treatment_agent.build_treatment_output(retrieval, {"treatments": [
+        {"name": "Motrin", "type": "drug"}, {"name": "Physical therapy", "type": "non-drug"}]})
+    assert out["treatments"][0]["interactions"][0]["severity"] == "major"
+    assert out["treatments"][1]["interactions"] == []
+
+
+def test_unresolved_medications_are_left_to_the_llm():
+    matrix = get_interactions()
+    assert matrix.unresolved("Coumadin 5 mg; sertraline 50 mg and ASA 81mg") == ["sertraline 50 mg"]
+    assert matrix.unresolved("") == []
+
+    drugs = [{"rxcui": "197361", "name": "ibuprofen 400 MG Oral Tablet", "class": "SCD"}]
+    with mock.patch.object(treatment_agent, "fetch_drug_treatments", return_value=drugs):
+        retrieval = treatment_agent.retrieve_treatments(
+            {"diagnosis": "back pain", "currentMedications": "Coumadin 5 mg, sertraline 50 mg"})
+    assert retrieval["current_rxcuis"] == [WARFARIN]
+    assert retrieval["unchecked_medications"] == ["sertraline 50 mg"]
+
+    with mock.patch.dict("os.environ", {"OPENROUTER_API_KEY": "test"}), \
+            mock.patch.object(treatment_agent, "invoke_llm", return_value='{"treatments": []}') as llm:
+        treatment_agent.recommend_treatments(retrieval)
+    variables = llm.call_args.args[2]
+    assert variables["checked_meds"] == "warfarin"
+    assert variables["unchecked_meds"] == "sertraline 50 mg"
+
+    out = treatment_agent.build_treatment_output(retrieval, {"treatments": [{"name": "Motrin", "type": "drug"}]})
+    assert out["unchecked_medications"] == ["sertraline 50 mg"]
@@ -0,0 +1,82 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from backend.utils.job_queue import DONE, FAILED, RUNNING, JobQueue, JobRejected, priority_class
+
+
+def _blocked_queue(aging_s=30.0):
+    queue = JobQueue(workers=1, aging_s=aging_s)
+    gate = threading.Event()
+    blocker = queue.submit(gate.wait, "high")
+    while blocker.status != RUNNING:
+        time.sleep(0.001)
+    return queue, gate
+
+
+def test_urgency_then_arrival_order():
+    queue, gate = _blocked_queue()
+    order = []
+    jobs = [queue.submit(lambda u=u, i=i: order.append((u, i)), u)
+            for i, u in enumerate(["low", "moderate", "high", "low", "high"])]
+    assert queue.depth() == {"high": 2, "moderate": 1, "low": 2}
+    gate.set()
+    for job in jobs:
+        assert job.wait(2) and job.status == DONE
+    assert order == [("high", 2), ("high", 4), ("moderate", 1), ("low", 0), ("low", 3)]
+
+
+def test_aging_prevents_starvation():
+    queue, gate = _blocked_queue(aging_s=0.05)
+    order = []
+    old = queue.submit(lambda: order.append("routine"), "routine")
+    time.sleep(0.15)
+    new = queue.submit(lambda: order.append("urgent"), "urgent")
+    gate.set()
+    assert old.wait(2) and new.wait(2)
+    assert order == ["routine", "urgent"]
+
+
+def test_failures_and_unknown_urgency():
+    assert priority_class(None) == priority_class("whatever") == 2
+    queue = JobQueue(workers=1)
+    job = queue.submit(lambda: 1 / 0, meta={"run_id": "r"})
+    assert job.wait(2) and job.status == FAILED
+    assert job.to_dict()["run_id"] == "r" and "division" in job.to_dict()["error"]
+
+
+def test_queue_and_client_caps():
+    queue = JobQueue(workers=1, max_queue=3, max_per_client=2)
+    gate = threading.Event()
+    running = queue.submit(gate.wait, client="a")
+    while running.status != RUNNING:
+        time.sleep(0.001)
+    queue.submit(lambda: 1, client="a")
+    with pytest.raises(JobRejected) as e:
+        queue.submit(lambda: 1, client="a")
+    assert e.value.reason == "client_limit" and e.value.retry_after >= 1
+    queue.submit(lambda: 1, client="b")
+    queue.submit(lambda: 1, client="c")
+    with pytest.raises(JobRejected) as e:
+        queue.submit(lambda: 1, client="d")
+    assert e.value.reason == "queue_full"
+    gate.set()
+    # Fetched results no longer count against the client
+    assert running.wait(2)
+    queue.mark_fetched(running)
+    queue.submit(lambda: 1, client="a")
+
+
+def test_long_poll_waits_on_the_event_loop():
+    queue, gate = _blocked_queue()
+    job = queue.submit(lambda: "ok")
+
+    async def poll():
+        timed_out = await job.wait_async(0.05)
+        threading.Timer(0.05, gate.set).start()
+        return timed_out, await job.wait_async(2)
+
+    assert asyncio.run(poll()) == (False, True)
+    assert job.status == DONE and job.result == "ok"
@@ -0,0 +1,55 @@
+import os
+import json
+import tempfile
+
+from backend.agents import literature_agent
+from backend.utils.shared_cache import SharedCache
+
+
+def _article(pmid, abstract=None):
+    return {"pmid": pmid, "title": f"Title {pmid}", "abstract": abstract or f"Abstract {pmid}"}
+
+
+def _setup(monkeypatch):
+    cache = SharedCache(path=os.path.join(tempfile.mkdtemp(), "cache.sqlite"))
+    monkeypatch.setattr(literature_agent, "get_cache", lambda: cache)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    prompts = []
+
+    def fake_llm(prompt, temperature, inputs, timeout=None, validate=None):
+        prompts.append(inputs["abstracts"])
+        pmids = [line.split(": ")[1] for line in inputs["abstracts"].splitlines() if line.startswith("PMID: ")]
+        return json.dumps({"summaries": [{"pmid": p, "title": "", "summary": f"Summary {p}"} for p in pmids]})
+
+    monkeypatch.setattr(literature_agent, "invoke_llm", fake_llm)
+    return prompts
+
+
+def test_only_uncached_pmids_go_to_the_llm(monkeypatch):
+    prompts = _setup(monkeypatch)
+    first = literature_agent.summarize_articles({"articles": [_article("1"), _article("2")]})
+    assert [s["summary"] for s in first["summaries"]] == ["Summary 1", "Summary 2"]
+
+    # A different query sharing PMID 2: only PMID 3 is summarized, order follows the articles
+    second = literature_agent.summarize_articles({"articles": [_article("3"), _article("2")]})
+    assert [s["pmid"] for s in second["summaries"]] == ["3", "2"]
+    assert "PMID: 3" in prompts[1] and "PMID: 2" not in prompts[1]
+
+
+def test_warm_request_makes_no_llm_call(monkeypatch):
+    prompts = _setup(monkeypatch)
+    articles = [_article("1"), _article("2")]
+    literature_agent.summarize_articles({"articles": articles})
+    warm = literature_agent.summarize_articles({"articles": articles})
+    assert len(prompts) == 1
+    assert [s["summary"] for s in warm["summaries"]] == ["Summary 1", "Summary 2"]
+
+
+def test_changed_abstract_or_version_invalidates(monkeypatch):
+    prompts = _setup(monkeypatch)
+    literature_agent.summarize_articles({"articles": [_article("1")]})
+    literature_agent.summarize_articles({"articles": [_article("1", abstract="Corrected abstract")]})
+    assert len(prompts) == 2
+    monkeypatch.setattr(literature_agent, "SUMMARY_CACHE_VERSION", literature_agent.SUMMARY_CACHE_VERSION + 1)
+    literature_agent.summarize_articles({"articles": [_article("1", abstract="Corrected abstract")]})
+    assert len(prompts) == 3
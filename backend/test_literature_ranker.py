@@ -0,0 +1,68 @@
+import datetime
+
+import numpy as np
+
+from backend.utils.literature_ranker import _document_terms, bm25_scores, document_ids, rank_articles, score_articles
+
+YEAR = datetime.date.today().year
+
+
+def _article(pmid, title, abstract="", mesh=(), types=("Journal Article",), year=YEAR):
+    return {"pmid": pmid, "title": title, "abstract": abstract, "mesh_terms": list(mesh),
+            "publication_types": list(types), "year": str(year)}
+
+
+def test_bm25_prefers_documents_matching_more_query_terms():
+    docs = [["chest", "pain"], ["chest", "pain", "dissection"], ["fracture"]]
+    scores = bm25_scores(docs, {"chest": 1.0, "pain": 1.0, "dissection": 1.0})
+    assert scores[1] == 1.0
+    assert scores[1] > scores[0] > scores[2] == 0.0
+
+
+def test_articles_are_tokenized_once():
+    article = _article("1", "Aortic dissection", "Tearing chest pain, chest pain.", mesh=["Chest Pain"])
+    ids = document_ids(article)
+    assert document_ids(dict(article)) is ids and not ids.flags.writeable
+    query = {"chest": 1.0, "pain": 0.5, "dissection": 1.0, "fracture": 1.0}
+    other = _article("2", "Knee pain")
+    assert np.allclose(bm25_scores([ids, document_ids(other)], query),
+                       bm25_scores([_document_terms(article), _document_terms(other)], query))
+
+
+def test_relevant_article_outranks_pubmed_order():
+    pool = [
+        _article("1", "Knee osteoarthritis outcomes", "Physical therapy for knee pain."),
+        _article("2", "Aortic dissection presenting as chest pain", "Tearing chest pain radiating to the back.",
+                 mesh=["Aortic Dissection", "Chest Pain"]),
+        _article("3", "Chest pain in the emergency department", "Evaluation of chest pain."),
+    ]
+    ranked = rank_articles(pool, "tearing chest pain radiating to back",
+                           [{"name": "Aortic dissection"}], context="hypertension", top_k=2)
+    assert [a["pmid"] for a in ranked] == ["2", "3"]
+    assert ranked[0]["relevance"] >= ranked[1]["relevance"]
+    assert "_components" not in ranked[0]
+
+
+def test_evidence_level_and_recency_break_ties():
+    pool = [
+        _article("old", "Migraine treatment", year=YEAR - 30),
+        _article("case", "Migraine treatment", types=["Case Reports"]),
+        _article("meta", "Migraine treatment", types=["Meta-Analysis", "Journal Article"]),
+    ]
+    ranked = score_articles(pool, "migraine", ["migraine"])
+    assert [a["pmid"] for a in ranked] == ["meta", "case", "old"]
+    assert ranked[0]["_components"]["pubtype"] == 1.0
+
+
+def test_retracted_articles_are_dropped():
+    pool = [
+        _article("r", "Sepsis biomarkers", "Sepsis sepsis sepsis.", types=["Retracted Publication"]),
+        _article("ok", "Unrelated cardiology"),
+    ]
+    assert [a["pmid"] for a in rank_articles(pool, "sepsis", [], top_k=3)] == ["ok"]
+
+
+def test_empty_pool_and_query():
+    assert rank_articles([], "fever", []) == []
+    ranked = rank_articles([_article("1", "A"), _article("2", "B")], "", [], top_k=1)
+    assert [a["pmid"] for a in ranked] == ["1"]
@@ -0,0 +1,60 @@
+import pytest
+
+from backend.utils.pdf_generator import PDF, build_report, generate_pdf_from_analysis, get_unicode_fonts, needs_unicode
+
+REPORT = {
+    "patient_info": {"age": 58, "gender": "male", "medicalHistory": "Müller – Ελληνικά ≥ 5 mg"},
+    "symptom_analysis": {"top_differentials": [{"name": f"Differential {i}", "icd10cm_code": "I20.0"}
+                                               for i in range(3)], "risk_level": "high"},
+    "summary": {"patient_summary": "Findings suggest ACS."},
+}
+
+
+def test_core_mode_replaces_characters_outside_latin_1():
+    assert PDF("core")._safe_string("Müller – Ελ ≥ 5") == "Müller - ?? >= 5"
+    data = generate_pdf_from_analysis(REPORT, mode="core")
+    assert data.startswith(b"%PDF") and b"/FontFile2" not in data
+    assert b"/Filter /FlateDecode" in data
+
+
+def test_unicode_mode_embeds_one_subset_per_face():
+    if not get_unicode_fonts():
+        pytest.skip("no Unicode TTF font on this host")
+    data = generate_pdf_from_analysis(REPORT, mode="unicode")
+    # Regular and bold only: header and footer reuse the body's faces
+    assert data.count(b"/FontFile2") == 2
+    assert data.count(b"/Type /Page\n") == 1
+    core = generate_pdf_from_analysis(REPORT, mode="core")
+    assert len(data) < len(core) + 30000
+
+
+def test_auto_mode_embeds_a_font_only_for_non_latin_text():
+    latin = {"patient_info": {"medicalHistory": "Müller – ≥ 5 mg"}, "summary": {"patient_summary": "ACS."}}
+    assert not needs_unicode(latin) and needs_unicode(REPORT)
+    assert b"/FontFile2" not in generate_pdf_from_analysis(latin, mode="auto")
+    if get_unicode_fonts():
+        assert b"/FontFile2" in generate_pdf_from_analysis(REPORT, mode="auto")
+
+
+def test_pages_share_one_resource_dictionary():
+    pdf = build_report(PDF("core"), {"summary": {"patient_summary": "Findings suggest ACS. " * 600}})
+    data = bytes(pdf.output())
+    assert pdf.page_no() > 1
+    resources = {line for line in data.split(b"\n") if line.startswith(b"/Resources ")}
+    assert len(resources) == 1
+
+
+def test_list_items_start_at_the_left_margin():
+    pdf = PDF("core")
+    pdf.add_page()
+    pdf.set_font(pdf.report_font, '', 10)
+    for i in range(3):
+        pdf._multi_cell_safe(pdf._content_width(), 5, f"item {i}")
+        assert pdf.get_x() == pdf.l_margin
+
+
+def test_header_prints_the_given_timestamp():
+    pdf = PDF("core", generated_at="2024-05-01 09:30")
+    pdf.set_compression(False)
+    build_report(pdf, {"summary": {"patient_summary": "Findings suggest ACS."}})
+    assert b"2024-05-01 09:30" in bytes(pdf.output())
@@ -0,0 +1,84 @@
+import time
+import threading
+
+from backend.utils import profiler
+from backend.utils.profiler import RequestProfile, RollingProfiler, Sampler, StackCounter
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+def _idle(seconds):
+    time.sleep(seconds)
+
+
+def test_request_profile_samples_only_the_target_thread():
+    other = threading.Thread(target=_idle, args=(0.3,))
+    other.start()
+    profile = RequestProfile([threading.get_ident()], interval_s=0.002).start()
+    _busy(0.1)
+    profile.stop()
+    other.join()
+
+    body = profile.render()
+    assert profile.counter.samples > 5
+    assert "test_profiler:_busy" in body
+    assert "test_profiler:_idle" not in body
+    for line in body.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and stack.split(";")[0]
+
+
+def test_waiting_threads_are_marked_off_cpu():
+    waiter = threading.Thread(target=_idle, args=(0.15,))
+    waiter.start()
+    profile = RequestProfile([waiter.ident], interval_s=0.005).start()
+    waiter.join()
+    profile.stop()
+    stacks = [s for s in profile.counter.stacks if "_idle" in s]
+    assert stacks and any(s.endswith(profiler.WAIT_FRAME) for s in stacks)
+
+
+def test_rolling_profiler_keeps_on_cpu_window():
+    rolling = RollingProfiler(interval_s=0.002, window_s=60).start()
+    waiter = threading.Thread(target=_idle, args=(0.1,))
+    waiter.start()
+    _busy(0.1)
+    waiter.join()
+    rolling.stop()
+
+    counter = rolling.profile()
+    assert counter.samples > 0
+    assert any("_busy" in s for s in counter.stacks)
+    assert not any(s.endswith(profiler.WAIT_FRAME) for s in counter.stacks)
+
+
+def test_stack_counter_is_bounded():
+    counter = StackCounter(max_stacks=2)
+    for stack in ["a;b", "a;c", "a;d", "a;b"]:
+        counter.add(stack)
+    assert counter.stacks == {"a;b": 2, "a;c": 1, profiler.OTHER_STACK: 1}
+    assert counter.samples == 4
+
+
+def test_sampler_requires_record():
+    try:
+        Sampler(0.01)
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("expected TypeError")
+
+
+def test_authorized(monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILING_TOKEN", "")
+    assert not profiler.authorized("")
+    monkeypatch.setattr(profiler, "PROFILING_TOKEN", "s3cret")
+    assert profiler.authorized("s3cret")
+    assert not profiler.authorized("wrong")
+    assert not profiler.authorized(None)
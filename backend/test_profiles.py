@@ -0,0 +1,123 @@
+import os
+import tempfile
+from unittest import mock
+
+from backend.orchestrator import orchestrator, incremental
+from backend.orchestrator.checkpoints import SqliteCheckpointSaver, run_config
+from backend.orchestrator.profiles import PipelineProfile, compile_condition, get_profiles
+
+AGENTS = ["symptom_analyzer", "literature_agent", "case_matcher", "treatment_agent", "post_retrieval",
+          "summarizer_agent"]
+OUTPUT = {"symptom_analyzer": "symptom_analysis", "literature_agent": "literature", "case_matcher": "case_matcher",
+          "treatment_agent": "treatment", "post_retrieval": "literature", "summarizer_agent": "summary"}
+
+
+def _stubs(calls, risk="low", differentials=()):
+    def make(name):
+        def node(state):
+            calls.append(name)
+            if name == "symptom_analyzer":
+                state["symptom_analysis"] = {"risk_level": state.get("risk", risk),
+                                             "top_differentials": list(differentials)}
+            else:
+                state[OUTPUT[name]] = {"from": name}
+            return state
+        return node
+    return {name: make(name) for name in AGENTS}
+
+
+def test_conditions():
+    cond = compile_condition({"a.risk": {"in": ["Moderate", "high"]}, "a.items": {"empty": False}})
+    assert cond({"a": {"risk": "HIGH", "items": [1]}})
+    assert not cond({"a": {"risk": "low", "items": [1]}})
+    assert not cond({"a": {"risk": "high"}})
+    either = compile_condition([{"x": 1}, {"y": {"ne": None}}])
+    assert either({"x": 1}) and either({"y": 0}) and not either({})
+
+
+def test_invalid_profiles_are_rejected():
+    for spec in ({"steps": []}, {"steps": [{"node": "a", "when": {"x": 1}}]},
+                 {"steps": ["a", {"node": "b", "when": {"x": {"gt": 1}}}]}, {"steps": ["a", "a"]}):
+        try:
+            PipelineProfile("bad", spec)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {spec}")
+
+
+def test_builtin_profiles_load():
+    profiles = get_profiles()
+    assert {"full", "fused", "standard", "triage", "research"} <= set(profiles)
+    assert profiles["full"].nodes == orchestrator.pipeline_nodes(fused=False)
+    assert profiles["fused"].nodes == orchestrator.pipeline_nodes(fused=True)
+    assert profiles["research"].options["case_search"] == "multi"
+
+
+def test_triage_skips_agents_a_low_risk_case_does_not_need():
+    calls = []
+    with mock.patch.dict(orchestrator.NODE_FUNCTIONS, _stubs(calls, risk="low", differentials=["Viral URI"])):
+        graph = orchestrator.build_orchestrator_graph(profile="triage")
+    final = graph.invoke({"symptoms": "runny nose"})
+    assert calls == ["symptom_analyzer", "case_matcher", "summarizer_agent"]
+    assert final["pipeline"] == {"profile": "triage", "ran": calls,
+                                 "skipped": ["literature_agent", "treatment_agent"]}
+
+
+def test_failed_symptom_analysis_does_not_gate_agents():
+    spec = get_profiles()["triage"]
+    fallback = {"top_differentials": [], "risk_level": "low"}
+    assert not spec.should_run("treatment_agent", {"symptom_analysis": fallback})
+    for state in ({"symptom_analysis": {**fallback, "error": "timeout"}},
+                  {"symptom_analysis": {"raw_output": "not json"}},
+                  {"symptom_analysis": fallback, "partial_sections": ["symptom_analysis"]}):
+        assert all(spec.should_run(node, state) for node in spec.nodes)
+
+    calls = []
+    stubs = _stubs(calls)
+
+    def analyzer(state):
+        calls.append("symptom_analyzer")
+        state["symptom_analysis"] = {**fallback, "error": "LLM timed out"}
+        return state
+
+    with mock.patch.dict(orchestrator.NODE_FUNCTIONS, {**stubs, "symptom_analyzer": analyzer}):
+        graph = orchestrator.build_orchestrator_graph(profile="triage")
+    final = graph.invoke({"symptoms": "chest pain"})
+    assert calls == spec.nodes and final["pipeline"]["skipped"] == []
+
+
+def test_triage_runs_everything_for_high_risk():
+    calls = []
+    with mock.patch.dict(orchestrator.NODE_FUNCTIONS, _stubs(calls, risk="high", differentials=["ACS"])):
+        graph = orchestrator.build_orchestrator_graph(profile="triage")
+    graph.invoke({"symptoms": "chest pain"})
+    assert calls == ["symptom_analyzer", "literature_agent", "case_matcher", "treatment_agent", "summarizer_agent"]
+
+
+def test_update_follows_profile_conditions():
+    calls = []
+    stubs = _stubs(calls, differentials=["ACS"])
+    saver = SqliteCheckpointSaver(path=os.path.join(tempfile.mkdtemp(), "runs.sqlite"))
+    spec = get_profiles()["triage"]
+    with mock.patch.dict(orchestrator.NODE_FUNCTIONS, stubs):
+        graph = orchestrator.build_orchestrator_graph(profile="triage", checkpointer=saver)
+    graph.invoke({"symptoms": "chest pain", "risk": "low"}, run_config("t1"))
+    calls.clear()
+
+    # Risk rises: the previously skipped literature and treatment agents now run
+    def analyzer(state):
+        calls.append("symptom_analyzer")
+        state["symptom_analysis"] = {"risk_level": "high", "top_differentials": ["ACS"]}
+        return state
+
+    state = incremental.update_run(graph, spec.nodes, "t1", {"symptoms": "crushing chest pain"},
+                                   {**stubs, "symptom_analyzer": analyzer}, should_run=spec.should_run)
+    assert state["recomputed"] == spec.nodes
+    assert state["literature"] == {"from": "literature_agent"}
+    assert state["pipeline"]["skipped"] == []
+
+    # Back to low risk: their stale output is dropped
+    state = incremental.update_run(graph, spec.nodes, "t1", {"symptoms": "mild chest pain"},
+                                   stubs, should_run=spec.should_run)
+    assert "literature" not in state and "treatment" not in state
+    assert state["pipeline"]["skipped"] == ["literature_agent", "treatment_agent"]
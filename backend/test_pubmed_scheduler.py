@@ -0,0 +1,132 @@
+import io
+import threading
+from unittest import mock
+
+import pytest
+
+from backend.utils import metrics
+from backend.utils import http_client
+from backend.utils import pubmed_scheduler
+from backend.utils.pubmed_scheduler import PubMedScheduler
+
+
+def _efetch_xml(pmids):
+    articles = "".join(
+        f"<PubmedArticle><MedlineCitation><PMID>{p}</PMID><Article>"
+        f"<ArticleTitle>Title {p}</ArticleTitle>"
+        f"<Abstract><AbstractText>Abstract {p}</AbstractText></Abstract>"
+        f"</Article></MedlineCitation></PubmedArticle>"
+        for p in pmids
+    )
+    return f"<PubmedArticleSet>{articles}</PubmedArticleSet>".encode()
+
+
+class _FakeResponse:
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+        self.raw = io.BytesIO(content)
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+
+def test_concurrent_fetches_are_merged():
+    calls = []
+
+    def fake_get(url, params=None, timeout=None, stream=False):
+        calls.append(params["id"])
+        return _FakeResponse(_efetch_xml(params["id"].split(",")))
+
+    metrics.reset()
+    scheduler = PubMedScheduler(rate=100, batch_window=0.1)
+    results = {}
+
+    def caller(name, ids):
+        results[name] = scheduler.fetch(ids)
+
+    with mock.patch.object(http_client.requests.Session, "get", side_effect=fake_get):
+        threads = [
+            threading.Thread(target=caller, args=("a", ["1", "2"])),
+            threading.Thread(target=caller, args=("b", ["2", "3"])),
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    # One efetch for both callers, each only sees its own PMIDs
+    assert len(calls) == 1
+    assert sorted(calls[0].split(",")) == ["1", "2", "3"]
+    assert sorted(results["a"]) == ["1", "2"]
+    assert sorted(results["b"]) == ["2", "3"]
+    assert results["b"]["3"]["title"] == "Title 3"
+
+
+def test_fetch_raises_when_its_batch_is_late():
+    release = threading.Event()
+
+    def slow_get(url, params=None, timeout=None, stream=False):
+        release.wait(5)
+        return _FakeResponse(_efetch_xml(params["id"].split(",")))
+
+    scheduler = PubMedScheduler(rate=100, batch_window=0)
+    with mock.patch.object(http_client.requests.Session, "get", side_effect=slow_get):
+        try:
+            with pytest.raises(pubmed_scheduler.FetchTimeout):
+                scheduler.fetch(["1"], timeout=0.1)
+        finally:
+            release.set()
+
+
+def test_token_bucket_paces_requests():
+    bucket = pubmed_scheduler.TokenBucket(rate=20, capacity=1)
+    bucket.acquire()
+    waited = bucket.acquire()
+    assert waited > 0.02
+
+
+STRUCTURED_ARTICLE = b"""<?xml version="1.0" ?>
+<!DOCTYPE PubmedArticleSet PUBLIC "-//NLM//DTD PubMedArticle, 1st January 2024//EN" "https://dtd.nlm.nih.gov/ncbi/pubmed/out/pubmed_240101.dtd">
+<PubmedArticleSet>
+<PubmedArticle><MedlineCitation><PMID Version="1">38000001</PMID><Article>
+<Journal><JournalIssue><PubDate><Year>2023</Year><Month>Nov</Month></PubDate></JournalIssue></Journal>
+<ArticleTitle>Early <i>invasive</i> strategy in NSTEMI</ArticleTitle>
+<Abstract>
+<AbstractText Label="BACKGROUND" NlmCategory="BACKGROUND">Timing is debated.</AbstractText>
+<AbstractText Label="RESULTS" NlmCategory="RESULTS">Mortality fell &lt;5%.</AbstractText>
+</Abstract>
+<PublicationTypeList><PublicationType UI="D016449">Randomized Controlled Trial</PublicationType></PublicationTypeList>
+</Article>
+<MeshHeadingList><MeshHeading><DescriptorName UI="D000072657">Non-ST Elevated Myocardial Infarction</DescriptorName></MeshHeading></MeshHeadingList>
+<CommentsCorrectionsList><CommentsCorrections><PMID Version="1">1</PMID></CommentsCorrections></CommentsCorrectionsList>
+</MedlineCitation></PubmedArticle>
+<PubmedArticle><MedlineCitation><PMID Version="1">38000002</PMID><Article>
+<Journal><JournalIssue><PubDate><MedlineDate>2019 Jan-Feb</MedlineDate></PubDate></JournalIssue></Journal>
+<ArticleTitle>No abstract here</ArticleTitle>
+</Article></MedlineCitation></PubmedArticle>
+</PubmedArticleSet>"""
+
+
+def test_streaming_parser_extracts_structured_fields():
+    first, second = pubmed_scheduler.iter_efetch_articles(io.BytesIO(STRUCTURED_ARTICLE))
+    assert first["pmid"] == "38000001"
+    assert first["title"] == "Early invasive strategy in NSTEMI"
+    assert first["abstract"] == "BACKGROUND: Timing is debated. RESULTS: Mortality fell <5%."
+    assert [s["label"] for s in first["abstract_sections"]] == ["BACKGROUND", "RESULTS"]
+    assert first["mesh_terms"] == ["Non-ST Elevated Myocardial Infarction"]
+    assert first["publication_types"] == ["Randomized Controlled Trial"]
+    assert first["year"] == 2023
+    assert second["year"] == 2019 and second["abstract"] == "" and second["abstract_sections"] == []
+
+
+if __name__ == "__main__":
+    test_concurrent_fetches_are_merged()
+    test_token_bucket_paces_requests()
+    test_streaming_parser_extracts_structured_fields()
+    print("✅ PubMed scheduler tests passed")
+    print(metrics.render_prometheus())
@@ -0,0 +1,51 @@
+from backend.utils.query_canon import (
+    age_group, bioportal_query, canonical_terms, concepts, normalize, pubmed_query, rxnorm_query,
+)
+
+
+def test_normalize_and_synonym_folding():
+    assert normalize("  Café—Chest  PAIN!! ") == "cafe chest pain"
+    assert concepts("Pt c/o SOB and CP for 2 days") == ["dyspnea", "chest pain"]
+    # Longest variant wins
+    assert concepts("congestive heart failure, HF") == ["heart failure", "hf"]
+    assert concepts("atorvastatin 20 mg daily, Lipitor") == ["atorvastatin"]
+
+
+def test_terms_are_sorted_and_deduplicated():
+    assert canonical_terms("shortness of breath, chest pain") == canonical_terms("CP with dyspnoea")
+    assert canonical_terms("a b c d e f g h", limit=3) == ["b", "d e f", "h"]
+
+
+def test_unlisted_phrases_stay_whole_and_specific_terms_survive_the_cut():
+    assert concepts("weight loss and night sweats for 3 weeks") == ["weight loss", "night sweats"]
+    assert concepts("puking, gut pain") == ["puking", "gut pain"]
+    # Longer runs are split into words
+    assert concepts("pain in left lower back radiating") == ["pain", "left", "lower", "back", "radiating"]
+    # Diagnosis first, then listed concepts; unlisted words are cut before them
+    assert canonical_terms("tuberculosis", "tired, weird feeling, odd taste, poor sleep, itchy skin, SOB, fever",
+                           limit=4) == ["dyspnea", "fatigue", "fever", "tuberculosis"]
+    assert pubmed_query({"symptoms": "weight loss, fever", "age": 30}) == 'fever AND "weight loss" AND adult'
+
+
+def test_age_buckets():
+    assert [age_group(a) for a in ("6 months", 4, "10", "16", "30", 58, "70", "91", "")] == [
+        "infant", "child preschool", "child", "adolescent", "adult", "middle aged", "aged",
+        "aged 80 and over", "",
+    ]
+
+
+def test_paraphrases_share_queries():
+    a = {"symptoms": "Chest pain and shortness of breath", "age": 58, "gender": "Male",
+         "medicalHistory": "HTN", "currentMedications": "atorvastatin 20 mg"}
+    b = {"symptoms": "SOB, CP for 2 days", "age": "61", "gender": "M",
+         "medicalHistory": "high blood pressure", "currentMedications": "Lipitor"}
+    assert pubmed_query(a) == pubmed_query(b) == "chest pain AND dyspnea AND male AND middle aged"
+    assert bioportal_query(a) == bioportal_query(b) == "chest pain dyspnea"
+    assert rxnorm_query({"diagnosis": "Heart attack"}) == "myocardial infarction"
+
+
+def test_raw_mode_keeps_previous_queries():
+    state = {"symptoms": "cough", "age": 40, "gender": "female"}
+    assert pubmed_query(state, canonical=False) == "cough AND female AND age 40"
+    assert bioportal_query(state, canonical=False) == "cough female age 40"
+    assert rxnorm_query(state, canonical=False) == "cough"
@@ -0,0 +1,159 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from backend.utils import metrics
+from backend.utils import resilience
+from backend.utils.http_client import http_get
+from backend.utils.resilience import CircuitOpenError, get_breaker
+
+# Fault-injecting local stub standing in for PubMed/BioPortal/RxNorm
+STUB = {"fail": False, "status": None, "stall_next": 0, "stall_s": 2.0, "hits": 0}
+_stub_lock = threading.Lock()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with _stub_lock:
+            STUB["hits"] += 1
+            stall = STUB["stall_next"] > 0
+            if stall:
+                STUB["stall_next"] -= 1
+        if stall:
+            time.sleep(STUB["stall_s"])
+        status = STUB["status"] or (500 if STUB["fail"] else 200)
+        body = b'{"ok": true}'
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client timed out and hung up
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def test_breaker_fails_fast_then_recovers():
+    server, url = _start_stub()
+    try:
+        resilience.reset_breakers()
+        breaker = get_breaker("stub-breaker")
+        breaker.failure_threshold, breaker.reset_timeout = 3, 0.3
+        STUB.update(fail=True, stall_next=0, hits=0)
+
+        for _ in range(3):
+            try:
+                http_get("stub-breaker", url, timeout=2)
+            except CircuitOpenError:
+                raise AssertionError("breaker opened too early")
+            except Exception:
+                pass
+        assert breaker.state == resilience.OPEN
+
+        # Open: fails fast without touching the backend
+        hits = STUB["hits"]
+        start = time.monotonic()
+        try:
+            http_get("stub-breaker", url, timeout=2)
+            raise AssertionError("expected CircuitOpenError")
+        except CircuitOpenError:
+            pass
+        assert time.monotonic() - start < 0.05
+        assert STUB["hits"] == hits
+
+        # After the reset timeout a probe goes through and closes the breaker
+        STUB["fail"] = False
+        time.sleep(0.35)
+        resp = http_get("stub-breaker", url, timeout=2)
+        assert resp.status_code == 200
+        assert breaker.state == resilience.CLOSED
+    finally:
+        server.shutdown()
+
+
+def test_hedge_rescues_stalled_request():
+    server, url = _start_stub()
+    try:
+        resilience.reset_breakers()
+        # Prime a fast p95 so the hedge fires quickly
+        for _ in range(25):
+            metrics.observe("external_request_seconds", 0.02, backend="stub-hedge")
+        STUB.update(fail=False, stall_next=1, stall_s=2.0, hits=0)
+
+        start = time.monotonic()
+        resp = http_get("stub-hedge", url, timeout=5)
+        elapsed = time.monotonic() - start
+
+        assert resp.status_code == 200
+        assert elapsed < 1.0, f"hedge did not cut the stall ({elapsed:.2f}s)"
+        assert STUB["hits"] == 2
+    finally:
+        server.shutdown()
+
+
+def test_rate_limited_responses_open_the_breaker():
+    server, url = _start_stub()
+    try:
+        resilience.reset_breakers()
+        breaker = get_breaker("stub-429")
+        breaker.failure_threshold = 2
+        STUB.update(fail=False, status=429, stall_next=0, hits=0)
+        for _ in range(2):
+            try:
+                http_get("stub-429", url, timeout=2)
+                raise AssertionError("expected HTTPError")
+            except requests.HTTPError as e:
+                assert e.response.status_code == 429
+        assert breaker.state == resilience.OPEN
+    finally:
+        STUB["status"] = None
+        server.shutdown()
+
+
+def test_failures_and_timeouts_are_latency_samples():
+    server, url = _start_stub()
+    try:
+        resilience.reset_breakers()
+        STUB.update(fail=True, stall_next=0, hits=0)
+        try:
+            http_get("stub-latency", url, timeout=2)
+        except requests.HTTPError:
+            pass
+        assert metrics.count("external_request_seconds", backend="stub-latency") == 1
+
+        STUB.update(fail=False, stall_next=1, stall_s=0.5)
+        try:
+            http_get("stub-latency", url, timeout=0.2)
+            raise AssertionError("expected Timeout")
+        except requests.Timeout:
+            pass
+        # The timed-out attempt reports its latency when it gives up
+        for _ in range(50):
+            if metrics.count("external_request_seconds", backend="stub-latency") == 2:
+                break
+            time.sleep(0.02)
+        assert metrics.count("external_request_seconds", backend="stub-latency") == 2
+        assert metrics.quantile("external_request_seconds", 1.0, backend="stub-latency") >= 0.2
+    finally:
+        STUB["stall_next"] = 0
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_breaker_fails_fast_then_recovers()
+    test_hedge_rescues_stalled_request()
+    test_rate_limited_responses_open_the_breaker()
+    test_failures_and_timeouts_are_latency_samples()
+    print("✅ Resilience tests passed")
+    print(metrics.render_prometheus())
@@ -0,0 +1,60 @@
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+
+from backend.utils import response_codec
+from backend.utils.response_codec import compact, encode, select_fields
+
+STATE = {
+    "symptoms": "cough",
+    "age": 50,
+    "options": {"case_ranker": "local"},
+    "literature": {"query": "cough", "articles": {"summaries": [{"pmid": "1"}]},
+                   "patient_context": {"age": 50}, "disclaimer": "not advice"},
+    "summary": {"text": "x" * 4000},
+    "summary_disclaimer": "not advice",
+}
+
+
+def test_select_fields_with_dotted_paths():
+    out = select_fields(STATE, ["summary", "literature.articles", "missing.key"])
+    assert out == {"summary": STATE["summary"], "literature": {"articles": STATE["literature"]["articles"]}}
+
+
+def test_compact_drops_input_and_boilerplate():
+    out = compact(STATE)
+    assert set(out) == {"literature", "summary"}
+    assert "patient_context" not in out["literature"] and "disclaimer" not in out["literature"]
+
+
+def test_gzip_negotiation_and_small_bodies():
+    body, headers = encode(STATE, accept_encoding="br;q=1.0, gzip;q=0.8")
+    assert headers["Content-Encoding"] == "gzip"
+    assert orjson.loads(gzip.decompress(body)) == STATE
+
+    body, headers = encode({"summary": "short"}, accept_encoding="gzip")
+    assert "Content-Encoding" not in headers and orjson.loads(body) == {"summary": "short"}
+
+    body, headers = encode(STATE, accept_encoding="gzip;q=0")
+    assert "Content-Encoding" not in headers
+
+
+def test_zstd_preferred_when_available():
+    if response_codec.zstandard is None:
+        body, headers = encode(STATE, accept_encoding="zstd, gzip")
+        assert headers["Content-Encoding"] == "gzip"
+        return
+    body, headers = encode(STATE, accept_encoding="zstd, gzip")
+    assert headers["Content-Encoding"] == "zstd"
+    assert orjson.loads(response_codec.zstandard.ZstdDecompressor().decompress(body)) == STATE
+
+
+def test_concurrent_zstd_encodes_are_intact():
+    if response_codec.zstandard is None:
+        return
+    states = [{**STATE, "request": i, "padding": "x" * (i * 97)} for i in range(64)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        bodies = list(pool.map(lambda s: encode(s, accept_encoding="zstd")[0], states))
+    decompressor = response_codec.zstandard.ZstdDecompressor()
+    assert [orjson.loads(decompressor.decompress(b)) for b in bodies] == states
@@ -0,0 +1,77 @@
+import os
+import stat
+import time
+import tempfile
+import multiprocessing
+from unittest import mock
+
+from backend.utils import private_files
+from backend.utils.private_files import private_path
+from backend.utils.shared_cache import SharedCache, make_key
+
+
+def _tmp_cache(max_bytes=1024 * 1024):
+    path = os.path.join(tempfile.mkdtemp(), "cache.sqlite")
+    return SharedCache(path=path, max_bytes=max_bytes)
+
+
+def _writer(path):
+    SharedCache(path=path).set_json("pubmed", "k", {"from": os.getpid()}, ttl=60)
+
+
+def test_roundtrip_and_ttl():
+    cache = _tmp_cache()
+    cache.set_json("rxnorm", "a", [{"rxcui": "1"}], ttl=60)
+    assert cache.get_json("rxnorm", "a") == [{"rxcui": "1"}]
+    cache.set("llm", "b", b"reply", ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get("llm", "b") is None
+
+
+def test_lru_eviction_respects_budget():
+    cache = _tmp_cache(max_bytes=10_000)
+    for i in range(40):
+        cache.set("pdf", f"doc{i}", b"x" * 1000, ttl=60)
+    stats = cache.stats()
+    assert stats["bytes"] <= 10_000
+    # Most recent entries survive, oldest are gone
+    assert cache.get("pdf", "doc39") is not None
+    assert cache.get("pdf", "doc0") is None
+
+
+def test_visible_across_processes():
+    cache = _tmp_cache()
+    proc = multiprocessing.get_context("spawn").Process(target=_writer, args=(cache.path,))
+    proc.start()
+    proc.join()
+    assert cache.get_json("pubmed", "k")["from"] == proc.pid
+
+
+def test_files_are_private_to_the_user():
+    base = tempfile.mkdtemp()
+    os.chmod(base, 0o777)
+    cache = SharedCache(path=private_path(base, "cache.sqlite"))
+    old = os.umask(0o022)
+    try:
+        # The umask is process-wide: other threads' files must not be affected by the cache
+        with mock.patch.object(private_files.os, "umask", side_effect=AssertionError("umask changed")):
+            cache.set("llm", "k", b"reply", ttl=60)
+    finally:
+        os.umask(old)
+    assert stat.S_IMODE(os.stat(os.path.dirname(cache.path)).st_mode) == 0o700
+    for suffix in ("", "-wal", "-shm"):
+        assert stat.S_IMODE(os.stat(cache.path + suffix).st_mode) == 0o600
+
+
+def test_make_key_is_order_independent_for_dicts():
+    assert make_key({"a": 1, "b": 2}) == make_key({"b": 2, "a": 1})
+    assert make_key("q", 3) != make_key("q", 5)
+
+
+if __name__ == "__main__":
+    test_roundtrip_and_ttl()
+    test_lru_eviction_respects_budget()
+    test_visible_across_processes()
+    test_files_are_private_to_the_user()
+    test_make_key_is_order_independent_for_dicts()
+    print("✅ Shared cache tests passed")
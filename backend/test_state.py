@@ -0,0 +1,67 @@
+from backend.orchestrator import state as typed_state
+from backend.orchestrator.state import MISSING, AnalysisState, Differential, Treatment
+
+
+def _state():
+    context = {"age": 58, "gender": "male", "medical_history": "hypertension",
+               "current_medications": "warfarin"}
+    return {
+        "symptoms": "chest pain", "age": 58, "gender": "male", "medicalHistory": "hypertension",
+        "currentMedications": "warfarin", "urgency": None,
+        "options": {"profile": "full", "fused": False},
+        "deadline": 1700000000.0,
+        "symptom_analysis": {
+            "top_differentials": [{"name": "Unstable angina", "rationale": "r", "icd10cm_code": "I20.0",
+                                   "confidence": 0.7}],
+            "risk_level": "high", "disclaimer": "d",
+        },
+        "literature": {"query": "chest pain AND male", "articles": {"summaries": [
+            {"pmid": "1", "title": "t", "summary": "s"}]}, "patient_context": dict(context), "disclaimer": "d"},
+        "case_matcher": {"query": "chest pain", "matched_cases": [
+            {"icd_code": "I20.0", "name": "Unstable angina", "description": "", "match_score": 0.9,
+             "sources": ["ICD10CM", "SNOMEDCT"]}],
+            # Stringified age: inconsistent with the other copies, so kept as is
+            "patient_context": {"age": "58", "gender": "male", "medical_history": "hypertension"},
+            "disclaimer": "d"},
+        "treatment": {"query": "chest pain", "treatments": [
+            {"name": "Aspirin", "class": "antiplatelet", "type": "drug", "rationale": "r", "source": "RxNorm",
+             "interactions": [{"drug": "aspirin", "interacts_with": "warfarin", "severity": "major"}]},
+        ], "patient_context": dict(context), "disclaimer": "d"},
+        "summary": {"patient_summary": "p"},
+        "summary_disclaimer": "d",
+        "partial_sections": [],
+        "pipeline": {"profile": "full", "ran": ["symptom_analyzer"], "skipped": []},
+    }
+
+
+def test_dict_round_trip_is_lossless():
+    state = _state()
+    typed = AnalysisState.from_dict(state)
+    assert isinstance(typed.symptom_analysis.top_differentials[0], Differential)
+    assert isinstance(typed.treatment.treatments[0], Treatment)
+    assert typed.treatment.treatments[0].drug_class == "antiplatelet"
+    assert typed.symptom_analysis.top_differentials[0].extra == {"confidence": 0.7}
+    assert typed.to_dict() == state
+
+
+def test_patient_context_is_stored_once():
+    typed = AnalysisState.from_dict(_state())
+    assert typed.patient.current_medications == "warfarin"
+    assert typed.literature.patient_context is typed.treatment.patient_context
+    assert isinstance(typed.case_matcher.patient_context, dict)
+
+
+def test_missing_keys_stay_missing():
+    typed = AnalysisState.from_dict({"symptoms": "cough", "age": None, "literature": {"articles": []}})
+    assert typed.age is None and typed.gender is MISSING
+    assert typed.to_dict() == {"symptoms": "cough", "age": None, "literature": {"articles": []}}
+
+
+def test_msgpack_round_trip():
+    state = _state()
+    data = typed_state.pack(state)
+    assert typed_state.unpack(data) == state
+    assert typed_state.unpack(typed_state.pack({})) == {}
+    # Shaped responses (field selection) round-trip as well
+    partial = {"summary": {"patient_summary": "p"}, "run_id": "abc"}
+    assert typed_state.unpack(typed_state.pack(partial)) == partial
@@ -0,0 +1,197 @@
+import os
+import math
+import time
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from backend.utils import metrics
+
+# -------------------------------
+# Admission control
+# -------------------------------
+# Caps concurrent analyses per server worker. When all slots are busy, callers
+# wait in a per-client FIFO and freed slots are handed out round-robin across
+# clients, so one client flooding the API cannot starve the others. Callers
+# whose queue is full, or who wait longer than ADMISSION_MAX_WAIT_S, are
+# rejected so the API can answer 429 with a Retry-After estimate. The API
+# waits with `acquire_async` on the event loop, so queued requests do not hold
+# threadpool threads; only admitted ones run in a thread.
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "8"))  # 0 disables admission control
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_MAX_QUEUE_PER_CLIENT = int(os.getenv("ADMISSION_MAX_QUEUE_PER_CLIENT", "4"))
+ADMISSION_MAX_WAIT_S = float(os.getenv("ADMISSION_MAX_WAIT_S", "5"))
+
+# Initial guess for how long an analysis holds its slot (refined by an EWMA)
+_INITIAL_SERVICE_S = 10.0
+_EWMA_ALPHA = 0.2
+
+
+def client_key(authorization: Optional[str], host: Optional[str]) -> str:
+    """Fairness key: a digest of the bearer token, else the client address."""
+    if authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+        if token:
+            return "token:" + hashlib.blake2b(token.encode("utf-8"), digest_size=8).hexdigest()
+    return f"ip:{host or 'unknown'}"
+
+
+class Ticket:
+    __slots__ = ("client", "admitted", "reason", "enqueued", "started", "_wake")
+
+    def __init__(self, client: str, wake: Callable[[], None]):
+        self.client = client
+        self.admitted = False
+        self.reason = None
+        self.enqueued = time.monotonic()
+        self.started = None
+        # Called (with the controller lock held) when a release admits this waiter
+        self._wake = wake
+
+
+class AdmissionController:
+    def __init__(self, max_inflight: int = ADMISSION_MAX_INFLIGHT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 max_queue_per_client: int = ADMISSION_MAX_QUEUE_PER_CLIENT, max_wait_s: float = ADMISSION_MAX_WAIT_S):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.max_wait_s = max_wait_s
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._queued = 0
+        self._queues: Dict[str, deque] = {}
+        self._rotation = deque()  # clients with waiters, in round-robin order
+        self._service_s = _INITIAL_SERVICE_S
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_inflight > 0
+
+    def acquire(self, client: str) -> Ticket:
+        """Admit now, wait for a fair turn, or reject (check `ticket.admitted`)."""
+        event = threading.Event()
+        ticket = Ticket(client, event.set)
+        if self._enqueue(ticket):
+            event.wait(self.max_wait_s)
+            self._expire(ticket)
+        return self._finish(ticket)
+
+    async def acquire_async(self, client: str) -> Ticket:
+        """`acquire` for the event loop: waits without blocking a thread."""
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(True))
+
+        ticket = Ticket(client, wake)
+        if self._enqueue(ticket):
+            try:
+                await asyncio.wait({admitted}, timeout=self.max_wait_s)
+            except asyncio.CancelledError:
+                # Client went away: give up the place in line (or the slot just granted)
+                self._expire(ticket)
+                self.release(ticket)
+                raise
+            self._expire(ticket)
+        return self._finish(ticket)
+
+    def _enqueue(self, ticket: Ticket) -> bool:
+        """Admit or reject right away (False), or queue the ticket to wait for a turn (True)."""
+        if not self.enabled:
+            ticket.admitted = True
+            return False
+        client = ticket.client
+        with self._lock:
+            if self._inflight < self.max_inflight and not self._queued:
+                self._grant(ticket)
+            elif self._queued >= self.max_queue:
+                ticket.reason = "queue_full"
+            elif len(self._queues.get(client, ())) >= self.max_queue_per_client:
+                ticket.reason = "client_queue_full"
+            else:
+                if client not in self._queues:
+                    self._queues[client] = deque()
+                    self._rotation.append(client)
+                self._queues[client].append(ticket)
+                self._queued += 1
+                self._update_gauges()
+                return True
+        return False
+
+    def _expire(self, ticket: Ticket):
+        with self._lock:
+            if not ticket.admitted:
+                self._dequeue(ticket)
+                ticket.reason = "timeout"
+
+    def release(self, ticket: Ticket):
+        if not self.enabled or not ticket.admitted:
+            return
+        with self._lock:
+            held = time.monotonic() - ticket.started
+            self._service_s += _EWMA_ALPHA * (held - self._service_s)
+            self._inflight -= 1
+            while self._inflight < self.max_inflight and self._rotation:
+                client = self._rotation.popleft()
+                queue = self._queues[client]
+                waiter = queue.popleft()
+                self._queued -= 1
+                if queue:
+                    self._rotation.append(client)
+                else:
+                    del self._queues[client]
+                self._grant(waiter)
+                waiter._wake()
+            self._update_gauges()
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: service time × queued work per slot."""
+        with self._lock:
+            backlog = (self._queued + 1) / max(1, self.max_inflight)
+            return max(1, min(60, math.ceil(self._service_s * backlog)))
+
+    def _grant(self, ticket: Ticket):
+        # Called with the lock held
+        ticket.admitted = True
+        ticket.started = time.monotonic()
+        self._inflight += 1
+        self._update_gauges()
+
+    def _dequeue(self, ticket: Ticket):
+        # Called with the lock held
+        queue = self._queues.get(ticket.client)
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        self._queued -= 1
+        if not queue:
+            del self._queues[ticket.client]
+            self._rotation.remove(ticket.client)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        metrics.set_gauge("admission_inflight", self._inflight)
+        metrics.set_gauge("admission_queued", self._queued)
+
+    def _finish(self, ticket: Ticket) -> Ticket:
+        if ticket.admitted:
+            metrics.observe("admission_wait_seconds", ticket.started - ticket.enqueued)
+        else:
+            metrics.inc("admission_rejections", reason=ticket.reason)
+        return ticket
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
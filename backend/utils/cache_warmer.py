@@ -0,0 +1,406 @@
+import os
+import time
+import uuid
+import sqlite3
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import orjson
+
+from backend.utils import metrics
+from backend.utils.cassette import anonymize
+from backend.utils.deadline import PARTIAL_KEY
+from backend.utils.openai_client import metered_tokens
+from backend.utils.private_files import connect_private, private_path
+from backend.utils.query_canon import bioportal_query, pubmed_query, rxnorm_query
+from backend.utils.shared_cache import EXTERNAL_CACHE_TTL_S, LLM_CACHE_TTL_S, make_key, refreshing
+
+# -------------------------------
+# Background cache warmer
+# -------------------------------
+# /analyze and /jobs record each case in a host-wide history (SQLite, shared by
+# the workers): the anonymized input, keyed by its normalized form – the
+# canonical PubMed / BioPortal / RxNorm queries and the pipeline profile – with
+# an exponentially decaying count. When traffic is low (CACHE_WARMER_HOURS,
+# CACHE_WARMER_IDLE_RPM) one worker replays the hottest cases through the
+# pipeline at CACHE_WARMER_RATE_PER_MIN, within CACHE_WARMER_TOKENS_PER_DAY of
+# LLM tokens. Replays run under `shared_cache.refreshing`, so only entries that
+# expire within CACHE_WARMER_REFRESH_AHEAD_S are fetched again: hot cases find
+# PubMed, BioPortal, RxNorm and LLM entries warm instead of hitting a cold path.
+# LLM entries are keyed on the exact input, so the most frequent exact input
+# of each normalized case is the one replayed – so inputs that anonymization
+# changes (ages over 89, phone numbers, IDs) are counted as traffic but never
+# stored: their replay would fill cache keys no real request looks up. A case
+# counts as warm only after a clean run (no exception, no partial sections);
+# failed cases are retried after CACHE_WARMER_RETRY_S, doubling per failure.
+# The history holds patient inputs: it is created 0600 in a per-user 0700
+# directory.
+CACHE_WARMER_ENABLED = os.getenv("CACHE_WARMER_ENABLED", "0").lower() in ("1", "true", "yes")
+CACHE_HISTORY_PATH = os.getenv("CACHE_HISTORY_PATH", private_path(tempfile.gettempdir(), "case_history.sqlite"))
+CACHE_HISTORY_HALF_LIFE_H = float(os.getenv("CACHE_HISTORY_HALF_LIFE_H", "72"))
+CACHE_HISTORY_MAX_INPUTS = int(os.getenv("CACHE_HISTORY_MAX_INPUTS", "5000"))
+CACHE_WARMER_TOP_N = int(os.getenv("CACHE_WARMER_TOP_N", "300"))
+# Local hours "start-end" (e.g. "1-6", or "22-5" across midnight); empty = any hour
+CACHE_WARMER_HOURS = os.getenv("CACHE_WARMER_HOURS", "")
+# Off-peak only while the host saw at most this many requests in the last minute
+CACHE_WARMER_IDLE_RPM = int(os.getenv("CACHE_WARMER_IDLE_RPM", "10"))
+CACHE_WARMER_RATE_PER_MIN = float(os.getenv("CACHE_WARMER_RATE_PER_MIN", "6"))
+# LLM tokens the warmer may spend per day, host-wide (0 = no limit)
+CACHE_WARMER_TOKENS_PER_DAY = int(os.getenv("CACHE_WARMER_TOKENS_PER_DAY", "200000"))
+CACHE_WARMER_REFRESH_AHEAD_S = float(os.getenv("CACHE_WARMER_REFRESH_AHEAD_S", "21600"))
+CACHE_WARMER_RETRY_S = float(os.getenv("CACHE_WARMER_RETRY_S", "900"))
+
+# Input fields that shape the pipeline's queries and prompts
+CASE_FIELDS = ("symptoms", "age", "gender", "medicalHistory", "currentMedications", "urgency")
+CASE_OPTIONS = ("profile", "case_ranker")
+
+# The worker holding the lease warms; it is renewed every tick
+_LEASE_S = 120.0
+_TRAFFIC_KEEP_S = 86400
+_SPEND_KEEP_DAYS = 7
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inputs (
+    input_key TEXT PRIMARY KEY,
+    case_key TEXT NOT NULL,
+    label TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    score REAL NOT NULL,
+    seen INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    warmed REAL NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    retry_at REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS inputs_case ON inputs (case_key);
+CREATE TABLE IF NOT EXISTS traffic (minute INTEGER PRIMARY KEY, requests INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS spend (day TEXT PRIMARY KEY, tokens INTEGER NOT NULL, cases INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS lease (id INTEGER PRIMARY KEY CHECK (id = 0), holder TEXT, expires REAL NOT NULL);
+INSERT OR IGNORE INTO lease (id, holder, expires) VALUES (0, NULL, 0);
+"""
+# Columns added since the first schema: (name, definition)
+_ADDED_COLUMNS = [("failures", "INTEGER NOT NULL DEFAULT 0"), ("retry_at", "REAL NOT NULL DEFAULT 0")]
+
+
+def _case_fields(state: Dict[str, Any], profile: Optional[str] = None) -> Dict[str, Any]:
+    payload = {k: state.get(k) for k in CASE_FIELDS if state.get(k) not in (None, "")}
+    options = {k: v for k, v in (state.get("options") or {}).items() if k in CASE_OPTIONS and v}
+    if profile:
+        options["profile"] = profile
+    if options:
+        payload["options"] = options
+    return payload
+
+
+def case_input(state: Dict[str, Any], profile: Optional[str] = None) -> Dict[str, Any]:
+    """The anonymized request fields that determine a case's cache entries."""
+    return anonymize(_case_fields(state, profile))
+
+
+def replayable_input(state: Dict[str, Any], profile: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """`case_input`, or None when anonymizing changed it (its replay would miss the real cache keys)."""
+    payload = _case_fields(state, profile)
+    anonymized = anonymize(payload)
+    return anonymized if anonymized == payload else None
+
+
+def case_key(payload: Dict[str, Any]) -> str:
+    """Normalized case: paraphrases with the same canonical queries and profile share it."""
+    profile = (payload.get("options") or {}).get("profile")
+    return make_key(pubmed_query(payload), bioportal_query(payload), rxnorm_query(payload), profile)
+
+
+def parse_hours(spec: str) -> Optional[tuple]:
+    if not spec.strip():
+        return None
+    start, _, end = spec.partition("-")
+    return int(start) % 24, int(end or start) % 24
+
+
+def in_hours(hour: int, hours: Optional[tuple]) -> bool:
+    if hours is None:
+        return True
+    start, end = hours
+    if start == end:
+        return True
+    return start <= hour < end if start < end else hour >= start or hour < end
+
+
+class CaseHistory:
+    def __init__(self, path: str = CACHE_HISTORY_PATH, half_life_s: float = CACHE_HISTORY_HALF_LIFE_H * 3600,
+                 max_inputs: int = CACHE_HISTORY_MAX_INPUTS):
+        self.path = path
+        self.half_life_s = half_life_s
+        self.max_inputs = max_inputs
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread and per process (forked workers reconnect)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = connect_private(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(inputs)")}
+            for name, definition in _ADDED_COLUMNS:
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE inputs ADD COLUMN {name} {definition}")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _decayed(self, score: float, updated: float, now: float) -> float:
+        return score * 0.5 ** (max(0.0, now - updated) / self.half_life_s)
+
+    # ---- recording ----
+    def record(self, payload: Optional[Dict[str, Any]], now: float = None):
+        """Count a request; `payload` None counts only the traffic (the input is not replayable)."""
+        now = time.time() if now is None else now
+        input_key = make_key(payload) if payload is not None else None
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT score, updated FROM inputs WHERE input_key = ?", (input_key,)).fetchone()
+                if payload is None:
+                    metrics.inc("cache_history_skipped", reason="anonymized")
+                elif row is None:
+                    conn.execute(
+                        "INSERT INTO inputs (input_key, case_key, label, payload, score, seen, updated) "
+                        "VALUES (?, ?, ?, ?, 1, 1, ?)",
+                        (input_key, case_key(payload), pubmed_query(payload), orjson.dumps(payload), now),
+                    )
+                else:
+                    conn.execute("UPDATE inputs SET score = ?, seen = seen + 1, updated = ? WHERE input_key = ?",
+                                 (self._decayed(row[0], row[1], now) + 1, now, input_key))
+                conn.execute("INSERT INTO traffic (minute, requests) VALUES (?, 1) "
+                             "ON CONFLICT (minute) DO UPDATE SET requests = requests + 1", (int(now // 60),))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, OSError) as e:
+            print(f"❌ Case history write error: {e}")
+
+    # ---- ranking ----
+    def hot_cases(self, limit: int = CACHE_WARMER_TOP_N, now: float = None) -> List[Dict[str, Any]]:
+        """Normalized cases by decayed frequency, each with its most frequent exact input."""
+        now = time.time() if now is None else now
+        rows = self._conn().execute(
+            "SELECT input_key, case_key, label, payload, score, seen, updated, warmed, tokens, failures, retry_at "
+            "FROM inputs").fetchall()
+        cases: Dict[str, Dict[str, Any]] = {}
+        for input_key, key, label, payload, score, seen, updated, warmed, tokens, failures, retry_at in rows:
+            score = self._decayed(score, updated, now)
+            case = cases.setdefault(key, {"case_key": key, "label": label, "score": 0.0, "seen": 0, "_best": -1.0})
+            case["score"] += score
+            case["seen"] += seen
+            if score > case["_best"]:
+                case.update(_best=score, input_key=input_key, payload=payload, warmed=warmed, tokens=tokens,
+                            failures=failures, retry_at=retry_at)
+        ranked = sorted(cases.values(), key=lambda c: -c["score"])[:limit]
+        for case in ranked:
+            del case["_best"]
+            case["payload"] = orjson.loads(case["payload"])
+        return ranked
+
+    def requests_last_minute(self, now: float = None) -> int:
+        now = time.time() if now is None else now
+        row = self._conn().execute("SELECT COALESCE(SUM(requests), 0) FROM traffic WHERE minute >= ?",
+                                   (int(now // 60) - 1,)).fetchone()
+        return int(row[0])
+
+    # ---- warming state ----
+    def mark_warmed(self, input_key: str, tokens: int, now: float = None):
+        now = time.time() if now is None else now
+        conn = self._conn()
+        conn.execute("UPDATE inputs SET warmed = ?, tokens = ?, failures = 0, retry_at = 0 WHERE input_key = ?",
+                     (now, tokens, input_key))
+        self._charge(tokens)
+
+    def mark_failed(self, input_key: str, tokens: int, retry_s: float, now: float = None):
+        """A failed warm run: not warm, retried after `retry_s` doubled per consecutive failure.
+
+        The tokens were spent all the same, so they count against the day's budget.
+        """
+        now = time.time() if now is None else now
+        conn = self._conn()
+        conn.execute("UPDATE inputs SET failures = failures + 1, retry_at = ? * (1 << MIN(failures, 10)) + ? "
+                     "WHERE input_key = ?", (retry_s, now, input_key))
+        self._charge(tokens)
+
+    def _charge(self, tokens: int):
+        self._conn().execute("INSERT INTO spend (day, tokens, cases) VALUES (?, ?, 1) ON CONFLICT (day) DO UPDATE "
+                             "SET tokens = tokens + excluded.tokens, cases = cases + 1",
+                             (time.strftime("%Y-%m-%d"), tokens))
+
+    def spent_today(self) -> int:
+        row = self._conn().execute("SELECT tokens FROM spend WHERE day = ?", (time.strftime("%Y-%m-%d"),)).fetchone()
+        return row[0] if row else 0
+
+    def acquire_lease(self, holder: str, now: float = None) -> bool:
+        """Whether `holder` is the (only) warming worker on this host until the lease runs out."""
+        now = time.time() if now is None else now
+        cur = self._conn().execute(
+            "UPDATE lease SET holder = ?, expires = ? WHERE id = 0 AND (holder = ? OR expires < ?)",
+            (holder, now + _LEASE_S, holder, now))
+        return cur.rowcount == 1
+
+    def prune(self, now: float = None):
+        """Keep the `max_inputs` most frequent inputs and a day of traffic counts."""
+        now = time.time() if now is None else now
+        conn = self._conn()
+        rows = conn.execute("SELECT input_key, score, updated FROM inputs").fetchall()
+        if len(rows) > self.max_inputs:
+            rows.sort(key=lambda r: self._decayed(r[1], r[2], now))
+            conn.executemany("DELETE FROM inputs WHERE input_key = ?",
+                             [(r[0],) for r in rows[:len(rows) - self.max_inputs]])
+        conn.execute("DELETE FROM traffic WHERE minute < ?", (int((now - _TRAFFIC_KEEP_S) // 60),))
+        oldest = time.strftime("%Y-%m-%d", time.localtime(now - _SPEND_KEEP_DAYS * 86400))
+        conn.execute("DELETE FROM spend WHERE day < ?", (oldest,))
+
+
+class CacheWarmer:
+    """Replays hot cases off-peak so their cache entries are refreshed before they expire."""
+
+    def __init__(self, runner: Callable[[Dict[str, Any]], Any], history: Optional[CaseHistory] = None,
+                 rate_per_min: float = CACHE_WARMER_RATE_PER_MIN, tokens_per_day: int = CACHE_WARMER_TOKENS_PER_DAY,
+                 refresh_ahead_s: float = CACHE_WARMER_REFRESH_AHEAD_S, top_n: int = CACHE_WARMER_TOP_N,
+                 hours: str = CACHE_WARMER_HOURS, idle_rpm: int = CACHE_WARMER_IDLE_RPM,
+                 retry_s: float = CACHE_WARMER_RETRY_S):
+        self.runner = runner
+        self.history = history or get_case_history()
+        self.interval_s = 60.0 / max(rate_per_min, 0.01)
+        self.tokens_per_day = tokens_per_day
+        self.refresh_ahead_s = refresh_ahead_s
+        self.top_n = top_n
+        self.hours = parse_hours(hours)
+        self.idle_rpm = idle_rpm
+        self.retry_s = retry_s
+        # Entries written by a warm run start expiring this long after it
+        self.ttl_s = min(EXTERNAL_CACHE_TTL_S, LLM_CACHE_TTL_S)
+        self.holder = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.last_result: Dict[str, Any] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "CacheWarmer":
+        self._thread = threading.Thread(target=self._loop, name="cache-warmer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def off_peak(self, now: float = None) -> bool:
+        now = time.time() if now is None else now
+        return (in_hours(time.localtime(now).tm_hour, self.hours)
+                and self.history.requests_last_minute(now) <= self.idle_rpm)
+
+    def due(self, case: Dict[str, Any], now: float) -> bool:
+        return now >= max(case["warmed"] + self.ttl_s - self.refresh_ahead_s, case["retry_at"])
+
+    def next_case(self, now: float = None) -> Optional[Dict[str, Any]]:
+        """Hottest case due for a refresh that fits the remaining token budget."""
+        now = time.time() if now is None else now
+        remaining = self.tokens_per_day - self.history.spent_today() if self.tokens_per_day > 0 else None
+        if remaining is not None and remaining <= 0:
+            return None
+        for case in self.history.hot_cases(self.top_n, now):
+            # The last warm run's spend estimates this one's
+            if self.due(case, now) and (remaining is None or case["tokens"] <= remaining):
+                return case
+        return None
+
+    def warm_one(self, now: float = None) -> Optional[Dict[str, Any]]:
+        """Replay the next due case; returns what was done (None when nothing is due)."""
+        case = self.next_case(now)
+        if case is None:
+            return None
+        start = time.monotonic()
+        outcome = "ok"
+        with refreshing(self.refresh_ahead_s), metered_tokens() as spent:
+            try:
+                result = self.runner(dict(case["payload"]))
+                # A degraded run left some entries cold (or cached nothing for them)
+                if isinstance(result, dict) and result.get(PARTIAL_KEY):
+                    outcome = "partial"
+                    print(f"❌ Cache warmer run degraded ({case['label']}): {', '.join(result[PARTIAL_KEY])}")
+            except Exception as e:
+                outcome = "error"
+                print(f"❌ Cache warmer run failed ({case['label']}): {e}")
+        if outcome == "ok":
+            self.history.mark_warmed(case["input_key"], spent[0], now)
+        else:
+            self.history.mark_failed(case["input_key"], spent[0], self.retry_s, now)
+        metrics.inc("cache_warmer_cases", outcome=outcome)
+        metrics.inc("cache_warmer_tokens", spent[0])
+        metrics.observe("cache_warmer_seconds", time.monotonic() - start)
+        self.last_result = {"label": case["label"], "outcome": outcome, "tokens": spent[0],
+                            "seconds": round(time.monotonic() - start, 3), "at": time.time()}
+        return self.last_result
+
+    def tick(self):
+        if not self.off_peak() or not self.history.acquire_lease(self.holder):
+            return
+        self.warm_one()
+        self.history.prune()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"❌ Cache warmer error: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        hot = self.history.hot_cases(self.top_n, now)
+        return {
+            "off_peak": self.off_peak(now),
+            "tokens_today": self.history.spent_today(),
+            "tokens_per_day": self.tokens_per_day,
+            "cases": len(hot),
+            "due": sum(1 for c in hot if self.due(c, now)),
+            "top": [{"label": c["label"], "score": round(c["score"], 2), "seen": c["seen"],
+                     "warmed": c["warmed"] or None} for c in hot[:10]],
+            "last": self.last_result,
+        }
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_case_history() -> CaseHistory:
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = CaseHistory()
+    return _history
+
+
+def record_case(state: Dict[str, Any], profile: Optional[str] = None):
+    """Count a request in the case history (no-op unless CACHE_WARMER_ENABLED)."""
+    if CACHE_WARMER_ENABLED:
+        get_case_history().record(replayable_input(state, profile))
+
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def get_cache_warmer(runner: Callable[[Dict[str, Any]], Any] = None) -> Optional[CacheWarmer]:
+    """The worker's cache warmer, started on first call with a `runner` (None when disabled)."""
+    global _warmer
+    if not CACHE_WARMER_ENABLED:
+        return None
+    if _warmer is None and runner is not None:
+        with _warmer_lock:
+            if _warmer is None:
+                _warmer = CacheWarmer(runner).start()
+    return _warmer
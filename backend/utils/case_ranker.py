@@ -0,0 +1,114 @@
+import re
+from typing import Any, Dict, List
+
+# -------------------------------
+# Deterministic local re-ranker for ontology hits
+# -------------------------------
+# Combines BioPortal's own score, lexical overlap with the patient's symptoms
+# and top differentials, and agreement with the symptom analyzer's ICD codes.
+WEIGHTS = {
+    "bioportal": 0.35,
+    "lexical": 0.40,
+    "icd": 0.25,
+}
+
+_STOPWORDS = {
+    "a", "an", "and", "or", "of", "the", "in", "on", "with", "without", "to", "for",
+    "by", "at", "from", "as", "is", "are", "was", "unspecified", "other", "nos",
+    "age", "male", "female", "patient", "history",
+}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> set:
+    return {t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS and len(t) > 1}
+
+
+def _normalize_icd(code: str) -> str:
+    return (code or "").upper().replace(".", "").strip()
+
+
+def _differential_codes(differentials: List[Any]) -> List[str]:
+    codes = []
+    for d in differentials or []:
+        if isinstance(d, dict) and d.get("icd10cm_code"):
+            codes.append(_normalize_icd(d["icd10cm_code"]))
+    return codes
+
+
+def _differential_names(differentials: List[Any]) -> List[str]:
+    names = []
+    for d in differentials or []:
+        if isinstance(d, dict):
+            names.append(d.get("name", ""))
+        elif isinstance(d, str):
+            names.append(d)
+    return names
+
+
+def _icd_score(code: str, differential_codes: List[str]) -> float:
+    code = _normalize_icd(code)
+    if not code or code == "N/A":
+        return 0.0
+    best = 0.0
+    for ref in differential_codes:
+        if code == ref:
+            return 1.0
+        # Same category (e.g. E11 vs E11.9) or parent/child in the hierarchy
+        if code.startswith(ref) or ref.startswith(code):
+            best = max(best, 0.75)
+        elif code[:3] == ref[:3]:
+            best = max(best, 0.5)
+    return best
+
+
+def _lexical_score(candidate: Dict[str, Any], query_tokens: set) -> float:
+    if not query_tokens:
+        return 0.0
+    name_tokens = _tokens(candidate.get("name", ""))
+    desc_tokens = _tokens(candidate.get("description", ""))
+    if not name_tokens and not desc_tokens:
+        return 0.0
+    # Name coverage matters most; description overlap breaks ties
+    name_cov = len(name_tokens & query_tokens) / len(name_tokens) if name_tokens else 0.0
+    desc_cov = len(desc_tokens & query_tokens) / len(query_tokens) if desc_tokens else 0.0
+    return min(1.0, 0.8 * name_cov + 0.2 * desc_cov)
+
+
+def score_candidates(candidates: List[Dict[str, Any]], symptoms: str,
+                     differentials: List[Any]) -> List[Dict[str, Any]]:
+    """Return candidates with component and combined scores, best first."""
+    query_tokens = _tokens(" ".join([symptoms or ""] + _differential_names(differentials)[:3]))
+    ref_codes = _differential_codes(differentials)
+    max_bp = max([float(c.get("score") or 0) for c in candidates] + [0.0])
+
+    scored = []
+    for idx, c in enumerate(candidates):
+        parts = {
+            "bioportal": (float(c.get("score") or 0) / max_bp) if max_bp > 0 else 0.0,
+            "lexical": _lexical_score(c, query_tokens),
+            "icd": _icd_score(c.get("icd_code", ""), ref_codes),
+        }
+        total = sum(WEIGHTS[k] * v for k, v in parts.items())
+        scored.append((total, -idx, c, parts))
+
+    # Stable: ties keep BioPortal order
+    scored.sort(key=lambda x: (x[0], x[1]), reverse=True)
+    return [{**c, "_components": parts, "_score": round(total, 4)} for total, _, c, parts in scored]
+
+
+def rank_locally(candidates: List[Dict[str, Any]], symptoms: str,
+                 differentials: List[Any], top_k: int = 3) -> Dict[str, Any]:
+    """Pick the top_k ontology hits in the same schema the LLM ranker returns."""
+    ranked = score_candidates(candidates, symptoms, differentials)[:top_k]
+    return {
+        "matched_cases": [
+            {
+                "icd_code": c.get("icd_code", "N/A"),
+                "name": c.get("name", "Unknown"),
+                "description": c.get("description", ""),
+                "match_score": c["_score"],
+            }
+            for c in ranked
+        ]
+    }
@@ -0,0 +1,217 @@
+import io
+import os
+import re
+import time
+import base64
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+import orjson
+
+from backend.utils import metrics
+from backend.utils.private_files import open_private, private_path
+from backend.utils.shared_cache import make_key
+
+# -------------------------------
+# Traffic cassettes (record / replay)
+# -------------------------------
+# CASSETTE_MODE=record appends anonymized /analyze and /generate-pdf requests
+# plus every external response they triggered (PubMed, BioPortal, RxNorm, LLM)
+# to a JSON-lines cassette. CASSETTE_MODE=replay serves those responses –
+# after the recorded latency – instead of calling the real backends, so
+# `python -m backend.bench_replay` can load-test the server offline. Request
+# bodies, backend query params and LLM replies are anonymized before writing;
+# lookup keys are digests of the original values. Anonymization does not catch
+# names or other free-text identifiers, so the cassette is written 0600, by
+# default in the per-user 0700 directory like the SQLite stores.
+# Run both with SHARED_CACHE_ENABLED=0 so every external call is observed.
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "").lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", private_path(tempfile.gettempdir(), "traffic.cassette.jsonl"))
+# Multiplier for recorded backend latencies during replay (0 = instant)
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))
+
+RECORDED_PATHS = ("/analyze", "/generate-pdf")
+
+# Query parameters never written to a cassette
+_SECRET_PARAMS = {"apikey", "api_key", "key", "token"}
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE_RE = re.compile(r"\+?\d[\d\s().-]{7,}\d")
+_LONG_NUMBER_RE = re.compile(r"\b\d{6,}\b")
+
+
+class CassetteMiss(RuntimeError):
+    pass
+
+
+def recording() -> bool:
+    return CASSETTE_MODE == "record"
+
+
+def replaying() -> bool:
+    return CASSETTE_MODE == "replay"
+
+
+def scrub_params(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: v for k, v in (params or {}).items() if k.lower() not in _SECRET_PARAMS}
+
+
+def anonymize(value: Any, key: str = "") -> Any:
+    """Strip direct identifiers from a request body (HIPAA safe-harbor style).
+
+    Emails, phone numbers and long digit runs (MRNs, IDs) in free text are
+    redacted and ages above 89 are reported as 90. Names in free text are not
+    detected, so cassettes should still be handled as sensitive.
+    """
+    if isinstance(value, dict):
+        return {k: anonymize(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [anonymize(v, key) for v in value]
+    if key == "age" and isinstance(value, (int, float)) and value > 89:
+        return 90
+    if isinstance(value, str):
+        value = _EMAIL_RE.sub("[email]", value)
+        value = _PHONE_RE.sub("[phone]", value)
+        return _LONG_NUMBER_RE.sub("[id]", value)
+    return value
+
+
+class ReplayResponse:
+    """The subset of `requests.Response` the agents and scheduler use."""
+
+    def __init__(self, entry: Dict[str, Any]):
+        self.status_code = entry["status"]
+        self.url = entry["url"]
+        self.headers = {"Content-Type": entry.get("content_type", "")}
+        if "body_b64" in entry:
+            self.content = base64.b64decode(entry["body_b64"])
+        else:
+            self.content = entry.get("body", "").encode("utf-8")
+        self.raw = io.BytesIO(self.content)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return orjson.loads(self.content)
+
+    def iter_content(self, chunk_size: int = 65536):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class Cassette:
+    def __init__(self, path: str = CASSETTE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self._index = None
+        self._cursor: Dict[str, int] = {}
+
+    # ---- recording ----
+    def _append(self, entry: Dict[str, Any]):
+        line = orjson.dumps(entry) + b"\n"
+        with self._lock:
+            # One write per line; O_APPEND keeps lines from several workers intact
+            with open_private(self.path, "ab") as f:
+                f.write(line)
+
+    def record_request(self, method: str, path: str, query: str, client: str, body: Any,
+                       status: int, elapsed: float):
+        self._append({
+            "type": "request", "t": round(time.time() - self._start, 4), "method": method, "path": path,
+            "query": anonymize(query), "client": client, "body": anonymize(body), "status": status,
+            "elapsed": round(elapsed, 4),
+        })
+
+    def record_http(self, backend: str, url: str, params: Optional[Dict], resp, elapsed: float):
+        params = scrub_params(params)
+        # Lookup keys hash the original params; only the stored copies are anonymized
+        key = make_key(backend, url, params)
+        base, sep, query = url.partition("?")
+        content = resp.content
+        if getattr(resp, "raw", None) is not None:
+            # Keep streamed responses readable for the caller after we consumed them
+            resp.raw = io.BytesIO(content)
+        entry = {
+            "type": "http", "key": key, "family": make_key(backend, url),
+            "backend": backend, "url": base + sep + anonymize(query), "params": anonymize(params),
+            "status": resp.status_code,
+            "content_type": resp.headers.get("Content-Type", ""), "elapsed": round(elapsed, 4),
+        }
+        try:
+            entry["body"] = content.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(content).decode("ascii")
+        self._append(entry)
+
+    def record_llm(self, key: str, family: str, model: str, content: str, elapsed: float):
+        self._append({"type": "llm", "key": key, "family": family, "model": model,
+                      "content": anonymize(content), "elapsed": round(elapsed, 4)})
+
+    # ---- replay ----
+    def load(self) -> Dict[str, Dict[str, list]]:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    index = {"key": {}, "family": {}}
+                    with open(self.path, "rb") as f:
+                        for line in f:
+                            entry = orjson.loads(line)
+                            if entry.get("type") not in ("http", "llm"):
+                                continue
+                            index["key"].setdefault(entry["key"], []).append(entry)
+                            index["family"].setdefault(entry["family"], []).append(entry)
+                    self._index = index
+        return self._index
+
+    def recorded_requests(self) -> list:
+        with open(self.path, "rb") as f:
+            return [e for e in map(orjson.loads, f) if e.get("type") == "request"]
+
+    def _match(self, kind: str, key: str, family: str) -> Dict[str, Any]:
+        # Exact match first, then any response from the same endpoint / prompt
+        # (anonymized inputs no longer reproduce the recorded keys exactly)
+        index = self.load()
+        for match, bucket_key in (("exact", key), ("family", family)):
+            entries = index["key" if match == "exact" else "family"].get(bucket_key)
+            if entries:
+                with self._lock:
+                    i = self._cursor.get(bucket_key, 0)
+                    self._cursor[bucket_key] = i + 1
+                metrics.inc("cassette_replays", kind=kind, match=match)
+                entry = entries[i % len(entries)]
+                if CASSETTE_LATENCY_SCALE > 0:
+                    time.sleep(entry.get("elapsed", 0) * CASSETTE_LATENCY_SCALE)
+                return entry
+        metrics.inc("cassette_replays", kind=kind, match="miss")
+        raise CassetteMiss(f"No recorded {kind} response for {family}")
+
+    def replay_http(self, backend: str, url: str, params: Optional[Dict]) -> ReplayResponse:
+        entry = self._match("http", make_key(backend, url, scrub_params(params)), make_key(backend, url))
+        return ReplayResponse(entry)
+
+    def replay_llm(self, key: str, family: str) -> str:
+        return self._match("llm", key, family)["content"]
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Cassette:
+    global _cassette
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                _cassette = Cassette()
+    return _cassette
@@ -0,0 +1,71 @@
+import os
+import time
+from typing import Any, Dict, Optional
+
+# -------------------------------
+# Request deadline helpers
+# -------------------------------
+# The deadline is stored in graph state as an absolute epoch timestamp so it
+# survives being passed between nodes (and threads). Agents ask for the
+# remaining budget and skip/degrade slow steps once it is nearly spent.
+DEADLINE_KEY = "deadline"
+PARTIAL_KEY = "partial_sections"
+
+# Per-call cap used when there is no deadline (matches previous fixed timeouts)
+DEFAULT_CALL_TIMEOUT = 10.0
+# Minimum budget worth starting an external HTTP call / an LLM call with
+MIN_HTTP_BUDGET = float(os.getenv("DEADLINE_MIN_HTTP_S", "1.0"))
+MIN_LLM_BUDGET = float(os.getenv("DEADLINE_MIN_LLM_S", "4.0"))
+# Time reserved for the steps after the current one (e.g. the summarizer)
+RESERVE = float(os.getenv("DEADLINE_RESERVE_S", "1.0"))
+
+
+def set_deadline(state: Dict[str, Any], timeout_s: Optional[float]):
+    if timeout_s and timeout_s > 0:
+        state[DEADLINE_KEY] = time.time() + float(timeout_s)
+
+
+def remaining(state: Dict[str, Any]) -> Optional[float]:
+    """Seconds left before the deadline (None when the request has no deadline)."""
+    deadline = state.get(DEADLINE_KEY)
+    if not deadline:
+        return None
+    return max(0.0, float(deadline) - time.time())
+
+
+def has_budget(state: Dict[str, Any], needed: float) -> bool:
+    left = remaining(state)
+    return left is None or left - RESERVE >= needed
+
+
+def call_timeout(state: Dict[str, Any], default: Optional[float] = DEFAULT_CALL_TIMEOUT) -> Optional[float]:
+    """Timeout for the next blocking call: the default, capped by the remaining budget."""
+    left = remaining(state)
+    if left is None:
+        return default
+    cap = left - RESERVE if default is None else min(default, left - RESERVE)
+    return max(0.1, cap)
+
+
+def llm_timeout(state: Dict[str, Any]) -> Optional[float]:
+    """Timeout to bind onto an LLM call (None = unbounded, as before)."""
+    left = remaining(state)
+    if left is None:
+        return None
+    return max(0.1, left - RESERVE)
+
+
+def with_timeout(llm, timeout: Optional[float]):
+    """Bind a per-request timeout onto a ChatOpenAI model when one is set."""
+    return llm.bind(timeout=timeout) if timeout else llm
+
+
+def mark_partial(state: Dict[str, Any], section_key: str, reason: str = "deadline"):
+    """Flag a state section as degraded and record it in the top-level list."""
+    section = state.get(section_key)
+    if isinstance(section, dict):
+        section["partial"] = True
+        section["partial_reason"] = reason
+    partial = state.setdefault(PARTIAL_KEY, [])
+    if section_key not in partial:
+        partial.append(section_key)
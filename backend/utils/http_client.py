@@ -0,0 +1,136 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Optional
+
+import requests
+
+from backend.utils import cassette, metrics
+from backend.utils.resilience import CircuitOpenError, get_breaker
+
+# -------------------------------
+# Hedging configuration
+# -------------------------------
+# A duplicate request is sent once the primary has been outstanding longer
+# than the backend's recent p95 latency (clamped to a sane range).
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_DELAY_S = float(os.getenv("HEDGE_MIN_DELAY_S", "0.05"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "1").lower() not in ("0", "false", "no")
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+
+# Worker pool and per-thread keep-alive sessions are created on first request
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix="http")
+    return _pool
+
+
+def _session() -> requests.Session:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def _hedge_delay(backend: str, timeout: float) -> Optional[float]:
+    if not HEDGING_ENABLED:
+        return None
+    if metrics.count("external_request_seconds", backend=backend) < HEDGE_MIN_SAMPLES:
+        return None
+    p = metrics.quantile("external_request_seconds", HEDGE_QUANTILE, backend=backend)
+    if p is None:
+        return None
+    delay = max(HEDGE_MIN_DELAY_S, p)
+    # Hedging only helps if the duplicate still has time to finish
+    return delay if delay < timeout / 2 else None
+
+
+def _attempt(backend: str, url: str, params: Dict, timeout: float, stream: bool):
+    start = time.monotonic()
+    try:
+        resp = _session().get(url, params=params, timeout=timeout, stream=stream)
+    finally:
+        # Every finished attempt is a latency sample – errors, timeouts and lost
+        # hedges included – so the p95 that triggers hedging is not biased low
+        elapsed = time.monotonic() - start
+        metrics.observe("external_request_seconds", elapsed, backend=backend)
+    # Rate limiting and server-side errors count as failures for hedging and the breaker
+    if resp.status_code == 429 or resp.status_code >= 500:
+        resp.close()
+        reason = "Too Many Requests" if resp.status_code == 429 else "Server Error"
+        raise requests.HTTPError(f"{resp.status_code} {reason} for url: {resp.url}", response=resp)
+    return resp, elapsed
+
+
+def http_get(backend: str, url: str, params: Dict = None, timeout: float = 10,
+             hedge_gate: Callable[[], bool] = None, stream: bool = False):
+    """GET through the backend's circuit breaker with p95-derived request hedging.
+
+    `hedge_gate` is consulted before sending a duplicate (e.g. a non-blocking
+    rate-limit token); returning False suppresses the hedge.
+    429 and 5xx responses raise HTTPError and count as breaker failures.
+    Raises CircuitOpenError without touching the network while the breaker is open.
+    """
+    if cassette.replaying():
+        return cassette.get_cassette().replay_http(backend, url, params)
+    breaker = get_breaker(backend)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{backend} circuit open; failing fast")
+
+    deadline = time.monotonic() + timeout
+    primary = _get_pool().submit(_attempt, backend, url, params, timeout, stream)
+    pending = {primary}
+    hedge_delay = _hedge_delay(backend, timeout)
+    hedged = False
+    last_error: Exception = None
+
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        wait_for = deadline - now
+        if hedge_delay is not None and not hedged:
+            wait_for = min(wait_for, hedge_delay)
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for fut in done:
+            try:
+                resp, elapsed = fut.result()
+            except Exception as e:
+                last_error = e
+                continue
+            metrics.inc("external_requests", backend=backend, outcome="ok")
+            if hedged:
+                metrics.inc("hedged_requests", backend=backend, outcome="lost" if fut is primary else "won")
+            for other in pending:
+                other.cancel()
+            breaker.record_success()
+            if cassette.recording():
+                cassette.get_cassette().record_http(backend, url, params, resp, elapsed)
+            return resp
+
+        if not done and not hedged and hedge_delay is not None:
+            # Primary is stalling past p95: send the duplicate
+            hedged = True
+            if hedge_gate is None or hedge_gate():
+                metrics.inc("hedged_requests", backend=backend, outcome="sent")
+                remaining = max(0.1, deadline - time.monotonic())
+                pending.add(_get_pool().submit(_attempt, backend, url, params, remaining, stream))
+
+    outcome = "timeout" if last_error is None else "error"
+    metrics.inc("external_requests", backend=backend, outcome=outcome)
+    breaker.record_failure()
+    if last_error is None:
+        raise requests.Timeout(f"{backend} request exceeded {timeout:.1f}s")
+    raise last_error
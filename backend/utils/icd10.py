@@ -0,0 +1,315 @@
+import os
+import re
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.utils import metrics
+from backend.utils.query_canon import fold_synonyms, normalize
+
+# -------------------------------
+# Local ICD-10-CM code table
+# -------------------------------
+# In-memory ICD-10-CM table loaded from a CMS order file (fixed width: order
+# number, code without the dot, billable flag, short and long description),
+# or the CMS codes file (code, long description). The shipped file is a
+# starter subset of common presentations; point ICD10CM_CODES_PATH at the
+# full CMS release (icd10cm_order_2025.txt) in production. Codes are looked up
+# in O(1), walked up/down the hierarchy, and names are matched to codes with
+# an IDF-weighted token index that tolerates one-letter typos – so the
+# differentials of the symptom analyzer are checked without a network call.
+ICD10CM_CODES_PATH = os.getenv(
+    "ICD10CM_CODES_PATH", os.path.join(os.path.dirname(__file__), "..", "data", "icd10cm_order_subset.txt")
+)
+ICD10CM_VALIDATE = os.getenv("ICD10CM_VALIDATE", "1").lower() not in ("0", "false", "no")
+# Minimum name → title similarity (0–1) for a correction
+ICD10CM_MATCH_THRESHOLD = float(os.getenv("ICD10CM_MATCH_THRESHOLD", "0.6"))
+
+VALID, CORRECTED, UNKNOWN = "valid", "corrected", "unknown"
+
+# Title words that carry no meaning for matching
+_STOPWORDS = {"a", "an", "and", "of", "the", "in", "to", "or", "as", "by", "for", "on"}
+# Tokens in more than this share of titles only score candidates found through rarer tokens
+_COMMON_SHARE = 0.02
+# The CMS release has ~74k billable codes; smaller tables are subsets, where a
+# well-formed code that is missing may still be real and is left alone
+_FULL_TABLE_MIN_CODES = 50000
+_CODE_RE = re.compile(r"^[A-Z][0-9][0-9A-Z][0-9A-Z]{0,4}$")
+
+
+def normalize_code(code: Any) -> str:
+    """"i21.4 " / "I214" → "I214" (the table key: uppercase, no dot or spaces)."""
+    return "".join(c for c in str(code or "").upper() if c.isalnum())
+
+
+def format_code(key: str) -> str:
+    """Table key → dotted display form ("I214" → "I21.4")."""
+    return key if len(key) <= 3 else f"{key[:3]}.{key[3:]}"
+
+
+def _tokens(text: Any) -> List[str]:
+    return [t for t in normalize(text).split() if t not in _STOPWORDS]
+
+
+def _title_tokens(title: str) -> set:
+    # "Gastro-esophageal" is indexed as "gastro", "esophageal" and "gastroesophageal"
+    joined = {normalize(w).replace(" ", "") for w in title.split() if "-" in w}
+    return set(_tokens(title)) | {t for t in joined if t}
+
+
+def _deletes(word: str) -> List[str]:
+    return [word[:i] + word[i + 1:] for i in range(len(word))]
+
+
+class ICD10Table:
+    def __init__(self, entries: List[Tuple[str, bool, str]], complete: Optional[bool] = None):
+        # key → (title, billable)
+        self.codes: Dict[str, Tuple[str, bool]] = {}
+        self.children: Dict[str, List[str]] = {}
+        for key, billable, title in entries:
+            self.codes[key] = (title, billable)
+        self.complete = len(self.codes) >= _FULL_TABLE_MIN_CODES if complete is None else complete
+        for key in self.codes:
+            parent = self.parent(key)
+            if parent:
+                self.children.setdefault(parent, []).append(key)
+        self._build_index()
+
+    # ---- loading ----
+    @classmethod
+    def load(cls, path: str = ICD10CM_CODES_PATH) -> "ICD10Table":
+        entries = []
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.rstrip("\n\r")
+                if not line.strip():
+                    continue
+                if line[:5].isdigit() and len(line) > 16 and line[5] == " ":
+                    # Order file: 5-digit order, code (7), billable flag, short (60), long description
+                    key, flag = line[6:13].strip(), line[14]
+                    title = line[77:].strip() or line[16:76].strip()
+                    entries.append((key, flag == "1", title))
+                else:
+                    # Codes file: billable codes only
+                    key, _, title = line.partition(" ")
+                    entries.append((key.strip(), True, title.strip()))
+        return cls(entries)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    # ---- codes and hierarchy ----
+    def get(self, code: Any) -> Optional[Tuple[str, bool]]:
+        return self.codes.get(normalize_code(code))
+
+    def is_valid(self, code: Any) -> bool:
+        return normalize_code(code) in self.codes
+
+    def is_billable(self, code: Any) -> bool:
+        entry = self.get(code)
+        return bool(entry and entry[1])
+
+    def title(self, code: Any) -> str:
+        entry = self.get(code)
+        return entry[0] if entry else ""
+
+    def parent(self, code: Any) -> Optional[str]:
+        """Nearest ancestor in the table (None for a category or an unrelated code)."""
+        key = normalize_code(code)
+        for end in range(len(key) - 1, 2, -1):
+            if key[:end] in self.codes:
+                return key[:end]
+        return None
+
+    def ancestors(self, code: Any) -> List[str]:
+        out, key = [], self.parent(code)
+        while key:
+            out.append(key)
+            key = self.parent(key)
+        return out
+
+    def descendants(self, code: Any) -> List[str]:
+        out, stack = [], list(self.children.get(normalize_code(code), []))
+        while stack:
+            key = stack.pop()
+            out.append(key)
+            stack.extend(self.children.get(key, []))
+        return out
+
+    # ---- name → code ----
+    def _build_index(self):
+        self._postings: Dict[str, List[str]] = {}
+        for key, (title, _) in self.codes.items():
+            for token in _title_tokens(title):
+                self._postings.setdefault(token, []).append(key)
+        n = max(1, len(self.codes))
+        self._idf = {t: math.log(1 + n / len(keys)) for t, keys in self._postings.items()}
+        self._norm = {key: math.sqrt(sum(self._idf[t] ** 2 for t in _title_tokens(title)))
+                      for key, (title, _) in self.codes.items()}
+        self._common = max(50, int(n * _COMMON_SHARE))
+        # Single-deletion index for one-letter typos ("pnuemonia", "diabetis")
+        self._by_delete: Dict[str, str] = {}
+        for token in sorted(self._postings, key=lambda t: -len(self._postings[t])):
+            for d in _deletes(token):
+                self._by_delete.setdefault(d, token)
+
+    def _known(self, token: str) -> Optional[str]:
+        if token in self._postings:
+            return token
+        if len(token) < 5:
+            return None
+        # Same word with one letter deleted, inserted, substituted or swapped
+        for candidate in [self._by_delete.get(token)] + [self._by_delete.get(d) for d in _deletes(token)] + [
+                d for d in _deletes(token) if d in self._postings]:
+            if candidate:
+                return candidate
+        return None
+
+    def _scores(self, words: List[str], within: Optional[set]) -> Dict[str, float]:
+        tokens = list(dict.fromkeys(t for t in (self._known(w) for w in words) if t))
+        if not tokens:
+            return {}
+        query_norm = math.sqrt(sum(self._idf[t] ** 2 for t in tokens))
+        # Accumulate over rare tokens; common ones ("unspecified") only add to found candidates
+        rare = [t for t in tokens if len(self._postings[t]) <= self._common] or tokens
+        scores: Dict[str, float] = {}
+        for t in rare:
+            w = self._idf[t] ** 2
+            for key in self._postings[t]:
+                if within is None or key in within:
+                    scores[key] = scores.get(key, 0.0) + w
+        for t in tokens:
+            if t in rare:
+                continue
+            w = self._idf[t] ** 2
+            postings = self._postings[t]
+            for key in scores:
+                if key in postings:
+                    scores[key] += w
+        return {key: s / (query_norm * self._norm[key]) for key, s in scores.items()}
+
+    def match(self, name: Any, limit: int = 5, within: Optional[set] = None) -> List[Tuple[str, float]]:
+        """Best codes for a diagnosis name as (key, cosine similarity), best first.
+
+        Names with lay terms or abbreviations ("heart attack", "COPD") are also
+        scored in their clinical wording; the better score counts.
+        """
+        text = normalize(name)
+        scores = self._scores(_tokens(text), within)
+        folded = fold_synonyms(text)
+        if folded != text:
+            for key, score in self._scores(_tokens(folded), within).items():
+                scores[key] = max(score, scores.get(key, 0.0))
+        ranked = sorted(
+            scores.items(),
+            # Ties: billable first, then the shorter (more general) code
+            key=lambda ks: (-round(ks[1], 6), not self.codes[ks[0]][1], len(ks[0]), ks[0]),
+        )
+        return ranked[:limit]
+
+    def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        """Case-matcher local source: name matches in the BioPortal result format."""
+        return [
+            {"icd_code": format_code(key), "name": self.codes[key][0], "description": "", "score": round(score, 4)}
+            for key, score in self.match(query, max_results)
+        ]
+
+    # ---- differential checks ----
+    def _specific(self, key: str, name: Any) -> str:
+        """A billable code under `key`: the best name match, else its only "…, unspecified" code."""
+        if self.codes[key][1]:
+            return key
+        below = {k for k in self.descendants(key) if self.codes[k][1]}
+        hits = self.match(name, 1, within=below) if below else []
+        if hits and hits[0][1] >= ICD10CM_MATCH_THRESHOLD:
+            return hits[0][0]
+        unspecified = [k for k in below if self.codes[k][0].lower().endswith("unspecified")]
+        return unspecified[0] if len(unspecified) == 1 else key
+
+    def _better_match(self, key: str, name: Any) -> Optional[str]:
+        """A code outside `key`'s category that fits `name` when `key` does not (else None).
+
+        Only names whose every word is in the index count: a partly understood
+        name ("viral URI") keeps the code it was given.
+        """
+        text = normalize(name)
+        if not any(all(self._known(t) for t in _tokens(form)) for form in {text, fold_synonyms(text)}):
+            return None
+        hits = self.match(name, 1)
+        if not hits or hits[0][1] < ICD10CM_MATCH_THRESHOLD or hits[0][0][:3] == key[:3]:
+            return None
+        branch = {k for k in self.codes if k[:3] == key[:3]}
+        fit = self.match(name, 1, within=branch)
+        if fit and fit[0][1] >= ICD10CM_MATCH_THRESHOLD:
+            return None
+        return hits[0][0]
+
+    def check(self, name: Any, code: Any) -> Dict[str, Any]:
+        """Validate / correct the code of one differential.
+
+        valid: the code exists as given (formatting normalized). corrected: the
+        code was missing or not in the table and the name or its nearest
+        ancestor supplied one, a non-billable category was refined to a
+        billable code, or the code contradicts the name (the name does not fit
+        the code's category but clearly matches another code). unknown:
+        nothing trustworthy found (or a well-formed code outside a partial
+        table); the code is left as given.
+        """
+        key = normalize_code(code)
+        if key in self.codes:
+            better = self._better_match(key, name)
+            if better:
+                metrics.inc("icd10cm_mismatches")
+                specific = self._specific(better, name)
+                return {"code": format_code(specific), "status": CORRECTED, "title": self.codes[specific][0]}
+            specific = self._specific(key, name)
+            return {"code": format_code(specific), "status": VALID if specific == key else CORRECTED,
+                    "title": self.codes[specific][0]}
+        if key and not self.complete and _CODE_RE.match(key):
+            return {"code": code, "status": UNKNOWN, "title": ""}
+        hits = self.match(name, 1)
+        ancestor = self.parent(key) if len(key) > 3 else None
+        if hits and hits[0][1] >= ICD10CM_MATCH_THRESHOLD:
+            best = hits[0][0]
+            # Prefer the original code's branch when the name fits there too
+            if ancestor and not best.startswith(ancestor[:3]):
+                branch = self.match(name, 1, within=set(self.descendants(ancestor[:3])) | {ancestor[:3]})
+                if branch and branch[0][1] >= ICD10CM_MATCH_THRESHOLD:
+                    best = branch[0][0]
+            best = self._specific(best, name)
+            return {"code": format_code(best), "status": CORRECTED, "title": self.codes[best][0]}
+        if ancestor:
+            specific = self._specific(ancestor, name)
+            return {"code": format_code(specific), "status": CORRECTED, "title": self.codes[specific][0]}
+        return {"code": code, "status": UNKNOWN, "title": ""}
+
+    def validate_differentials(self, differentials: List[Any]) -> List[Any]:
+        """Annotate each differential with icd10cm_status / icd10cm_title (+ icd10cm_original when changed)."""
+        out = []
+        for d in differentials:
+            if not isinstance(d, dict):
+                out.append(d)
+                continue
+            original = d.get("icd10cm_code")
+            result = self.check(d.get("name"), original)
+            annotated = {**d, "icd10cm_code": result["code"], "icd10cm_status": result["status"]}
+            if result["title"]:
+                annotated["icd10cm_title"] = result["title"]
+            if result["status"] == CORRECTED:
+                annotated["icd10cm_original"] = original
+            metrics.inc("icd10cm_codes", status=result["status"])
+            out.append(annotated)
+        return out
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_icd10_table() -> ICD10Table:
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = ICD10Table.load()
+    return _table
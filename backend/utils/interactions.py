@@ -0,0 +1,113 @@
+import os
+import re
+import json
+import threading
+from typing import Any, Dict, List, Tuple
+
+from backend.utils.query_canon import normalize
+
+# -------------------------------
+# Local drug–drug interaction engine
+# -------------------------------
+# Sparse RxCUI × RxCUI interaction matrix (ingredient level) loaded from a JSON
+# data file, plus free-text medication → RxCUI resolution by name / brand
+# alias. Treatment candidates are checked against the patient's medications
+# before the LLM step, so the prompt only has to narrate the flagged pairs.
+DRUG_INTERACTIONS_PATH = os.getenv(
+    "DRUG_INTERACTIONS_PATH", os.path.join(os.path.dirname(__file__), "..", "data", "drug_interactions.json")
+)
+
+SEVERITY_ORDER = {"contraindicated": 0, "major": 1, "moderate": 2, "minor": 3}
+# Longest alias (in words) tried when scanning free text
+_MAX_ALIAS_WORDS = 3
+# Separators between entries of a free-text medication list
+_MED_LIST_SPLIT = re.compile(r"[,;\n]+|\s+(?:\+|and|&)\s+", re.IGNORECASE)
+
+
+class InteractionMatrix:
+    def __init__(self, data: Dict[str, Any]):
+        self.names: Dict[str, str] = {}
+        self._aliases: Dict[str, str] = {}
+        for rxcui, info in data.get("ingredients", {}).items():
+            self.names[rxcui] = info["name"]
+            for alias in [info["name"], *info.get("aliases", [])]:
+                self._aliases[normalize(alias)] = rxcui
+        # (lower rxcui, higher rxcui) → interaction; only known pairs are stored
+        self._pairs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for entry in data.get("interactions", []):
+            a, b = str(entry["a"]), str(entry["b"])
+            if entry.get("severity") not in SEVERITY_ORDER:
+                raise ValueError(f"Unknown interaction severity: {entry.get('severity')!r}")
+            self._pairs[_pair(a, b)] = {
+                "severity": entry["severity"], "effect": entry.get("effect", ""),
+                "management": entry.get("management", ""),
+            }
+
+    @classmethod
+    def load(cls, path: str = DRUG_INTERACTIONS_PATH) -> "InteractionMatrix":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def resolve(self, text: Any) -> List[str]:
+        """Ingredient RxCUIs mentioned in free text ("Coumadin 5 mg, ASA 81"), in order."""
+        words = normalize(text).split()
+        found: List[str] = []
+        i = 0
+        while i < len(words):
+            for n in range(min(_MAX_ALIAS_WORDS, len(words) - i), 0, -1):
+                rxcui = self._aliases.get(" ".join(words[i:i + n]))
+                if rxcui:
+                    if rxcui not in found:
+                        found.append(rxcui)
+                    i += n
+                    break
+            else:
+                i += 1
+        return found
+
+    def unresolved(self, text: Any) -> List[str]:
+        """Entries of a medication list ("metformin 500 mg, Coumadin") the table does not cover."""
+        return [m for m in (p.strip() for p in _MED_LIST_SPLIT.split(str(text or ""))) if m and not self.resolve(m)]
+
+    def lookup(self, a: str, b: str):
+        return self._pairs.get(_pair(a, b))
+
+    def check(self, candidate: List[str], current: List[str]) -> List[Dict[str, Any]]:
+        """Flagged pairs between candidate and current ingredients, most severe first."""
+        flagged = []
+        for a in candidate:
+            for b in current:
+                hit = self._pairs.get(_pair(a, b)) if a != b else None
+                if hit:
+                    flagged.append({
+                        "drug": self.names.get(a, a), "drug_rxcui": a,
+                        "interacts_with": self.names.get(b, b), "interacts_with_rxcui": b, **hit,
+                    })
+        flagged.sort(key=lambda f: SEVERITY_ORDER[f["severity"]])
+        return flagged
+
+    def check_text(self, candidate: Any, current: List[str]) -> List[Dict[str, Any]]:
+        """`check` for a free-text candidate name (e.g. an RxNorm product or LLM suggestion)."""
+        if not current:
+            return []
+        return self.check(self.resolve(candidate), current)
+
+
+def _pair(a: str, b: str) -> Tuple[str, str]:
+    return (a, b) if a <= b else (b, a)
+
+
+_matrix = None
+_matrix_lock = threading.Lock()
+
+
+def get_interactions() -> InteractionMatrix:
+    global _matrix
+    if _matrix is None:
+        with _matrix_lock:
+            if _matrix is None:
+                _matrix = InteractionMatrix.load()
+    return _matrix
@@ -0,0 +1,249 @@
+import os
+import math
+import time
+import uuid
+import heapq
+import asyncio
+import itertools
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from backend.utils import metrics
+
+# -------------------------------
+# Urgency-aware job queue
+# -------------------------------
+# In-process priority scheduler with a worker pool. Jobs are ordered by urgency
+# class, then arrival time. Starvation protection: a job is keyed as if it had
+# arrived `class * JOB_AGING_S` seconds later, so after waiting that long a
+# routine job is ahead of urgent jobs that arrive after it.
+# Submissions past JOB_MAX_QUEUE queued jobs, or past JOB_MAX_PER_CLIENT jobs a
+# client has queued, running or finished but not yet fetched, are rejected
+# (the API answers 503 / 429 with Retry-After). A fetched result is kept for
+# JOB_FETCHED_TTL_S more so clients can re-read it; unfetched ones for
+# JOB_RESULT_TTL_S.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_AGING_S = float(os.getenv("JOB_AGING_S", "30"))
+JOB_RESULT_TTL_S = float(os.getenv("JOB_RESULT_TTL_S", "3600"))
+JOB_FETCHED_TTL_S = float(os.getenv("JOB_FETCHED_TTL_S", "60"))
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", "256"))  # 0 = unbounded
+JOB_MAX_PER_CLIENT = int(os.getenv("JOB_MAX_PER_CLIENT", "16"))  # 0 = unbounded
+
+# Initial guess for a job's run time (refined by an EWMA) for Retry-After
+_INITIAL_RUN_S = 10.0
+_EWMA_ALPHA = 0.2
+
+PRIORITY_CLASSES = ("high", "moderate", "low")
+_URGENCY_CLASS = {
+    "high": 0, "urgent": 0, "emergency": 0, "critical": 0,
+    "moderate": 1, "medium": 1,
+    "low": 2, "routine": 2,
+}
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Guards Job._waiters against a job finishing while a long-poll registers
+_waiters_lock = threading.Lock()
+
+
+class JobRejected(Exception):
+    """The queue (`reason="queue_full"`) or the client's share (`"client_limit"`) is full."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"job rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def priority_class(urgency: Optional[str]) -> int:
+    """0 (high) … 2 (low); unknown or missing urgency counts as low."""
+    return _URGENCY_CLASS.get((urgency or "").strip().lower(), 2)
+
+
+class Job:
+    __slots__ = ("id", "priority", "fn", "meta", "client", "status", "result", "error", "submitted", "started",
+                 "finished", "fetched", "_done", "_waiters")
+
+    def __init__(self, fn: Callable[[], Any], priority: int, meta: Optional[Dict[str, Any]] = None,
+                 client: str = ""):
+        self.id = uuid.uuid4().hex
+        self.priority = priority
+        self.fn = fn
+        self.meta = meta or {}
+        self.client = client
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.fetched = None
+        self._done = threading.Event()
+        self._waiters = []
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    async def wait_async(self, timeout: Optional[float] = None) -> bool:
+        """`wait` for the event loop: long-polls do not hold a threadpool thread."""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: done.done() or done.set_result(True))
+
+        with _waiters_lock:
+            if self._done.is_set():
+                return True
+            self._waiters.append(wake)
+        try:
+            await asyncio.wait({done}, timeout=timeout)
+        finally:
+            with _waiters_lock:
+                if wake in self._waiters:
+                    self._waiters.remove(wake)
+        return self._done.is_set()
+
+    def _finish(self):
+        with _waiters_lock:
+            self._done.set()
+            waiters, self._waiters = self._waiters, []
+        for wake in waiters:
+            try:
+                wake()
+            except RuntimeError:
+                pass  # the waiting request's event loop is gone
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {
+            "job_id": self.id,
+            "status": self.status,
+            "priority": PRIORITY_CLASSES[self.priority],
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            **self.meta,
+        }
+        if self.status == DONE:
+            # Typed results (e.g. AnalysisState) are held compactly and expanded on read
+            out["result"] = self.result.to_dict() if hasattr(self.result, "to_dict") else self.result
+        elif self.status == FAILED:
+            out["error"] = self.error
+        return out
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, aging_s: float = JOB_AGING_S,
+                 result_ttl: float = JOB_RESULT_TTL_S, fetched_ttl: float = JOB_FETCHED_TTL_S,
+                 max_queue: int = JOB_MAX_QUEUE, max_per_client: int = JOB_MAX_PER_CLIENT):
+        self.workers = workers
+        self.aging_s = aging_s
+        self.result_ttl = result_ttl
+        self.fetched_ttl = fetched_ttl
+        self.max_queue = max_queue
+        self.max_per_client = max_per_client
+        self._run_s = _INITIAL_RUN_S
+        self._heap = []
+        self._seq = itertools.count()
+        self._jobs: Dict[str, Job] = {}
+        self._cond = threading.Condition()
+        self._threads = []
+        self._depths = [0] * len(PRIORITY_CLASSES)
+
+    def _start(self):
+        # Workers are spawned on first submit
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, fn: Callable[[], Any], urgency: Optional[str] = None,
+               meta: Optional[Dict[str, Any]] = None, client: str = "") -> Job:
+        """Queue `fn`; raises JobRejected when the queue or the client's share is full."""
+        job = Job(fn, priority_class(urgency), meta, client)
+        key = job.submitted + job.priority * self.aging_s
+        with self._cond:
+            self._purge(job.submitted)
+            if self.max_queue and len(self._heap) >= self.max_queue:
+                metrics.inc("jobs_rejected", reason="queue_full")
+                raise JobRejected("queue_full", self.retry_after())
+            if client and self.max_per_client and self._outstanding(client) >= self.max_per_client:
+                metrics.inc("jobs_rejected", reason="client_limit")
+                raise JobRejected("client_limit", self.retry_after())
+            self._start()
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (key, next(self._seq), job))
+            self._depth_changed(job.priority, +1)
+            self._cond.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def mark_fetched(self, job: Job):
+        """A finished result was delivered: it no longer counts against the client and expires sooner."""
+        if job.finished and job.fetched is None:
+            job.fetched = time.time()
+
+    def retry_after(self) -> int:
+        """Seconds until the queued jobs are likely to have drained."""
+        return max(1, math.ceil(len(self._heap) * self._run_s / max(1, self.workers)))
+
+    def _outstanding(self, client: str) -> int:
+        # Called with the condition held
+        return sum(1 for j in self._jobs.values() if j.client == client and j.fetched is None)
+
+    def depth(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(zip(PRIORITY_CLASSES, self._depths))
+
+    def _depth_changed(self, priority: int, delta: int):
+        # Called with the condition held
+        self._depths[priority] += delta
+        metrics.set_gauge("job_queue_depth", self._depths[priority], priority=PRIORITY_CLASSES[priority])
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+                self._depth_changed(job.priority, -1)
+            cls = PRIORITY_CLASSES[job.priority]
+            job.started = time.time()
+            job.status = RUNNING
+            metrics.observe("job_wait_seconds", job.started - job.submitted, priority=cls)
+            try:
+                job.result = job.fn()
+                job.status = DONE
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+            job.finished = time.time()
+            job.fn = None
+            self._run_s += _EWMA_ALPHA * ((job.finished - job.started) - self._run_s)
+            metrics.observe("job_run_seconds", job.finished - job.started, priority=cls)
+            metrics.inc("jobs", priority=cls, outcome=job.status)
+            job._finish()
+
+    def _purge(self, now: float):
+        expired = [jid for jid, j in self._jobs.items()
+                   if j.finished and (now - j.finished > self.result_ttl
+                                      or (j.fetched and now - j.fetched > self.fetched_ttl))]
+        for jid in expired:
+            del self._jobs[jid]
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
@@ -0,0 +1,197 @@
+import re
+import zlib
+import datetime
+import functools
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# -------------------------------
+# Local re-ranker for PubMed candidates
+# -------------------------------
+# BM25 relevance of title + abstract + MeSH terms against the symptoms, top
+# differentials and patient context, boosted by recency and evidence level
+# (publication type). Runs on the whole candidate pool in a few milliseconds
+# so only the best k articles are sent to the summarizer.
+WEIGHTS = {
+    "bm25": 0.70,
+    "recency": 0.15,
+    "pubtype": 0.15,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Field repetition (BM25F-lite): titles and MeSH descriptors count extra
+TITLE_BOOST = 2
+MESH_BOOST = 2
+# Query term weights by source
+QUERY_WEIGHTS = {"differentials": 1.0, "symptoms": 1.0, "context": 0.5}
+# Recency: score halves every N years; unknown year scores as this value
+RECENCY_HALF_LIFE_YEARS = 8.0
+UNKNOWN_YEAR_SCORE = 0.3
+
+# Evidence level per PubMed publication type (best type of an article wins)
+PUBTYPE_SCORES = {
+    "meta-analysis": 1.0,
+    "systematic review": 0.95,
+    "practice guideline": 0.95,
+    "guideline": 0.9,
+    "randomized controlled trial": 0.85,
+    "clinical trial, phase iii": 0.8,
+    "clinical trial": 0.7,
+    "multicenter study": 0.6,
+    "review": 0.6,
+    "observational study": 0.5,
+    "comparative study": 0.5,
+    "journal article": 0.3,
+    "case reports": 0.2,
+    "letter": 0.05,
+    "comment": 0.05,
+    "editorial": 0.05,
+    "retracted publication": 0.0,
+}
+DEFAULT_PUBTYPE_SCORE = 0.3
+
+_STOPWORDS = {
+    "a", "an", "and", "or", "of", "the", "in", "on", "with", "without", "to", "for",
+    "by", "at", "from", "as", "is", "are", "was", "were", "be", "been", "this", "that",
+    "these", "we", "our", "not", "no", "than", "but", "which", "who", "after", "during",
+    "age", "male", "female", "patient", "patients", "history", "study", "results",
+    "methods", "conclusions", "background",
+}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Tokenized candidates kept per process; the same PubMed articles come back
+# for every paraphrase of a case, so each one is tokenized only once
+INDEX_CACHE_SIZE = 4096
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+def _differential_names(differentials: Sequence[Any]) -> List[str]:
+    names = []
+    for d in differentials or []:
+        if isinstance(d, dict):
+            names.append(d.get("name", ""))
+        elif isinstance(d, str):
+            names.append(d)
+    return names
+
+
+def _query_weights(symptoms: str, differentials: Sequence[Any], context: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for source, text in (("differentials", " ".join(_differential_names(differentials)[:3])),
+                         ("symptoms", symptoms), ("context", context)):
+        for term in _terms(text):
+            weights[term] = max(weights.get(term, 0.0), QUERY_WEIGHTS[source])
+    return weights
+
+
+def _document_terms(article: Dict[str, Any]) -> List[str]:
+    title = _terms(article.get("title", ""))
+    mesh = _terms(" ".join(article.get("mesh_terms") or []))
+    return title * TITLE_BOOST + mesh * MESH_BOOST + _terms(article.get("abstract", ""))
+
+
+def _term_ids(terms: Sequence[str]) -> np.ndarray:
+    # CRC32 ids: stable across processes and comparable without a shared vocabulary
+    return np.fromiter((zlib.crc32(t.encode()) for t in terms), dtype=np.uint32, count=len(terms))
+
+
+@functools.lru_cache(maxsize=INDEX_CACHE_SIZE)
+def _indexed(title: str, abstract: str, mesh: tuple) -> np.ndarray:
+    ids = _term_ids(_document_terms({"title": title, "abstract": abstract, "mesh_terms": mesh}))
+    ids.setflags(write=False)
+    return ids
+
+
+def document_ids(article: Dict[str, Any]) -> np.ndarray:
+    """Term ids of an article's title, MeSH terms and abstract (tokenized once per process)."""
+    return _indexed(article.get("title") or "", article.get("abstract") or "",
+                    tuple(article.get("mesh_terms") or ()))
+
+
+def bm25_scores(docs: List[Any], query: Dict[str, float]) -> np.ndarray:
+    """Weighted BM25 of each doc against the query, normalized to [0, 1].
+
+    Docs are token lists or term-id arrays from `document_ids`.
+    """
+    if not docs or not query:
+        return np.zeros(len(docs))
+    docs = [d if isinstance(d, np.ndarray) else _term_ids(d) for d in docs]
+    # Term frequencies of all docs at once: match every token against the
+    # sorted query ids, then count (doc, query term) pairs
+    q_ids = _term_ids(list(query))
+    order = np.argsort(q_ids)
+    sorted_q = q_ids[order]
+    doc_len = np.array([len(d) for d in docs])
+    tokens = np.concatenate(docs)
+    owner = np.repeat(np.arange(len(docs)), doc_len)
+    pos = np.minimum(np.searchsorted(sorted_q, tokens), len(sorted_q) - 1)
+    hit = sorted_q[pos] == tokens
+    counts = np.bincount(owner[hit] * len(query) + pos[hit], minlength=len(docs) * len(query))
+    tf = np.empty((len(docs), len(query)))
+    tf[:, order] = counts.reshape(len(docs), len(query))
+
+    doc_len = doc_len.astype(float)
+    avg_len = doc_len.mean() or 1.0
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((len(docs) - df + 0.5) / (df + 0.5))
+    q = np.fromiter(query.values(), dtype=float, count=len(query))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / avg_len)
+    scores = ((tf * (BM25_K1 + 1)) / (tf + norm[:, None])) @ (idf * q)
+    top = scores.max()
+    return scores / top if top > 0 else scores
+
+
+def _recency(year: Any, current_year: int) -> float:
+    try:
+        age = max(0, current_year - int(year))
+    except (TypeError, ValueError):
+        return UNKNOWN_YEAR_SCORE
+    return 0.5 ** (age / RECENCY_HALF_LIFE_YEARS)
+
+
+def _pubtype(types: Sequence[str]) -> float:
+    scores = [PUBTYPE_SCORES.get((t or "").lower(), DEFAULT_PUBTYPE_SCORE) for t in types or []]
+    if any(s == 0.0 for s in scores):
+        return 0.0  # retracted
+    return max(scores, default=DEFAULT_PUBTYPE_SCORE)
+
+
+def score_articles(articles: List[Dict[str, Any]], symptoms: str, differentials: Sequence[Any],
+                   context: str = "") -> List[Dict[str, Any]]:
+    """Return articles with component and combined scores, best first (ties keep PubMed order)."""
+    if not articles:
+        return []
+    current_year = datetime.date.today().year
+    bm25 = bm25_scores([document_ids(a) for a in articles], _query_weights(symptoms, differentials, context))
+    recency = np.array([_recency(a.get("year"), current_year) for a in articles])
+    pubtype = np.array([_pubtype(a.get("publication_types")) for a in articles])
+    total = WEIGHTS["bm25"] * bm25 + WEIGHTS["recency"] * recency + WEIGHTS["pubtype"] * pubtype
+    # Retracted papers never make the cut
+    total = np.where(pubtype == 0.0, -1.0, total)
+
+    order = sorted(range(len(articles)), key=lambda i: (-total[i], i))
+    return [
+        {
+            **articles[i],
+            "_components": {"bm25": round(float(bm25[i]), 4), "recency": round(float(recency[i]), 4),
+                            "pubtype": round(float(pubtype[i]), 4)},
+            "_score": round(float(total[i]), 4),
+        }
+        for i in order
+    ]
+
+
+def rank_articles(articles: List[Dict[str, Any]], symptoms: str, differentials: Sequence[Any],
+                  context: str = "", top_k: int = 3) -> List[Dict[str, Any]]:
+    """The top_k candidates for summarization, with `relevance` attached."""
+    ranked = [a for a in score_articles(articles, symptoms, differentials, context) if a["_score"] >= 0]
+    out = []
+    for a in ranked[:top_k]:
+        a = {k: v for k, v in a.items() if k != "_components"}
+        a["relevance"] = a.pop("_score")
+        out.append(a)
+    return out
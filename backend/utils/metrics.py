@@ -0,0 +1,110 @@
+import threading
+from collections import deque
+from typing import Dict, Tuple
+
+# -------------------------------
+# In-process metrics registry
+# -------------------------------
+# Counters, gauges and histograms keyed by (name, labels). Histograms keep
+# count/sum plus a bounded window of recent samples for quantiles.
+_HISTOGRAM_WINDOW = 1024
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_gauges: Dict[Tuple[str, Tuple], float] = {}
+_histograms: Dict[Tuple[str, Tuple], Dict] = {}
+
+
+def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = {"count": 0, "sum": 0.0, "window": deque(maxlen=_HISTOGRAM_WINDOW)}
+            _histograms[key] = hist
+        hist["count"] += 1
+        hist["sum"] += value
+        hist["window"].append(value)
+
+
+def count(name: str, **labels) -> int:
+    """Number of observations recorded for a histogram."""
+    with _lock:
+        hist = _histograms.get(_key(name, labels))
+        return hist["count"] if hist else 0
+
+
+def quantile(name: str, q: float, default: float = None, **labels):
+    """Quantile over the recent sample window of a histogram (None/default if empty)."""
+    with _lock:
+        hist = _histograms.get(_key(name, labels))
+        samples = sorted(hist["window"]) if hist else []
+    if not samples:
+        return default
+    idx = min(len(samples) - 1, max(0, int(round(q * (len(samples) - 1)))))
+    return samples[idx]
+
+
+def snapshot() -> Dict:
+    """JSON-friendly view of every metric."""
+    def fmt(key):
+        name, labels = key
+        return {"name": name, "labels": dict(labels)}
+
+    with _lock:
+        counters = [{**fmt(k), "value": v} for k, v in _counters.items()]
+        gauges = [{**fmt(k), "value": v} for k, v in _gauges.items()]
+        hists = [(k, h["count"], h["sum"], sorted(h["window"])) for k, h in _histograms.items()]
+
+    histograms = []
+    for key, count, total, samples in hists:
+        def q(p):
+            return samples[min(len(samples) - 1, int(round(p * (len(samples) - 1))))] if samples else 0.0
+        histograms.append({**fmt(key), "count": count, "sum": total, "p50": q(0.5), "p95": q(0.95), "p99": q(0.99)})
+    return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+
+def render_prometheus() -> str:
+    """Prometheus text exposition (histograms rendered as summaries)."""
+    def labels_str(labels: Dict[str, str], extra: Dict[str, str] = None) -> str:
+        items = {**labels, **(extra or {})}
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in items.items()) + "}"
+
+    snap = snapshot()
+    lines = []
+    for c in snap["counters"]:
+        lines.append(f"{c['name']}_total{labels_str(c['labels'])} {c['value']}")
+    for g in snap["gauges"]:
+        lines.append(f"{g['name']}{labels_str(g['labels'])} {g['value']}")
+    for h in snap["histograms"]:
+        for p in ("p50", "p95", "p99"):
+            quant = {"quantile": str(int(p[1:]) / 100)}
+            lines.append(f"{h['name']}{labels_str(h['labels'], quant)} {h[p]}")
+        lines.append(f"{h['name']}_count{labels_str(h['labels'])} {h['count']}")
+        lines.append(f"{h['name']}_sum{labels_str(h['labels'])} {h['sum']}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Clear all metrics (used by tests/benchmarks)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
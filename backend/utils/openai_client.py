@@ -1,18 +1,132 @@
 import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from backend.utils import cassette, metrics
+from backend.utils.deadline import with_timeout
+from backend.utils.shared_cache import get_cache, make_key, LLM_CACHE_TTL_S
+
+# Heavy SDKs (openai, langchain, langchain_openai) are imported on first use so
+# that importing the API server – and spawning workers – stays fast.
 
 load_dotenv()
 _client = None
+_chat_llms = {}
+_lock = threading.Lock()
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Tokens spent by LLM calls in the current context (see `metered_tokens`)
+_token_meter = contextvars.ContextVar("llm_token_meter", default=None)
+# Worker threads running in copies of the context add to the same meter
+_token_meter_lock = threading.Lock()
 
 def get_openai():
     global _client
     if _client is None:
+        from openai import OpenAI
         api_key = os.getenv("OPENROUTER_API_KEY")  # ✅ use OpenRouter key
         if not api_key:
             raise RuntimeError("OPENROUTER_API_KEY missing in .env")
         _client = OpenAI(
             api_key=api_key,
-            base_url="https://openrouter.ai/api/v1"  # ✅ force OpenRouter endpoint
+            base_url=OPENROUTER_BASE_URL  # ✅ force OpenRouter endpoint
         )
     return _client
+
+def get_chat_llm(temperature: float, model: str = DEFAULT_MODEL):
+    """Shared LangChain ChatOpenAI client per (model, temperature), built on first use."""
+    key = (model, temperature)
+    if key not in _chat_llms:
+        with _lock:
+            if key not in _chat_llms:
+                from langchain_openai import ChatOpenAI
+                _chat_llms[key] = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    api_key=os.getenv("OPENROUTER_API_KEY"),   # ✅ OpenRouter key
+                    base_url=OPENROUTER_BASE_URL
+                )
+    return _chat_llms[key]
+
+class LazyPrompt:
+    """ChatPromptTemplate compiled on first use; supports `prompt | llm` like the real one."""
+
+    def __init__(self, messages):
+        self._messages = messages
+        self._prompt = None
+
+    def get(self):
+        if self._prompt is None:
+            from langchain.prompts import ChatPromptTemplate
+            self._prompt = ChatPromptTemplate.from_messages(self._messages)
+        return self._prompt
+
+    def __or__(self, other):
+        return self.get() | other
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+def invoke_llm(prompt, temperature: float, inputs: dict, timeout: float = None,
+               validate=None, model: str = DEFAULT_MODEL) -> str:
+    """Run `prompt | llm` and return the stripped reply text, shared-cached across workers.
+
+    The cache key covers the rendered messages, model and temperature. Only
+    replies passing `validate(text)` are stored, so a malformed answer is
+    retried on the next request instead of being replayed.
+    """
+    if isinstance(prompt, LazyPrompt):
+        prompt = prompt.get()
+    messages = prompt.format_messages(**inputs)
+    key = make_key(model, temperature, [(m.type, m.content) for m in messages])
+    # Same agent prompt regardless of the case: used to replay anonymized traffic
+    family = make_key(model, temperature, messages[0].content if messages else "")
+    if cassette.replaying():
+        return cassette.get_cassette().replay_llm(key, family)
+    cache = get_cache()
+    hit = cache.get("llm", key)
+    if hit is not None:
+        return hit.decode("utf-8")
+
+    llm = with_timeout(get_chat_llm(temperature, model), timeout)
+    start = time.monotonic()
+    reply = llm.invoke(messages)
+    content = (reply.content or "").strip()
+    _count_tokens(messages, reply, model)
+    if cassette.recording():
+        cassette.get_cassette().record_llm(key, family, model, content, time.monotonic() - start)
+    try:
+        ok = validate is None or bool(validate(content))
+    except Exception:
+        ok = False
+    if ok:
+        cache.set("llm", key, content.encode("utf-8"), LLM_CACHE_TTL_S)
+    return content
+
+def _count_tokens(messages, reply, model: str):
+    usage = getattr(reply, "usage_metadata", None) or {}
+    tokens = usage.get("total_tokens")
+    if not tokens:
+        # No usage reported: ~4 characters per token
+        chars = sum(len(str(m.content)) for m in messages) + len(str(reply.content or ""))
+        tokens = chars // 4 + 1
+    metrics.inc("llm_tokens", tokens, model=model)
+    meter = _token_meter.get()
+    if meter is not None:
+        with _token_meter_lock:
+            meter[0] += tokens
+
+@contextmanager
+def metered_tokens():
+    """Count the tokens of LLM calls (cache misses) made inside the block: `with metered_tokens() as spent: ...; spent[0]`."""
+    meter = [0]
+    token = _token_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _token_meter.reset(token)
@@ -1,17 +1,149 @@
+import os
+import hashlib
+import tempfile
+import threading
 from fpdf import FPDF
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 from datetime import datetime
 
+# -------------------------------
+# Output mode and fonts
+# -------------------------------
+# PDF_OUTPUT_MODE=auto (default) picks per document: reports whose text is all
+# Latin-1 (after the typographic fallbacks below) use "core", the rest "unicode".
+# "unicode" embeds a Unicode TrueType font – PDF_FONT_PATH / PDF_FONT_BOLD_PATH,
+# else DejaVu Sans from the system – subset to the glyphs the report actually
+# uses, so non-Latin patient text prints as written. The font is first stripped
+# of hinting and OpenType layout tables (PDF text here uses neither) and cached
+# in PDF_FONT_CACHE_DIR, which roughly halves each embedded subset.
+# "core" (or no font found) keeps the built-in Helvetica: nothing embedded, but
+# Latin-1 only. Content streams are Flate-compressed in both modes, and the page
+# header/footer use the body's fonts, so all pages share one resource dictionary
+# and no font is embedded just for them. Compare with `python -m backend.bench_pdf`.
+PDF_OUTPUT_MODE = os.getenv("PDF_OUTPUT_MODE", "auto").lower()
+PDF_FONT_PATH = os.getenv("PDF_FONT_PATH", "")
+PDF_FONT_BOLD_PATH = os.getenv("PDF_FONT_BOLD_PATH", "")
+PDF_FONT_CACHE_DIR = os.getenv("PDF_FONT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "medical-pdf-fonts"))
+
+UNICODE_FAMILY = "report"
+CORE_FAMILY = "helvetica"
+# (regular, bold) searched in order when PDF_FONT_PATH is unset
+_SYSTEM_FONTS = [
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/dejavu/DejaVuSans.ttf", "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/TTF/DejaVuSans.ttf", "/usr/share/fonts/TTF/DejaVuSans-Bold.ttf"),
+    ("/Library/Fonts/Arial Unicode.ttf", "/Library/Fonts/Arial Unicode.ttf"),
+]
+# Bump when the preparation below changes, so cached fonts are rebuilt
+_LEAN_FONT_VERSION = 1
+# Tables the subset never needs: hinting bytecode, device metrics, layout features
+_DROPPED_TABLES = ["GSUB", "GPOS", "GDEF", "kern", "hdmx", "LTSH", "VDMX", "gasp", "FFTM", "MATH", "meta"]
+# Typographic characters mapped to Latin-1 in core mode (anything else becomes "?")
+_CORE_FALLBACKS = str.maketrans({
+    "\u2013": "-", "\u2014": "-", "\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"',
+    "\u2022": "-", "\u2026": "...", "\u2264": "<=", "\u2265": ">=", "\u2192": "->", "\u2011": "-",
+})
+
+
+def needs_unicode(value: Any) -> bool:
+    """True if any text in a report payload has characters core fonts cannot print."""
+    if isinstance(value, dict):
+        return any(needs_unicode(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(needs_unicode(v) for v in value)
+    if isinstance(value, str):
+        return not value.isascii() and max(value.translate(_CORE_FALLBACKS)) > "\xff"
+    return False
+
+
+def _font_files() -> Optional[Tuple[str, str]]:
+    if PDF_FONT_PATH:
+        return PDF_FONT_PATH, PDF_FONT_BOLD_PATH or PDF_FONT_PATH
+    for regular, bold in _SYSTEM_FONTS:
+        if os.path.exists(regular):
+            return regular, bold if os.path.exists(bold) else regular
+    return None
+
+
+def _lean_font(path: str) -> str:
+    """Copy of the font without hinting or layout tables (cached on disk; the original if that fails)."""
+    stat = os.stat(path)
+    key = f"{path}:{stat.st_size}:{stat.st_mtime_ns}:{_LEAN_FONT_VERSION}"
+    digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    lean = os.path.join(PDF_FONT_CACHE_DIR, f"{stem}-{digest}.ttf")
+    if os.path.exists(lean):
+        return lean
+    try:
+        from fontTools import subset, ttLib
+        font = ttLib.TTFont(path)
+        # Glyph names stay: without them fontTools rebuilds them from the cmap on every load
+        options = subset.Options(hinting=False, glyph_names=True, layout_features=[], notdef_outline=True,
+                                 recommended_glyphs=True)
+        options.drop_tables += _DROPPED_TABLES
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(unicodes=font.getBestCmap().keys())
+        subsetter.subset(font)
+        os.makedirs(PDF_FONT_CACHE_DIR, exist_ok=True)
+        # Written under a unique name and renamed, so concurrent workers never read a partial file
+        tmp = f"{lean}.{os.getpid()}.{threading.get_ident()}"
+        font.save(tmp)
+        os.replace(tmp, lean)
+        return lean
+    except Exception as e:
+        print(f"❌ PDF font preparation error ({path}): {e}")
+        return path
+
+
+_unicode_fonts: Optional[Tuple[str, str]] = None
+_unicode_fonts_lock = threading.Lock()
+
+
+def get_unicode_fonts() -> Optional[Tuple[str, str]]:
+    """(regular, bold) font files for unicode mode, prepared once per process; None when no font is found."""
+    global _unicode_fonts
+    if _unicode_fonts is None:
+        with _unicode_fonts_lock:
+            if _unicode_fonts is None:
+                files = _font_files()
+                if files is None:
+                    print("❌ No Unicode TTF font found (set PDF_FONT_PATH); PDFs use core fonts")
+                    _unicode_fonts = ()
+                else:
+                    lean = {f: _lean_font(f) for f in set(files)}
+                    _unicode_fonts = (lean[files[0]], lean[files[1]])
+    return _unicode_fonts or None
+
+
+def report_timestamp() -> str:
+    """The time printed in report headers (minute resolution; part of a cached report's key)."""
+    return datetime.now().strftime('%Y-%m-%d %H:%M')
+
+
 class PDF(FPDF):
+    def __init__(self, mode: str = PDF_OUTPUT_MODE, fonts: Optional[Tuple[str, str]] = None,
+                 generated_at: Optional[str] = None):
+        super().__init__()
+        # Flate-compress page content streams (fpdf2 default, stated so it is not lost)
+        self.set_compression(True)
+        fonts = fonts or (get_unicode_fonts() if mode in ("unicode", "auto") else None)
+        self.unicode = bool(fonts)
+        if fonts:
+            # fpdf2 embeds only the glyphs used when the document is output
+            self.add_font(UNICODE_FAMILY, '', fonts[0])
+            self.add_font(UNICODE_FAMILY, 'B', fonts[1])
+        self.report_font = UNICODE_FAMILY if fonts else CORE_FAMILY
+        # One timestamp for every page header
+        self.generated_at = generated_at or report_timestamp()
+
     def header(self):
         # Title on left (accent color) and timestamp on right
-        self.set_font('Arial', 'B', 14)
+        self.set_font(self.report_font, 'B', 14)
         self.set_text_color(33, 150, 243)  # blue
         self.cell(0, 10, 'Medical Analysis Report', 0, 0, 'L')
         self.set_text_color(0, 0, 0)
-        self.set_font('Arial', '', 9)
-        now = datetime.now().strftime('%Y-%m-%d %H:%M')
-        self.cell(0, 10, now, 0, 1, 'R')
+        self.set_font(self.report_font, '', 9)
+        self.cell(0, 10, self.generated_at, 0, 1, 'R')
         # Divider line
         self.set_draw_color(220, 220, 220)
         y = self.get_y()
@@ -23,18 +155,21 @@ class PDF(FPDF):
         self.set_fill_color(245, 247, 250)
         self.set_draw_color(220, 220, 220)
         self.set_text_color(33, 33, 33)
-        self.set_font('Arial', 'B', 12)
+        self.set_font(self.report_font, 'B', 12)
         self.cell(0, 8, title, 0, 1, 'L', fill=True)
         self.ln(2)
 
     def chapter_body(self, body):
-        self.set_font('Arial', '', 10)
+        self.set_font(self.report_font, '', 10)
         self.multi_cell(self._content_width(), 5, body)
         self.ln()
 
     def _safe_string(self, value: Any, max_token_len: int = 60) -> str:
         # Convert any value to a printable string
         s = "" if value is None else str(value)
+        if not self.unicode:
+            # Core fonts only cover Latin-1
+            s = s.translate(_CORE_FALLBACKS).encode('latin-1', 'replace').decode('latin-1')
         # Break very long tokens (no spaces) to avoid FPDF width errors
         parts = []
         for token in s.split():
@@ -64,30 +199,32 @@ class PDF(FPDF):
         return " ".join([s[i:i+size] for i in range(0, len(s), size)])
 
     def _multi_cell_safe(self, w: float, h: float, txt: str):
+        # Next line starts at the left margin (fpdf2 otherwise continues right of the cell)
+        next_line = {'new_x': 'LMARGIN', 'new_y': 'NEXT'}
         try:
-            self.multi_cell(max(w, 10), h, txt)
+            self.multi_cell(max(w, 10), h, txt, **next_line)
         except Exception:
             # Retry with smaller font
             current_family = self.font_family
             current_style = self.font_style
             current_size_pt = self.font_size_pt
             try:
-                self.set_font(current_family or 'Arial', current_style, max(current_size_pt - 2, 6))
-                self.multi_cell(max(w, 10), h, txt)
+                self.set_font(current_family or self.report_font, current_style, max(current_size_pt - 2, 6))
+                self.multi_cell(max(w, 10), h, txt, **next_line)
             except Exception:
                 # Force chunk the text to add breakpoints
                 safe_txt = self._force_chunk(txt, 20)
-                self.set_font(current_family or 'Arial', current_style, max(current_size_pt - 2, 6))
-                self.multi_cell(max(w, 10), h, safe_txt)
+                self.set_font(current_family or self.report_font, current_style, max(current_size_pt - 2, 6))
+                self.multi_cell(max(w, 10), h, safe_txt, **next_line)
 
     def _label_value_row(self, label: str, value: str):
         # Render a two-column label/value row
         label_w = min(45, self._content_width() * 0.35)
         value_w = self._content_width() - label_w
-        self.set_font('Arial', 'B', 10)
+        self.set_font(self.report_font, 'B', 10)
         self.set_text_color(90, 90, 90)
         self.cell(label_w, 6, self._safe_string(label), 0, 0)
-        self.set_font('Arial', '', 10)
+        self.set_font(self.report_font, '', 10)
         self.set_text_color(0, 0, 0)
         # Use multi-cell for values to wrap
         x, y = self.get_x(), self.get_y()
@@ -117,10 +254,10 @@ class PDF(FPDF):
         if isinstance(data, dict):
             for key, value in data.items():
                 if isinstance(value, list):
-                    self.set_font('Arial', 'B', 10)
+                    self.set_font(self.report_font, 'B', 10)
                     self.cell(0, 5, f"{key}:")
                     self.ln()
-                    self.set_font('Arial', '', 10)
+                    self.set_font(self.report_font, '', 10)
                     for item in value:
                         if isinstance(item, dict):
                             item_str = ', '.join([f"{k}: {self._safe_string(v)}" for k, v in item.items()])
@@ -128,10 +265,10 @@ class PDF(FPDF):
                         else:
                             self._multi_cell_safe(self._content_width(), 5, f"  - {self._safe_string(item)}")
                 else:
-                    self.set_font('Arial', 'B', 10)
+                    self.set_font(self.report_font, 'B', 10)
                     self.cell(0, 5, f"{key}:")
                     self.ln()
-                    self.set_font('Arial', '', 10)
+                    self.set_font(self.report_font, '', 10)
                     self._multi_cell_safe(self._content_width(), 5, self._safe_string(value))
                 self.ln(2)
         elif isinstance(data, str):
@@ -139,16 +276,15 @@ class PDF(FPDF):
         self.ln(5)
 
     def footer(self):
-        # Page number
+        # Page number (regular face: no font embedded for the footer alone)
         self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
+        self.set_font(self.report_font, '', 8)
         self.set_text_color(120, 120, 120)
         self.cell(0, 10, f"Page {self.page_no()}/{{nb}}", 0, 0, 'C')
         self.set_text_color(0, 0, 0)
 
 
-def generate_pdf_from_analysis(analysis_data: dict) -> bytes:
-    pdf = PDF()
+def build_report(pdf: PDF, analysis_data: dict) -> PDF:
     pdf.add_page()
     pdf.alias_nb_pages()
 
@@ -171,8 +307,15 @@ def generate_pdf_from_analysis(analysis_data: dict) -> bytes:
 
     if 'summary' in analysis_data:
         pdf.add_analysis_section('Final Summary', analysis_data['summary'])
+    return pdf
+
 
-    out = pdf.output(dest='S')
+def generate_pdf_from_analysis(analysis_data: dict, mode: str = PDF_OUTPUT_MODE,
+                               generated_at: Optional[str] = None) -> bytes:
+    if mode == "auto":
+        # Embedding a font subset only pays off when the report needs it
+        mode = "unicode" if needs_unicode(analysis_data) else "core"
+    out = build_report(PDF(mode, generated_at=generated_at), analysis_data).output()
     # fpdf2 may return str, bytes, or bytearray depending on version
     if isinstance(out, (bytes, bytearray)):
         return bytes(out)
@@ -0,0 +1,74 @@
+import os
+import stat
+import sqlite3
+import getpass
+
+# -------------------------------
+# Private on-disk stores
+# -------------------------------
+# The SQLite stores (shared cache, run checkpoints, case history) and traffic
+# cassettes hold patient inputs and model outputs. They live in world-readable locations (/dev/shm,
+# the temp dir), so by default they go in a per-user 0700 directory, and the
+# database file is created 0600 together with its -wal / -shm / -journal files.
+_SIDE_FILES = ("-wal", "-shm", "-journal")
+
+
+def _owner() -> str:
+    return str(os.getuid()) if hasattr(os, "getuid") else getpass.getuser()
+
+
+def private_path(base: str, name: str) -> str:
+    """Default location `base/gdhs-<uid>/name` of a per-user data file."""
+    return os.path.join(base, f"gdhs-{_owner()}", name)
+
+
+def _ensure_private_dir(path: str):
+    if not os.path.isdir(path):
+        os.makedirs(path, mode=0o700, exist_ok=True)
+    # Only the per-user directories are forced private; a configured parent is left as is
+    if os.path.basename(path) != f"gdhs-{_owner()}":
+        return
+    st = os.lstat(path)
+    if stat.S_ISLNK(st.st_mode) or (hasattr(os, "getuid") and st.st_uid != os.getuid()):
+        raise PermissionError(f"{path} is not a directory owned by this user")
+    if st.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+
+def _restrict(path: str, create: bool = True):
+    """Create `path` as 0600 if missing (`create`); tighten it if it is ours and wider."""
+    flags = os.O_RDWR | (os.O_CREAT if create else 0) | getattr(os, "O_NOFOLLOW", 0)
+    try:
+        fd = os.open(path, flags, 0o600)
+    except FileNotFoundError:
+        if create:
+            raise
+        return
+    try:
+        st = os.fstat(fd)
+        if st.st_mode & 0o077 and (not hasattr(os, "getuid") or st.st_uid == os.getuid()):
+            os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+
+
+def open_private(path: str, mode: str = "ab"):
+    """`open` a file readable only by this user (see module comment)."""
+    _ensure_private_dir(os.path.dirname(os.path.abspath(path)))
+    _restrict(path)
+    return open(path, mode)
+
+
+def connect_private(path: str, **kwargs) -> sqlite3.Connection:
+    """`sqlite3.connect` to a database readable only by this user (see module comment)."""
+    _ensure_private_dir(os.path.dirname(os.path.abspath(path)))
+    _restrict(path)
+    for suffix in _SIDE_FILES:
+        _restrict(path + suffix, create=False)
+    # SQLite creates the side files with the database's mode; tighten whatever it
+    # made anyway (the process umask is global, so it is not changed here)
+    conn = sqlite3.connect(path, **kwargs)
+    conn.execute("PRAGMA journal_mode=WAL")
+    for suffix in _SIDE_FILES:
+        _restrict(path + suffix, create=False)
+    return conn
@@ -0,0 +1,235 @@
+import os
+import abc
+import sys
+import hmac
+import time
+import threading
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backend.utils import metrics
+
+# -------------------------------
+# Sampling profiler
+# -------------------------------
+# Stack sampling via sys._current_frames(): a sampler thread wakes every
+# interval, walks the Python stacks of the target threads and counts them in
+# collapsed-stack form ("outer;inner;leaf count", one line per stack), ready
+# for flamegraph.pl / speedscope. Nothing is traced, so the profiled code runs
+# at full speed; overhead is one stack walk per sample.
+#
+# Two modes:
+# - per request: `X-Profile-Token: $PROFILING_TOKEN` on /analyze or
+#   /generate-pdf samples that request at PROFILE_SAMPLE_INTERVAL_MS and stores
+#   the profile under the `X-Profile-Id` response header (GET /profiles/{id}).
+# - rolling: with PROFILE_ROLLING_INTERVAL_MS > 0, a low-rate sampler covers
+#   every thread of the worker and keeps PROFILE_ROLLING_WINDOW_S of per-second
+#   buckets (GET /profile?seconds=60).
+#
+# Samples taken while the thread was off CPU (waiting on PubMed, the LLM or a
+# lock) end in a `[wait]` frame, so CPU time and I/O wait separate in the
+# graph; the rolling profiler keeps only on-CPU samples.
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")  # unset: profiling endpoints and headers are disabled
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_ROLLING_INTERVAL_MS = float(os.getenv("PROFILE_ROLLING_INTERVAL_MS", "0"))  # 0 disables; 100 ≈ 10 Hz
+PROFILE_ROLLING_WINDOW_S = int(os.getenv("PROFILE_ROLLING_WINDOW_S", "300"))
+PROFILE_TTL_S = float(os.getenv("PROFILE_TTL_S", "3600"))
+# Frames kept per stack (innermost first) and distinct stacks kept per profile
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "96"))
+PROFILE_MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", "5000"))
+
+WAIT_FRAME = "[wait]"
+TRUNCATED_FRAME = "[truncated]"
+OTHER_STACK = "[other]"
+# Share of the interval a thread must spend on CPU for a sample to count as on-CPU
+_ON_CPU_FRACTION = 0.05
+
+# Idents of running sampler threads, never sampled themselves
+_sampler_threads = set()
+
+
+def authorized(token: Optional[str]) -> bool:
+    """True when profiling is enabled and `token` matches PROFILING_TOKEN."""
+    return bool(PROFILING_TOKEN) and bool(token) and hmac.compare_digest(token, PROFILING_TOKEN)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_name}"
+
+
+def collapse(frame, max_depth: int = PROFILE_MAX_DEPTH) -> List[str]:
+    """Frame names of a stack, outermost first."""
+    names = []
+    while frame is not None and len(names) < max_depth:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    if frame is not None:
+        names.append(TRUNCATED_FRAME)
+    names.reverse()
+    return names
+
+
+def _cpu_clock(ident: int) -> Optional[int]:
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        return None
+
+
+class StackCounter:
+    """Collapsed stacks → sample counts, bounded to `max_stacks` distinct stacks."""
+
+    def __init__(self, max_stacks: int = PROFILE_MAX_STACKS):
+        self.max_stacks = max_stacks
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def add(self, stack: str, n: int = 1):
+        if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+            stack = OTHER_STACK
+        self.stacks[stack] += n
+        self.samples += n
+
+    def merge(self, other: "StackCounter"):
+        for stack, n in other.stacks.items():
+            self.add(stack, n)
+
+    def render(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+class Sampler(abc.ABC):
+    """Background thread sampling the stacks of `threads` (None: every thread but the samplers).
+
+    Subclasses implement `record` to keep the samples.
+    """
+
+    def __init__(self, interval_s: float, threads: Optional[Iterable[int]] = None, cpu_only: bool = False):
+        self.interval_s = interval_s
+        self.threads = set(threads) if threads is not None else None
+        self.cpu_only = cpu_only
+        self._cpu: Dict[int, Tuple[Optional[int], float]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "Sampler":
+        self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _on_cpu(self, ident: int) -> Optional[bool]:
+        """Whether the thread used CPU since its last sample (None when unknown)."""
+        clock, last = self._cpu.get(ident) or (_cpu_clock(ident), None)
+        if clock is None:
+            return None
+        try:
+            now = time.clock_gettime(clock)
+        except OSError:
+            return None
+        self._cpu[ident] = (clock, now)
+        return last is None or now - last > self.interval_s * _ON_CPU_FRACTION
+
+    def sample(self) -> List[str]:
+        """One collapsed stack per target thread."""
+        frames = sys._current_frames()
+        for ident in [i for i in self._cpu if i not in frames]:
+            del self._cpu[ident]  # thread exited
+        stacks = []
+        for ident, frame in frames.items():
+            if ident in _sampler_threads or (self.threads is not None and ident not in self.threads):
+                continue
+            names = collapse(frame)
+            on_cpu = self._on_cpu(ident)
+            if on_cpu is False:
+                if self.cpu_only:
+                    continue
+                names.append(WAIT_FRAME)
+            stacks.append(";".join(names))
+        return stacks
+
+    @abc.abstractmethod
+    def record(self, stacks: List[str]):
+        """Keep one round of samples (called from the sampler thread)."""
+
+    def _loop(self):
+        _sampler_threads.add(threading.get_ident())
+        try:
+            while not self._stop.wait(self.interval_s):
+                start = time.perf_counter()
+                self.record(self.sample())
+                metrics.observe("profiler_sample_seconds", time.perf_counter() - start)
+        finally:
+            _sampler_threads.discard(threading.get_ident())
+
+
+class RequestProfile(Sampler):
+    """Profile of one request: its handler thread (or every thread) until `stop()`."""
+
+    def __init__(self, threads: Optional[Iterable[int]] = None, interval_s: float = PROFILE_SAMPLE_INTERVAL_MS / 1000):
+        super().__init__(interval_s, threads)
+        self.counter = StackCounter()
+        self.started = time.monotonic()
+        self.duration_s = 0.0
+
+    def record(self, stacks: List[str]):
+        for stack in stacks:
+            self.counter.add(stack)
+
+    def stop(self):
+        super().stop()
+        self.duration_s = time.monotonic() - self.started
+
+    def render(self) -> str:
+        return self.counter.render()
+
+
+class RollingProfiler(Sampler):
+    """Process-wide on-CPU profile over the last `window_s` seconds, in one-second buckets."""
+
+    def __init__(self, interval_s: float = PROFILE_ROLLING_INTERVAL_MS / 1000, window_s: int = PROFILE_ROLLING_WINDOW_S):
+        super().__init__(interval_s, cpu_only=True)
+        self.window_s = window_s
+        self._buckets: deque = deque()  # (second, StackCounter)
+        self._lock = threading.Lock()
+
+    def record(self, stacks: List[str]):
+        second = int(time.time())
+        with self._lock:
+            if not self._buckets or self._buckets[-1][0] != second:
+                self._buckets.append((second, StackCounter()))
+            counter = self._buckets[-1][1]
+            for stack in stacks:
+                counter.add(stack)
+            while self._buckets and self._buckets[0][0] <= second - self.window_s:
+                self._buckets.popleft()
+
+    def profile(self, seconds: float = None) -> StackCounter:
+        since = time.time() - min(seconds or self.window_s, self.window_s)
+        merged = StackCounter()
+        with self._lock:
+            for second, counter in self._buckets:
+                if second >= since:
+                    merged.merge(counter)
+        return merged
+
+
+_rolling = None
+_rolling_lock = threading.Lock()
+
+
+def get_rolling_profiler() -> Optional[RollingProfiler]:
+    """The worker's rolling profiler, started on first use (None when disabled)."""
+    global _rolling
+    if PROFILE_ROLLING_INTERVAL_MS <= 0:
+        return None
+    if _rolling is None:
+        with _rolling_lock:
+            if _rolling is None:
+                _rolling = RollingProfiler().start()
+    return _rolling
@@ -0,0 +1,257 @@
+import io
+import os
+import time
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+from xml.etree import ElementTree as ET
+
+from dotenv import load_dotenv
+
+from backend.utils import metrics
+from backend.utils.http_client import http_get
+
+load_dotenv()
+
+PUBMED_SEARCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+PUBMED_FETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+
+# NCBI allows 3 req/s without an API key and 10 req/s with one
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+DEFAULT_RATE = 10.0 if NCBI_API_KEY else 3.0
+
+
+# -------------------------------
+# Token bucket (blocking)
+# -------------------------------
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Block until a token is available; returns seconds spent waiting."""
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - start
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available right now."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+# -------------------------------
+# efetch XML parsing (streaming)
+# -------------------------------
+# iterparse over the raw byte stream: each <PubmedArticle> is turned into a
+# dict as soon as it is complete and then cleared, so memory stays bounded by
+# one article rather than the whole 50–200 article payload.
+def _text(elem) -> str:
+    # itertext keeps inline markup such as <i>, <sup> in titles and abstracts
+    return "".join(elem.itertext()).strip() if elem is not None else ""
+
+
+def _year(article) -> Optional[int]:
+    for path in (".//JournalIssue/PubDate/Year", ".//ArticleDate/Year", ".//JournalIssue/PubDate/MedlineDate"):
+        value = article.findtext(path)
+        if value and value[:4].isdigit():
+            return int(value[:4])
+    return None
+
+
+def _article_dict(article) -> Dict[str, Any]:
+    sections = []
+    for ab in article.iterfind(".//Abstract/AbstractText"):
+        text = _text(ab)
+        if text:
+            sections.append({"label": ab.get("Label") or ab.get("NlmCategory") or "", "text": text})
+    abstract = " ".join(f"{s['label']}: {s['text']}" if s["label"] else s["text"] for s in sections)
+    return {
+        "pmid": article.findtext("MedlineCitation/PMID") or article.findtext(".//PMID"),
+        "title": _text(article.find(".//ArticleTitle")) or "No title",
+        "abstract": abstract,
+        "abstract_sections": sections,
+        "mesh_terms": [_text(d) for d in article.iterfind(".//MeshHeadingList/MeshHeading/DescriptorName")],
+        "publication_types": [_text(t) for t in article.iterfind(".//PublicationTypeList/PublicationType")],
+        "year": _year(article),
+    }
+
+
+def iter_efetch_articles(source) -> Iterator[Dict[str, Any]]:
+    """Yield article dicts from an efetch XML byte stream (file-like) or bytes."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    root = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if root is None:
+            root = elem
+        if event == "end" and elem.tag == "PubmedArticle":
+            yield _article_dict(elem)
+            elem.clear()
+            # Drop the finished article from the root as well
+            root.clear()
+
+
+def parse_efetch_xml(source) -> List[Dict[str, Any]]:
+    return list(iter_efetch_articles(source))
+
+
+class FetchTimeout(TimeoutError):
+    """A caller's efetch batch did not complete within its wait bound."""
+
+
+class _FetchRequest:
+    __slots__ = ("pmids", "enqueued", "done", "articles")
+
+    def __init__(self, pmids: List[str]):
+        self.pmids = pmids
+        self.enqueued = time.monotonic()
+        self.done = threading.Event()
+        self.articles: Dict[str, Dict[str, str]] = {}
+
+
+# -------------------------------
+# Process-wide PubMed scheduler
+# -------------------------------
+class PubMedScheduler:
+    """Rate-limited access to NCBI E-utilities shared by all requests in the process.
+
+    esearch calls are paced by the token bucket. efetch calls from concurrent
+    callers arriving within `batch_window` seconds are merged into a single
+    multi-ID request; each caller only gets back the articles it asked for.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, batch_window: float = 0.05,
+                 max_batch_ids: int = 200, timeout: float = 10):
+        self.bucket = TokenBucket(rate)
+        self.batch_window = batch_window
+        self.max_batch_ids = max_batch_ids
+        self.timeout = timeout
+        self._pending: List[_FetchRequest] = []
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+    def _params(self, **params) -> Dict[str, str]:
+        if NCBI_API_KEY:
+            params["api_key"] = NCBI_API_KEY
+        return params
+
+    def search(self, query: str, max_results: int = 3, timeout: Optional[float] = None) -> List[str]:
+        waited = self.bucket.acquire()
+        metrics.observe("pubmed_queue_wait_seconds", waited, op="esearch")
+        params = self._params(db="pubmed", term=query, retmode="json", retmax=max_results)
+        # Hedged duplicates must also fit within the NCBI rate limit
+        resp = http_get("pubmed", PUBMED_SEARCH_URL, params=params, timeout=timeout or self.timeout,
+                        hedge_gate=self.bucket.try_acquire)
+        resp.raise_for_status()
+        metrics.inc("pubmed_requests", op="esearch")
+        return resp.json().get("esearchresult", {}).get("idlist", [])
+
+    def fetch(self, pmids: List[str], timeout: Optional[float] = None) -> Dict[str, Dict[str, str]]:
+        """Fetch articles by PMID, possibly merged with other callers' requests.
+
+        `timeout` bounds how long this caller waits (FetchTimeout when it runs
+        out); the shared batch keeps running.
+        """
+        if not pmids:
+            return {}
+        req = _FetchRequest(list(dict.fromkeys(pmids)))
+        with self._cond:
+            self._pending.append(req)
+            self._ensure_worker()
+            self._cond.notify()
+        # Generous bound: batch window + rate-limit wait + HTTP timeout
+        if not req.done.wait(timeout or self.timeout * 3):
+            metrics.inc("pubmed_fetch_timeouts")
+            raise FetchTimeout(f"PubMed fetch of {len(req.pmids)} PMIDs timed out waiting for its batch")
+        return req.articles
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="pubmed-scheduler", daemon=True)
+            self._worker.start()
+
+    def _take_batch(self) -> List[_FetchRequest]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+        # Let concurrent analyses join the batch
+        time.sleep(self.batch_window)
+        with self._cond:
+            batch, ids = [], set()
+            while self._pending:
+                nxt = self._pending[0]
+                new_ids = ids.union(nxt.pmids)
+                if batch and len(new_ids) > self.max_batch_ids:
+                    break
+                batch.append(self._pending.pop(0))
+                ids = new_ids
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self._dispatch(batch)
+            except Exception as e:
+                print(f"❌ PubMed fetch error: {e}")
+            finally:
+                for req in batch:
+                    req.done.set()
+
+    def _dispatch(self, batch: List[_FetchRequest]):
+        ids = list(dict.fromkeys(pmid for req in batch for pmid in req.pmids))
+        self.bucket.acquire()
+        now = time.monotonic()
+        for req in batch:
+            metrics.observe("pubmed_queue_wait_seconds", now - req.enqueued, op="efetch")
+        metrics.observe("pubmed_batch_size", len(ids), unit="pmids")
+        metrics.observe("pubmed_batch_size", len(batch), unit="callers")
+
+        params = self._params(db="pubmed", id=",".join(ids), retmode="xml")
+        resp = http_get("pubmed", PUBMED_FETCH_URL, params=params, timeout=self.timeout,
+                        hedge_gate=self.bucket.try_acquire, stream=True)
+        try:
+            resp.raise_for_status()
+            metrics.inc("pubmed_requests", op="efetch")
+            # Parse straight off the socket (gzip decoded by urllib3) instead of buffering the body
+            if hasattr(resp.raw, "decode_content"):
+                resp.raw.decode_content = True
+            by_pmid = {a["pmid"]: a for a in iter_efetch_articles(resp.raw) if a.get("pmid")}
+        finally:
+            resp.close()
+        for req in batch:
+            req.articles = {p: by_pmid[p] for p in req.pmids if p in by_pmid}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_pubmed_scheduler() -> PubMedScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = PubMedScheduler(
+                    rate=float(os.getenv("PUBMED_RATE_LIMIT", DEFAULT_RATE)),
+                    batch_window=float(os.getenv("PUBMED_BATCH_WINDOW_MS", "50")) / 1000,
+                )
+    return _scheduler
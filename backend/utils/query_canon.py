@@ -0,0 +1,228 @@
+import os
+import re
+import unicodedata
+from typing import Any, Dict, List
+
+# -------------------------------
+# Query canonicalization
+# -------------------------------
+# Free-text patient input ("58", "SOB and CP for 2 days", "atorvastatin 20 mg")
+# is turned into stable, compact search queries: lowercase and accent-free
+# tokens, filler and dose words removed, lay terms and abbreviations folded
+# to one clinical concept, other words kept together as phrases ("weight
+# loss", quoted for PubMed), ages bucketed into MeSH age groups, the most
+# specific terms kept and sorted. Paraphrases of the same case then share PubMed / BioPortal /
+# RxNorm queries – and therefore shared-cache entries.
+# Compare hit rates with `python -m backend.bench_query_canon`.
+QUERY_CANONICALIZE = os.getenv("QUERY_CANONICALIZE", "1").lower() not in ("0", "false", "no")
+# Terms kept per search (diagnosis first, then listed concepts, then other
+# phrases; sorted afterwards)
+MAX_QUERY_CONCEPTS = int(os.getenv("MAX_QUERY_CONCEPTS", "6"))
+# Unlisted words between stop words stay one phrase up to this length; longer
+# runs are more likely a sentence than a term and are split into words
+MAX_PHRASE_WORDS = 3
+
+# Lay terms, spellings, abbreviations and brand names → canonical concept
+SYNONYMS = {
+    "dyspnea": ["shortness of breath", "short of breath", "sob", "breathlessness", "breathless",
+                "dyspnoea", "difficulty breathing", "trouble breathing"],
+    "chest pain": ["cp", "chest discomfort", "chest tightness", "chest pressure"],
+    "abdominal pain": ["stomach ache", "stomachache", "stomach pain", "tummy ache", "belly pain",
+                       "abdo pain", "abdominal discomfort"],
+    "headache": ["headaches", "head ache", "cephalgia", "cephalalgia"],
+    "fever": ["fevers", "pyrexia", "febrile", "high temperature"],
+    "vomiting": ["vomit", "throwing up", "emesis"],
+    "nausea": ["nauseous", "nauseated"],
+    "fatigue": ["tiredness", "tired", "exhaustion", "exhausted", "lethargy", "lethargic"],
+    "dizziness": ["dizzy", "lightheaded", "light headed", "lightheadedness"],
+    "cough": ["coughing", "coughs"],
+    "diaphoresis": ["sweating", "sweaty", "diaphoretic"],
+    "palpitations": ["palpitation", "heart racing", "racing heart"],
+    "syncope": ["fainting", "fainted", "passed out"],
+    "rhinorrhea": ["runny nose"],
+    "myocardial infarction": ["heart attack", "mi"],
+    "hypertension": ["high blood pressure", "htn", "hypertensive"],
+    "hyperlipidemia": ["high cholesterol", "hypercholesterolemia", "hyperlipidaemia", "hld"],
+    "diabetes mellitus": ["diabetes", "diabetic", "dm", "t2dm", "t1dm", "type 2 diabetes", "type ii diabetes"],
+    "atrial fibrillation": ["afib", "a fib"],
+    "heart failure": ["chf", "congestive heart failure"],
+    "chronic obstructive pulmonary disease": ["copd"],
+    "chronic kidney disease": ["ckd"],
+    "urinary tract infection": ["uti"],
+    "deep vein thrombosis": ["dvt"],
+    "gastroesophageal reflux": ["gerd", "acid reflux", "heartburn"],
+    "tuberculosis": ["tb"],
+    "acetaminophen": ["paracetamol", "tylenol"],
+    "aspirin": ["asa"],
+    "ibuprofen": ["advil", "motrin"],
+    "atorvastatin": ["lipitor"],
+    "simvastatin": ["zocor"],
+    "warfarin": ["coumadin"],
+    "clopidogrel": ["plavix"],
+    "omeprazole": ["prilosec"],
+    "sildenafil": ["viagra"],
+    "amlodipine": ["norvasc"],
+    "metformin": ["glucophage"],
+}
+
+STOPWORDS = {
+    # English
+    "a", "an", "and", "or", "of", "the", "in", "on", "with", "without", "to", "for", "by", "at",
+    "from", "as", "is", "are", "was", "were", "be", "been", "has", "have", "had", "this", "that",
+    "his", "her", "he", "she", "they", "it", "my", "some", "very", "really", "also", "since", "ago",
+    # Clinical filler
+    "patient", "pt", "complains", "complaining", "presents", "presenting", "reports", "reported",
+    "history", "hx", "c", "o", "known", "mild", "moderate", "slight", "bad", "worse", "new",
+    "day", "days", "week", "weeks", "month", "months", "year", "years", "yo", "old", "past", "last",
+    # Doses and schedules
+    "mg", "mcg", "g", "ml", "units", "iu", "daily", "bid", "tid", "qid", "qd", "prn", "po",
+    "tablet", "tablets", "once", "twice", "nightly",
+}
+
+GENDERS = {"male": "male", "m": "male", "man": "male", "boy": "male",
+           "female": "female", "f": "female", "woman": "female", "girl": "female"}
+
+# (upper bound in years, MeSH age group)
+AGE_GROUPS = [
+    (2, "infant"),
+    (6, "child preschool"),
+    (13, "child"),
+    (19, "adolescent"),
+    (45, "adult"),
+    (65, "middle aged"),
+    (80, "aged"),
+    (float("inf"), "aged 80 and over"),
+]
+
+# Canonical phrases map to themselves so multi-word concepts stay one term
+_FOLD = {variant: canonical for canonical, variants in SYNONYMS.items() for variant in [canonical, *variants]}
+# Longest variant first so "congestive heart failure" wins over "heart failure"
+_FOLD_RE = re.compile(
+    r"(?<!\S)(" + "|".join(re.escape(v) for v in sorted(_FOLD, key=len, reverse=True)) + r")(?!\S)"
+)
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+# Phrases never span a clause break
+_CLAUSE_RE = re.compile(r"[,;:.!?()/\n]+")
+_AGE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(month|mo|week|wk|day)?")
+
+
+def normalize(text: Any) -> str:
+    """Lowercase, strip accents, and reduce everything but letters and digits to single spaces."""
+    text = "".join(c for c in unicodedata.normalize("NFKD", str(text or "")) if not unicodedata.combining(c))
+    return _NON_ALNUM_RE.sub(" ", text.lower()).strip()
+
+
+def fold_synonyms(text: Any) -> str:
+    """Normalized text with lay terms and abbreviations replaced by their clinical concept."""
+    return _FOLD_RE.sub(lambda m: _FOLD[m.group(1)], normalize(text))
+
+
+def concepts(text: Any) -> List[str]:
+    """Terms of a free-text field, deduplicated, in order of appearance.
+
+    Listed lay terms fold to their clinical concept; runs of other words
+    between stop words stay one phrase ("weight loss", not "weight", "loss").
+    """
+    terms: List[str] = []
+    run: List[str] = []
+
+    def flush():
+        if 1 < len(run) <= MAX_PHRASE_WORDS:
+            terms.append(" ".join(run))
+        else:
+            terms.extend(run)
+        run.clear()
+
+    for clause in _CLAUSE_RE.split(str(text or "")):
+        folded = _FOLD_RE.sub(lambda m: " " + _FOLD[m.group(1)].replace(" ", "_") + " ", normalize(clause))
+        for token in folded.split():
+            term = token.replace("_", " ")
+            if term in SYNONYMS:
+                flush()
+                terms.append(term)
+            elif term in STOPWORDS or term.isdigit():
+                flush()
+            else:
+                run.append(term)
+        flush()
+    return list(dict.fromkeys(terms))
+
+
+def canonical_terms(*texts: Any, limit: int = MAX_QUERY_CONCEPTS) -> List[str]:
+    """The `limit` most specific terms across `texts`, sorted for a stable key.
+
+    Terms of the first text (the diagnosis) rank first, then listed clinical
+    concepts, then other phrases and words; ties keep their order of appearance.
+    """
+    ranked: Dict[str, tuple] = {}
+    for i, text in enumerate(texts):
+        for term in concepts(text):
+            if term not in ranked:
+                ranked[term] = (0 if i == 0 else 1 if term in SYNONYMS else 2, len(ranked))
+    terms = sorted(ranked, key=ranked.get)
+    return sorted(terms[:limit] if limit else terms)
+
+
+def _phrase(term: str) -> str:
+    # Unlisted multi-word phrases are searched as phrases; listed concepts keep PubMed's term mapping
+    return f'"{term}"' if " " in term and term not in SYNONYMS else term
+
+
+def age_group(age: Any) -> str:
+    m = _AGE_RE.search(str(age or "").lower())
+    if not m:
+        return ""
+    years = float(m.group(1))
+    if m.group(2):  # "6 months", "3 weeks", "10 days"
+        years = 0.0
+    return next(group for bound, group in AGE_GROUPS if years < bound)
+
+
+def gender_term(gender: Any) -> str:
+    return GENDERS.get(normalize(gender), "")
+
+
+# -------------------------------
+# Per-backend queries
+# -------------------------------
+def _fields(state: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        "symptoms": (state.get("symptoms") or "").strip(),
+        "diagnosis": (state.get("diagnosis") or "").strip(),
+        "age": str(state.get("age") or "").strip(),
+        "gender": (state.get("gender") or "").strip(),
+        "history": (state.get("medicalHistory") or state.get("history") or "").strip(),
+        "meds": (state.get("currentMedications") or "").strip(),
+    }
+
+
+def pubmed_query(state: Dict[str, Any], canonical: bool = None) -> str:
+    """PubMed search: diagnosis / symptom concepts AND gender AND MeSH age group.
+
+    History and medications stay out of the search; the local re-ranker uses them.
+    """
+    f = _fields(state)
+    if not (QUERY_CANONICALIZE if canonical is None else canonical):
+        terms = [f["diagnosis"], f["symptoms"], f["gender"], f"age {f['age']}" if f["age"] else "",
+                 f["history"], f["meds"]]
+        return " AND ".join(t for t in terms if t) or f["symptoms"] or f["diagnosis"]
+    terms = canonical_terms(f["diagnosis"], f["symptoms"])
+    if not terms:
+        return normalize(f["symptoms"] or f["diagnosis"])
+    return " AND ".join([_phrase(t) for t in terms] + [t for t in (gender_term(f["gender"]), age_group(f["age"])) if t])
+
+
+def bioportal_query(state: Dict[str, Any], canonical: bool = None) -> str:
+    """Ontology search: diagnosis / symptom concepts only (demographics never match a term)."""
+    f = _fields(state)
+    if not (QUERY_CANONICALIZE if canonical is None else canonical):
+        parts = [f["diagnosis"], f["symptoms"], f["gender"], f"age {f['age']}" if f["age"] else "", f["history"]]
+        return " ".join(p for p in parts if p) or f["symptoms"] or f["diagnosis"]
+    return " ".join(canonical_terms(f["diagnosis"], f["symptoms"])) or normalize(f["symptoms"] or f["diagnosis"])
+
+
+def rxnorm_query(state: Dict[str, Any], canonical: bool = None) -> str:
+    f = _fields(state)
+    if not (QUERY_CANONICALIZE if canonical is None else canonical):
+        return state.get("diagnosis", "") or state.get("symptoms", "")
+    return " ".join(canonical_terms(f["diagnosis"] or f["symptoms"])) or normalize(f["diagnosis"] or f["symptoms"])
@@ -0,0 +1,90 @@
+import os
+import time
+import threading
+from typing import Dict
+
+from backend.utils import metrics
+
+# -------------------------------
+# Circuit breaker
+# -------------------------------
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_S = float(os.getenv("BREAKER_RESET_S", "30"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed → open → (after reset_timeout) half-open probe.
+
+    While open, calls fail fast. In half-open a single probe is let through;
+    success closes the breaker, failure re-opens it for another reset_timeout.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        metrics.set_gauge("circuit_breaker_state", _STATE_GAUGE[CLOSED], backend=name)
+
+    def _transition(self, state: str):
+        if state != self.state:
+            self.state = state
+            metrics.set_gauge("circuit_breaker_state", _STATE_GAUGE[state], backend=self.name)
+            metrics.inc("circuit_breaker_transitions", backend=self.name, to=state)
+            print(f"⚠️ Circuit breaker '{self.name}' → {state}")
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._transition(HALF_OPEN)
+                self._probe_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+        metrics.inc("circuit_breaker_rejections", backend=self.name)
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(backend: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if backend not in _breakers:
+            _breakers[backend] = CircuitBreaker(backend)
+        return _breakers[backend]
+
+
+def reset_breakers():
+    """Forget all breaker state (used by tests)."""
+    with _breakers_lock:
+        _breakers.clear()
@@ -0,0 +1,122 @@
+import os
+import gzip
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import orjson
+
+try:  # optional: zstd is offered only when `zstandard` is installed
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# -------------------------------
+# /analyze response encoding
+# -------------------------------
+# orjson (or msgpack for internal consumers), optional field selection and a
+# compact view, then gzip/zstd negotiated from Accept-Encoding.
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+ZSTD_LEVEL = int(os.getenv("RESPONSE_ZSTD_LEVEL", "3"))
+
+# Echoed request input and internal bookkeeping, dropped by the compact view
+_INPUT_KEYS = ("symptoms", "age", "gender", "medicalHistory", "currentMedications", "urgency",
+               "history", "options", "deadline")
+_COMPACT_DROP = ("patient_context", "disclaimer")
+
+# ZstdCompressor is not thread-safe: one per threadpool thread
+_zstd_local = threading.local()
+
+
+def select_fields(state: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """Keep only the requested top-level sections or dotted paths (e.g. `literature.articles`)."""
+    out: Dict[str, Any] = {}
+    for path in fields:
+        parts = [p for p in path.strip().split(".") if p]
+        if not parts:
+            continue
+        src, dst = state, out
+        for i, part in enumerate(parts):
+            if not isinstance(src, dict) or part not in src:
+                break
+            if i == len(parts) - 1:
+                dst[part] = src[part]
+            else:
+                src = src[part]
+                dst = dst.setdefault(part, {})
+    return out
+
+
+def compact(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop the echoed input, per-section patient_context copies and disclaimers."""
+    out = {}
+    for key, value in state.items():
+        if key in _INPUT_KEYS or key == "summary_disclaimer":
+            continue
+        if isinstance(value, dict):
+            value = {k: v for k, v in value.items() if k not in _COMPACT_DROP}
+        out[key] = value
+    return out
+
+
+def shape(state: Dict[str, Any], fields: Optional[str] = None, compact_view: bool = False) -> Dict[str, Any]:
+    if compact_view:
+        state = compact(state)
+    if fields:
+        state = select_fields(state, fields.split(","))
+    return state
+
+
+def _wants_msgpack(accept: Optional[str]) -> bool:
+    return bool(accept) and any(t in accept.lower() for t in MSGPACK_TYPES)
+
+
+def _encodings(accept_encoding: Optional[str]) -> Dict[str, float]:
+    prefs = {}
+    for item in (accept_encoding or "").split(","):
+        token, _, params = item.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        prefs[token.strip().lower()] = q
+    return prefs
+
+
+def _zstd(body: bytes) -> bytes:
+    compressor = getattr(_zstd_local, "compressor", None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return compressor.compress(body)
+
+
+def serialize(obj: Any, msgpack: bool = False) -> bytes:
+    if msgpack:
+        import ormsgpack
+        return ormsgpack.packb(obj, option=ormsgpack.OPT_NON_STR_KEYS)
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS, default=str)
+
+
+def encode(obj: Any, accept: Optional[str] = None, accept_encoding: Optional[str] = None) -> Tuple[bytes, Dict[str, str]]:
+    """Serialize and compress `obj` for the client; returns (body, headers incl. Content-Type)."""
+    msgpack = _wants_msgpack(accept)
+    body = serialize(obj, msgpack)
+    headers = {
+        "Content-Type": MSGPACK_TYPES[0] if msgpack else "application/json",
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, headers
+    prefs = _encodings(accept_encoding)
+    if zstandard is not None and prefs.get("zstd", 0) > 0 and prefs["zstd"] >= prefs.get("gzip", 0):
+        body, headers["Content-Encoding"] = _zstd(body), "zstd"
+    elif prefs.get("gzip", 0) > 0:
+        body, headers["Content-Encoding"] = gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, headers
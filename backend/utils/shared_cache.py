@@ -0,0 +1,237 @@
+import os
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+import orjson
+
+from backend.utils import metrics
+from backend.utils.private_files import connect_private, private_path
+
+# -------------------------------
+# Cross-worker shared cache
+# -------------------------------
+# A SQLite database placed in shared memory (/dev/shm when available) and
+# memory-mapped by every uvicorn worker on the host. Writes are atomic
+# transactions; a trigger-maintained byte total drives LRU eviction. The file
+# (0600) sits in a per-user 0700 directory: it holds patient-derived entries.
+_DEFAULT_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", private_path(_DEFAULT_DIR, "shared_cache.sqlite"))
+SHARED_CACHE_MAX_MB = float(os.getenv("SHARED_CACHE_MAX_MB", "256"))
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+
+# Default TTLs per namespace (seconds)
+EXTERNAL_CACHE_TTL_S = float(os.getenv("EXTERNAL_CACHE_TTL_S", "86400"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", "86400"))
+# PDFs are keyed on the minute printed in their header, so they are only reused briefly
+PDF_CACHE_TTL_S = float(os.getenv("PDF_CACHE_TTL_S", "120"))
+
+# Only bump LRU timestamps this often to keep reads mostly write-free
+_TOUCH_INTERVAL_S = 5.0
+
+# Seconds before expiry at which reads in this context already miss (see `refreshing`)
+_refresh_ahead = contextvars.ContextVar("shared_cache_refresh_ahead", default=0.0)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (id, total) VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_ins AFTER INSERT ON cache
+    BEGIN UPDATE meta SET total = total + NEW.size WHERE id = 0; END;
+CREATE TRIGGER IF NOT EXISTS cache_del AFTER DELETE ON cache
+    BEGIN UPDATE meta SET total = total - OLD.size WHERE id = 0; END;
+CREATE TRIGGER IF NOT EXISTS cache_upd AFTER UPDATE OF size ON cache
+    BEGIN UPDATE meta SET total = total + NEW.size - OLD.size WHERE id = 0; END;
+"""
+
+
+def make_key(*parts: Any) -> str:
+    """Stable digest of arbitrary JSON-serializable key parts."""
+    raw = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class SharedCache:
+    def __init__(self, path: str = SHARED_CACHE_PATH, max_bytes: int = int(SHARED_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread and per process (forked workers reconnect)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = connect_private(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(f"PRAGMA mmap_size={self.max_bytes * 2}")
+            conn.executescript(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, ns: str, key: str) -> Optional[bytes]:
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT value, expires, accessed FROM cache WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+            now = time.time()
+            if row is not None and now <= row[1] < now + _refresh_ahead.get():
+                # Still valid but about to expire: the caller recomputes and overwrites it
+                metrics.inc("shared_cache_requests", ns=ns, outcome="refresh")
+                return None
+            if row is None or row[1] < now:
+                if row is not None:
+                    conn.execute("DELETE FROM cache WHERE ns = ? AND key = ? AND expires < ?", (ns, key, now))
+                metrics.inc("shared_cache_requests", ns=ns, outcome="miss")
+                return None
+            if now - row[2] > _TOUCH_INTERVAL_S:
+                conn.execute("UPDATE cache SET accessed = ? WHERE ns = ? AND key = ?", (now, ns, key))
+            metrics.inc("shared_cache_requests", ns=ns, outcome="hit")
+            return row[0]
+        except (sqlite3.Error, OSError) as e:
+            print(f"❌ Shared cache read error: {e}")
+            return None
+
+    def set(self, ns: str, key: str, value: bytes, ttl: float):
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO cache (ns, key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (ns, key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                    "expires = excluded.expires, accessed = excluded.accessed",
+                    (ns, key, value, len(value), now + ttl, now),
+                )
+                self._evict(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, OSError) as e:
+            print(f"❌ Shared cache write error: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT total FROM meta WHERE id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Expired entries first, then least recently used until 90% of budget
+        conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        while True:
+            total = conn.execute("SELECT total FROM meta WHERE id = 0").fetchone()[0]
+            if total <= target:
+                break
+            cur = conn.execute(
+                "DELETE FROM cache WHERE (ns, key) IN (SELECT ns, key FROM cache ORDER BY accessed LIMIT 32)"
+            )
+            if cur.rowcount <= 0:
+                break
+            evicted += cur.rowcount
+        if evicted:
+            metrics.inc("shared_cache_evictions", evicted)
+
+    def get_json(self, ns: str, key: str) -> Any:
+        raw = self.get(ns, key)
+        return None if raw is None else orjson.loads(raw)
+
+    def set_json(self, ns: str, key: str, value: Any, ttl: float):
+        self.set(ns, key, orjson.dumps(value), ttl)
+
+    def expires_at(self, ns: str, key: str) -> Optional[float]:
+        try:
+            row = self._conn().execute("SELECT expires FROM cache WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+            return row[0] if row else None
+        except (sqlite3.Error, OSError):
+            return None
+
+    def stats(self) -> dict:
+        conn = self._conn()
+        total = conn.execute("SELECT total FROM meta WHERE id = 0").fetchone()[0]
+        by_ns = dict(conn.execute("SELECT ns, COUNT(*) FROM cache GROUP BY ns").fetchall())
+        return {"bytes": total, "max_bytes": self.max_bytes, "entries": by_ns}
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache")
+
+
+class _NullCache:
+    """Drop-in used when SHARED_CACHE_ENABLED=0."""
+
+    def get(self, ns, key):
+        return None
+
+    def set(self, ns, key, value, ttl):
+        pass
+
+    def get_json(self, ns, key):
+        return None
+
+    def set_json(self, ns, key, value, ttl):
+        pass
+
+    def expires_at(self, ns, key):
+        return None
+
+    def stats(self):
+        return {"bytes": 0, "max_bytes": 0, "entries": {}}
+
+    def clear(self):
+        pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SharedCache() if SHARED_CACHE_ENABLED else _NullCache()
+    return _cache
+
+
+@contextmanager
+def refreshing(ahead_s: float):
+    """Within this block, entries expiring in less than `ahead_s` read as misses.
+
+    Used by the cache warmer: running a case under it recomputes only what is
+    about to expire, so fresh entries cost nothing and hot ones never lapse.
+    """
+    token = _refresh_ahead.set(ahead_s)
+    try:
+        yield
+    finally:
+        _refresh_ahead.reset(token)
+
+
+def cached_json(ns: str, key: str, ttl: float, producer: Callable[[], Any], cache_if: Callable[[Any], bool] = bool):
+    """Return the cached JSON value for (ns, key) or compute, store and return it.
+
+    Values failing `cache_if` (by default: empty results) are returned but not stored.
+    """
+    cache = get_cache()
+    hit = cache.get_json(ns, key)
+    if hit is not None:
+        return hit
+    value = producer()
+    if cache_if(value):
+        cache.set_json(ns, key, value, ttl)
+    return value
@@ -1,9 +1,24 @@
-from fastapi import FastAPI, Response
-from fastapi.responses import JSONResponse
+import os
+import time
+import uuid
+import asyncio
+import functools
+import threading
+import orjson
+from fastapi import FastAPI, Request, Response, Header
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from backend.orchestrator.orchestrator import build_orchestrator_graph
-from backend.utils.pdf_generator import generate_pdf_from_analysis
+from backend.orchestrator.orchestrator import build_orchestrator_graph, profile_name, NODE_FUNCTIONS
+from backend.orchestrator.profiles import get_profile, get_profiles
+from backend.orchestrator import checkpoints, incremental
+from backend.orchestrator.state import AnalysisState
+from backend.utils import cache_warmer, cassette, metrics, profiler, response_codec
+from backend.utils.job_queue import JobRejected, get_job_queue
+from backend.utils.admission import get_admission, client_key
+from backend.utils.deadline import set_deadline, PARTIAL_KEY
+from backend.utils.shared_cache import get_cache, make_key, PDF_CACHE_TTL_S
 
 # -------------------------------
 # Initialize FastAPI and Orchestrator
@@ -20,7 +35,147 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-graph = build_orchestrator_graph()
+@app.middleware("http")
+async def record_traffic(request: Request, call_next):
+    """CASSETTE_MODE=record: append anonymized /analyze and /generate-pdf requests to the cassette."""
+    if not (cassette.recording() and request.method == "POST" and request.url.path in cassette.RECORDED_PATHS):
+        return await call_next(request)
+    raw = await request.body()
+    start = time.monotonic()
+    response = await call_next(request)
+    try:
+        body = orjson.loads(raw) if raw else None
+    except orjson.JSONDecodeError:
+        body = None
+    client = client_key(request.headers.get("authorization"), request.client.host if request.client else None)
+    cassette.get_cassette().record_request(
+        request.method, request.url.path, request.url.query, client, body,
+        response.status_code, time.monotonic() - start)
+    return response
+
+# Default end-to-end budget for /analyze in seconds (unset = no deadline)
+ANALYZE_TIMEOUT_S = float(os.getenv("ANALYZE_TIMEOUT_S", "0") or 0)
+
+# Fast start: graphs (and LangGraph/LangChain imports) are built on first use.
+# EAGER_INIT=1 restores build-at-startup for latency-sensitive single workers.
+EAGER_INIT = os.getenv("EAGER_INIT", "").lower() in ("1", "true", "yes")
+
+# Compiled graphs keyed by pipeline profile
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+def get_graph(fused: bool | None = None, profile: str | None = None):
+    key = profile_name(fused, profile)
+    if key not in _graphs:
+        with _graphs_lock:
+            if key not in _graphs:
+                _graphs[key] = build_orchestrator_graph(profile=key, checkpointer=checkpoints.get_checkpointer())
+    return _graphs[key]
+
+def run_graph(input_state: dict, fused: bool | None = None, run_id: str | None = None, profile: str | None = None):
+    """Invoke the pipeline as a checkpointed run; returns (run_id, final_state)."""
+    spec = get_profile(profile_name(fused, profile))
+    options = input_state.setdefault("options", {})
+    options["profile"] = spec.name
+    options["fused"] = spec.name == "fused"
+    # Profile options apply unless the request set them
+    for key, value in spec.options.items():
+        options.setdefault(key, value)
+    run_id = run_id or checkpoints.new_run_id()
+    config = checkpoints.run_config(run_id) if checkpoints.CHECKPOINTS_ENABLED else None
+    return run_id, get_graph(profile=spec.name).invoke(input_state, config)
+
+def _warm_case(payload: dict):
+    """Cache warmer runner: replay a recorded case through its pipeline profile; returns the final state."""
+    return run_graph(payload, profile=(payload.get("options") or {}).get("profile"))[1]
+
+def _unknown_profile(profile: str | None):
+    if profile and profile not in get_profiles():
+        return JSONResponse(status_code=400, content={
+            "error": f"Unknown pipeline profile '{profile}'", "profiles": list(get_profiles())})
+    return None
+
+@app.on_event("startup")
+def eager_init():
+    # Rolling profiler runs for the worker's lifetime when configured
+    profiler.get_rolling_profiler()
+    # So does the cache warmer (one worker per host warms at a time)
+    cache_warmer.get_cache_warmer(_warm_case)
+    if EAGER_INIT:
+        from backend.utils.openai_client import get_chat_llm
+        get_graph()
+        get_chat_llm(0.2)
+        get_chat_llm(0.3)
+        from backend.utils.pdf_generator import get_unicode_fonts
+        get_unicode_fonts()
+
+def admission_controlled(endpoint):
+    """Run `endpoint` only once admitted (fair per bearer token); otherwise answer 429 + Retry-After.
+
+    Waiting for a slot happens on the event loop; only admitted requests take
+    a threadpool thread to run the (sync) endpoint.
+    """
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        request = kwargs["request"]
+        admission = get_admission()
+        ticket = await admission.acquire_async(client_key(
+            request.headers.get("authorization"), request.client.host if request.client else None))
+        if not ticket.admitted:
+            retry_after = admission.retry_after()
+            return JSONResponse(
+                status_code=429,
+                content={"error": "Server is busy; retry later", "reason": ticket.reason, "retry_after": retry_after},
+                headers={"Retry-After": str(retry_after)},
+            )
+        try:
+            return await run_in_threadpool(endpoint, *args, **kwargs)
+        finally:
+            admission.release(ticket)
+    return wrapper
+
+def _start_profile(request: Request):
+    if not profiler.authorized(request.headers.get("x-profile-token")):
+        return None
+    # X-Profile-Threads: all also covers the worker pools (search, fused retrieval)
+    threads = None if request.headers.get("x-profile-threads") == "all" else [threading.get_ident()]
+    return profiler.RequestProfile(threads).start()
+
+def _finish_profile(request: Request, profile, response):
+    profile.stop()
+    metrics.inc("request_profiles", endpoint=request.url.path)
+    headers = {"X-Profile-Samples": str(profile.counter.samples),
+               "X-Profile-Duration-Ms": f"{profile.duration_s * 1000:.1f}"}
+    if request.headers.get("x-profile") == "inline":
+        return PlainTextResponse(profile.render(), headers=headers)
+    profile_id = uuid.uuid4().hex
+    get_cache().set("profile", profile_id, profile.render().encode("utf-8"), profiler.PROFILE_TTL_S)
+    if isinstance(response, Response):
+        response.headers.update({**headers, "X-Profile-Id": profile_id})
+    return response
+
+def profiled(endpoint):
+    """`X-Profile-Token: $PROFILING_TOKEN` samples this request (see backend/utils/profiler.py).
+
+    The collapsed stacks are stored under the `X-Profile-Id` response header
+    (GET /profiles/{id}), or replace the response with `X-Profile: inline`.
+    """
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = _start_profile(kwargs["request"])
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            return _finish_profile(kwargs["request"], profile, await endpoint(*args, **kwargs))
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _start_profile(kwargs["request"])
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        return _finish_profile(kwargs["request"], profile, endpoint(*args, **kwargs))
+    return wrapper
 
 # -------------------------------
 # Request & Response Models
@@ -48,32 +203,271 @@ class PdfInput(BaseModel):
 def root():
     return {"message": "GDHS Multi-Agent API is running 🚀"}
 
+# -------------------------------
+# Metrics (Prometheus text format)
+# -------------------------------
+@app.get("/metrics")
+def get_metrics():
+    metrics.set_gauge("shared_cache_bytes", get_cache().stats()["bytes"])
+    return PlainTextResponse(metrics.render_prometheus())
+
+@app.get("/cache-warmer")
+def cache_warmer_status():
+    """Hot cases, token spend and last run of the background cache warmer."""
+    warmer = cache_warmer.get_cache_warmer()
+    if warmer is None:
+        return {"enabled": False}
+    return {"enabled": True, **warmer.status()}
+
+# -------------------------------
+# Profiling (PROFILING_TOKEN)
+# -------------------------------
+def _profiling_denied(token: str | None):
+    if not profiler.authorized(token):
+        return JSONResponse(status_code=403, content={"error": "Profiling is disabled or the token is invalid"})
+    return None
+
+@app.get("/profiles/{profile_id}")
+def get_request_profile(profile_id: str, x_profile_token: str | None = Header(default=None)):
+    """Collapsed stacks of a profiled request (`X-Profile-Id`)."""
+    denied = _profiling_denied(x_profile_token)
+    if denied:
+        return denied
+    body = get_cache().get("profile", profile_id)
+    if body is None:
+        return JSONResponse(status_code=404, content={"error": f"Profile '{profile_id}' not found or expired"})
+    return PlainTextResponse(body.decode("utf-8"))
+
+@app.get("/profile")
+def get_rolling_profile(seconds: float | None = None, x_profile_token: str | None = Header(default=None)):
+    """On-CPU collapsed stacks of this worker over the last `seconds` (PROFILE_ROLLING_INTERVAL_MS)."""
+    denied = _profiling_denied(x_profile_token)
+    if denied:
+        return denied
+    rolling = profiler.get_rolling_profiler()
+    if rolling is None:
+        return JSONResponse(status_code=404, content={"error": "Rolling profiler is disabled (PROFILE_ROLLING_INTERVAL_MS=0)"})
+    counter = rolling.profile(seconds)
+    return PlainTextResponse(counter.render(), headers={"X-Profile-Samples": str(counter.samples)})
+
+# -------------------------------
+# Pipeline Profiles
+# -------------------------------
+@app.get("/pipelines")
+def list_pipelines():
+    return {"profiles": [p.to_dict() for p in get_profiles().values()]}
+
 # -------------------------------
 # Run Full Orchestrator
 # -------------------------------
 @app.post("/analyze")
-def analyze_patient(input_data: PatientInput):
+@admission_controlled
+@profiled
+def analyze_patient(
+    input_data: PatientInput,
+    request: Request,
+    fused: bool | None = None,
+    profile: str | None = None,
+    case_ranker: str | None = None,
+    timeout: float | None = None,
+    fields: str | None = None,
+    compact: bool = False,
+    x_request_timeout: float | None = Header(default=None),
+):
+    """Run the pipeline of `profile` (see GET /pipelines; default: the full pipeline).
+
+    `fields=summary,literature.articles` returns only those sections, `compact=true`
+    drops the echoed input, patient_context copies and disclaimers. The body is
+    orjson (or msgpack with `Accept: application/msgpack`), gzip/zstd-compressed
+    per Accept-Encoding.
+    """
+    invalid = _unknown_profile(profile)
+    if invalid:
+        return invalid
+    run_id = checkpoints.new_run_id()
     try:
         # Pass the structured data directly to the graph
         input_state = input_data.dict()
-        final_state = graph.invoke(input_state)
-        return final_state
+        if case_ranker:
+            input_state["options"] = {"case_ranker": case_ranker}
+        cache_warmer.record_case(input_state, profile_name(fused, profile))
+        # Request deadline: ?timeout= wins over X-Request-Timeout, then the server default
+        set_deadline(input_state, timeout or x_request_timeout or ANALYZE_TIMEOUT_S)
+        _, final_state = run_graph(input_state, fused, run_id, profile)
+        return _finished(run_id, final_state, request, fields, compact)
     except Exception as e:
-        # Provide a structured error for the frontend (avoid opaque Network Error)
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        # Provide a structured error for the frontend (avoid opaque Network Error);
+        # the run_id lets the client resume from the last checkpoint
+        return JSONResponse(status_code=500, content={"error": str(e), "run_id": run_id})
+
+# -------------------------------
+# Checkpointed Runs (status, resume, re-run one agent)
+# -------------------------------
+def _run_graph_for(run_id: str):
+    spec = get_profile(checkpoints.run_profile(checkpoints.get_checkpointer(), run_id))
+    return get_graph(profile=spec.name), spec
+
+def _run_endpoint(run_id: str, action):
+    if not checkpoints.CHECKPOINTS_ENABLED:
+        return JSONResponse(status_code=404, content={"error": "Checkpointing is disabled (CHECKPOINTS_ENABLED=0)"})
+    try:
+        graph, spec = _run_graph_for(run_id)
+        return action(graph, spec)
+    except checkpoints.RunNotFoundError:
+        return JSONResponse(status_code=404, content={"error": f"Run '{run_id}' not found or expired"})
+    except checkpoints.AgentNotInRunError as e:
+        return JSONResponse(status_code=409, content={"error": str(e), "run_id": run_id})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e), "run_id": run_id})
+
+def _shaped(run_id: str, final_state: dict, fields: str | None = None, compact: bool = False) -> dict:
+    final_state.setdefault(PARTIAL_KEY, [])
+    body = response_codec.shape(final_state, fields, compact)
+    body["run_id"] = run_id
+    return body
+
+def _encoded(request: Request, body, status_code: int = 200):
+    content, headers = response_codec.encode(
+        body, request.headers.get("accept"), request.headers.get("accept-encoding"))
+    return Response(content=content, status_code=status_code, media_type=headers.pop("Content-Type"), headers=headers)
+
+def _finished(run_id: str, final_state: dict, request: Request, fields: str | None = None, compact: bool = False):
+    return _encoded(request, _shaped(run_id, final_state, fields, compact))
+
+@app.get("/runs/{run_id}")
+def get_run(run_id: str):
+    return _run_endpoint(run_id, lambda graph, spec: checkpoints.run_status(graph, run_id))
+
+@app.post("/runs/{run_id}/resume")
+@admission_controlled
+def resume_run(run_id: str, request: Request, timeout: float | None = None,
+               fields: str | None = None, compact: bool = False):
+    return _run_endpoint(run_id, lambda graph, spec: _finished(
+        run_id, checkpoints.resume(graph, spec.nodes, run_id, timeout or ANALYZE_TIMEOUT_S), request, fields, compact))
+
+@app.post("/runs/{run_id}/agents/{agent}/rerun")
+@admission_controlled
+def rerun_agent(run_id: str, agent: str, request: Request, timeout: float | None = None,
+                fields: str | None = None, compact: bool = False):
+    """Re-run one agent (and the agents after it) on the state checkpointed before it."""
+    return _run_endpoint(run_id, lambda graph, spec: _finished(
+        run_id, checkpoints.rerun_from(graph, spec.nodes, run_id, agent, timeout or ANALYZE_TIMEOUT_S),
+        request, fields, compact))
+
+@app.post("/analyze/{run_id}/update")
+@admission_controlled
+def update_analysis(
+    run_id: str,
+    input_data: PatientInput,
+    request: Request,
+    case_ranker: str | None = None,
+    timeout: float | None = None,
+    fields: str | None = None,
+    compact: bool = False,
+    x_request_timeout: float | None = Header(default=None),
+):
+    """Re-submit an edited case: only agents affected by the changed fields are recomputed."""
+    new_input = input_data.dict()
+    if case_ranker:
+        new_input["options"] = {"case_ranker": case_ranker}
+    return _run_endpoint(run_id, lambda graph, spec: _finished(run_id, incremental.update_run(
+        graph, spec.nodes, run_id, new_input, NODE_FUNCTIONS, timeout or x_request_timeout or ANALYZE_TIMEOUT_S,
+        should_run=spec.should_run),
+        request, fields, compact))
+
+# -------------------------------
+# Async Jobs (urgency-ordered queue)
+# -------------------------------
+# Max seconds a GET /jobs/{id}?wait= long-poll may block
+JOB_MAX_WAIT_S = 60.0
+
+@app.post("/jobs")
+def submit_job(
+    input_data: PatientInput,
+    request: Request,
+    fused: bool | None = None,
+    profile: str | None = None,
+    case_ranker: str | None = None,
+    timeout: float | None = None,
+    fields: str | None = None,
+    compact: bool = False,
+):
+    """Queue an analysis; high-urgency cases run first. Poll or long-poll GET /jobs/{job_id}.
+
+    A full queue answers 503, a client over its share of jobs 429 (both with Retry-After).
+    """
+    invalid = _unknown_profile(profile)
+    if invalid:
+        return invalid
+    input_state = input_data.dict()
+    if case_ranker:
+        input_state["options"] = {"case_ranker": case_ranker}
+    cache_warmer.record_case(input_state, profile_name(fused, profile))
+    run_id = checkpoints.new_run_id()
+
+    def job():
+        # The deadline covers processing, not time spent queued
+        set_deadline(input_state, timeout or ANALYZE_TIMEOUT_S)
+        _, final_state = run_graph(input_state, fused, run_id, profile)
+        # Finished results wait in memory until fetched: keep them typed
+        return AnalysisState.from_dict(_shaped(run_id, final_state, fields, compact))
+
+    client = client_key(request.headers.get("authorization"), request.client.host if request.client else None)
+    try:
+        queued = get_job_queue().submit(job, input_data.urgency, meta={"run_id": run_id}, client=client)
+    except JobRejected as e:
+        return JSONResponse(
+            status_code=503 if e.reason == "queue_full" else 429,
+            content={"error": "Job queue is full; retry later" if e.reason == "queue_full"
+                     else "Too many unfinished or unfetched jobs for this client; retry later",
+                     "reason": e.reason, "retry_after": e.retry_after},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return JSONResponse(status_code=202, content=queued.to_dict())
+
+@app.get("/jobs")
+def job_queue_depth():
+    return {"queued": get_job_queue().depth()}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request, wait: float = 0):
+    """Job status and, once done, its result. `wait` blocks up to that many seconds for completion.
+
+    The long-poll waits on the event loop, so pollers do not hold threadpool threads.
+    """
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Job '{job_id}' not found or expired"})
+    if wait > 0:
+        await job.wait_async(min(wait, JOB_MAX_WAIT_S))
+    queue.mark_fetched(job)
+    # Large results are serialized and compressed off the event loop
+    return await run_in_threadpool(_encoded, request, job.to_dict())
 
 # -------------------------------
 # Generate PDF Endpoint
 # -------------------------------
 @app.post("/generate-pdf")
-async def generate_pdf(analysis_data: PdfInput):
+@profiled
+async def generate_pdf(analysis_data: PdfInput, request: Request):
     try:
         # Only include sections that are present
         payload = {k: v for k, v in analysis_data.dict().items() if v is not None}
         if not payload:
             return JSONResponse(status_code=400, content={"error": "No analysis sections provided for PDF."})
 
-        pdf_bytes = generate_pdf_from_analysis(payload)
+        from backend.utils.pdf_generator import generate_pdf_from_analysis, report_timestamp, PDF_OUTPUT_MODE
+        # Identical payloads are served from the cross-worker cache; the header timestamp is
+        # part of the key, so a cached report is only reused within the minute it shows
+        generated_at = report_timestamp()
+        cache_key = make_key(payload, PDF_OUTPUT_MODE, generated_at)
+        pdf_bytes = get_cache().get("pdf", cache_key)
+        if pdf_bytes is None:
+            pdf_bytes = generate_pdf_from_analysis(payload, generated_at=generated_at)
+            get_cache().set("pdf", cache_key, bytes(pdf_bytes), PDF_CACHE_TTL_S)
         if isinstance(pdf_bytes, bytearray):
             pdf_bytes = bytes(pdf_bytes)
         return Response(
@@ -88,26 +482,31 @@ async def generate_pdf(analysis_data: PdfInput):
 # Individual Agents (Optional)
 # -------------------------------
 @app.post("/symptom-analyzer")
-def run_symptom_agent(input_data: PatientInput):
-    final_state = graph.invoke(input_data.dict())
+@admission_controlled
+def run_symptom_agent(input_data: PatientInput, request: Request):
+    _, final_state = run_graph(input_data.dict())
     return final_state.get("symptom_analysis", {})
 
 @app.post("/literature")
-def run_literature_agent(input_data: PatientInput):
-    final_state = graph.invoke(input_data.dict())
+@admission_controlled
+def run_literature_agent(input_data: PatientInput, request: Request):
+    _, final_state = run_graph(input_data.dict())
     return final_state.get("literature", {})
 
 @app.post("/case-matcher")
-def run_case_matcher(input_data: PatientInput):
-    final_state = graph.invoke(input_data.dict())
+@admission_controlled
+def run_case_matcher(input_data: PatientInput, request: Request):
+    _, final_state = run_graph(input_data.dict())
     return final_state.get("case_matcher", {})
 
 @app.post("/treatment")
-def run_treatment_agent(input_data: PatientInput):
-    final_state = graph.invoke(input_data.dict())
+@admission_controlled
+def run_treatment_agent(input_data: PatientInput, request: Request):
+    _, final_state = run_graph(input_data.dict())
     return final_state.get("treatment", {})
 
 @app.post("/summary")
-def run_summary_agent(input_data: PatientInput):
-    final_state = graph.invoke(input_data.dict())
+@admission_controlled
+def run_summary_agent(input_data: PatientInput, request: Request):
+    _, final_state = run_graph(input_data.dict())
     return final_state.get("summary", {})